@@ -0,0 +1,55 @@
+"""
+Activity pre-filter: flag stationary windows of a processing batch in one vectorized pass, so they get the
+basal rate without the per-window orientation search, peak detection and model calls.
+
+Two classifiers, selected with ACTIVITY_FILTER in the worker:
+
+- 'peak' (exact): a window whose low-pass filtered gyro norm stays below peak_detect's height threshold
+  cannot contain a gait peak. The orientation alignment only rotates the gyro, which preserves its norm, so
+  no rotated axis reaches the threshold either and the full pipeline would return the basal rate.
+- 'energy' (approximate): the rolling RMS and the variance of the raw gyro norm both stay below thresholds.
+  It needs no filtered data, so stationary windows also skip filtfilt.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import utils
+
+ACTIVITY_FILTERS = ('peak', 'energy', 'off')
+ROLLING_SAMPLES = 50  # Rolling energy window of the 'energy' classifier (1 s at 50 Hz)
+
+def window_view(samples: np.ndarray, num_windows: int, window: int) -> np.ndarray:
+    """
+    The first num_windows consecutive windows of (n, channels) samples as a read-only
+    (num_windows, window, channels) strided view; nothing is copied, even for column slices.
+    num_windows * window must not exceed len(samples)
+    """
+    row_stride, channel_stride = samples.strides
+    return as_strided(samples, shape=(num_windows, window, samples.shape[1]),
+                      strides=(row_stride * window, row_stride, channel_stride), writeable=False)
+
+def peak_stationary(gyro_filtered: np.ndarray, num_windows: int, window: int,
+                    peak_height: float = utils.peak_height_thresh) -> np.ndarray:
+    """True for windows whose filtered gyro norm never reaches peak_height, so no stride can be detected"""
+    if num_windows == 0:
+        return np.zeros(0, dtype=bool)
+    windows = window_view(gyro_filtered, num_windows, window)
+    squared_norm = np.einsum('wij,wij->wi', windows, windows)
+    return np.max(squared_norm, axis=1) < peak_height ** 2
+
+def energy_stationary(gyro: np.ndarray, num_windows: int, window: int, rms_threshold: float,
+                      variance_threshold: float, rolling: int = ROLLING_SAMPLES) -> np.ndarray:
+    """
+    True for windows of raw gyro samples whose highest rolling RMS (rad/s, over `rolling` samples) is below
+    rms_threshold and whose gyro norm varies less than variance_threshold ((rad/s)^2)
+    """
+    if num_windows == 0:
+        return np.zeros(0, dtype=bool)
+    windows = window_view(gyro, num_windows, window)
+    squared_norm = np.einsum('wij,wij->wi', windows, windows)
+    rolling = min(rolling, window)
+    cumulative = np.cumsum(np.pad(squared_norm, ((0, 0), (1, 0))), axis=1)
+    rolling_energy = (cumulative[:, rolling:] - cumulative[:, :-rolling]) / rolling
+    max_rms = np.sqrt(np.max(rolling_energy, axis=1))
+    norm_variance = np.var(np.sqrt(squared_norm), axis=1)
+    return (max_rms < rms_threshold) & (norm_variance < variance_threshold)
@@ -0,0 +1,225 @@
+"""
+Batch analyzer: the per-window gait pipeline for many windows at once, shared by the offline analyzer
+(main.py) and the worker.
+
+A recording is viewed as consecutive 200-sample windows, (n_windows, 200, 6), without copying. The gates
+that need no per-window logic (the raw gyro norm and the activity pre-filter) and the low-pass filter run
+on all windows at once. Only windows that pass the gates go through orientation alignment and gait
+segmentation, and the strides of every window share one correction and one EE model call.
+"""
+
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+import numpy as np
+from scipy import signal
+from scipy.linalg import norm
+import utils
+from activity_filter import peak_stationary, window_view
+from calibration_cache import CalibrationCache
+from metrics import StageMetrics
+
+sampling_freq = 50  # Sampling frequency in Hz
+cutoff_freq = 6  # Crossover frequency for low-pass filter in Hz
+filt_order = 4  # Filter order
+sliding_win = 200  # Window size for sliding window in samples (4 seconds at 50Hz)
+chunk_windows = 900  # Windows analyzed together by analyze_recording (one hour), bounding its memory use
+
+b, a = signal.butter(filt_order, cutoff_freq, btype='low', fs=sampling_freq)
+flip_y = utils.rotm_y(np.pi)  # 180-degree turn about y when the aligned z-axis points the wrong way
+
+class RecordingEstimates(NamedTuple):
+    """Per-stride EE of a recording; windows without strides contribute one basal value at their median time"""
+    time: np.ndarray
+    ee: np.ndarray
+    window_index: np.ndarray
+    windows: int
+    active_windows: int
+
+def window_mean_ee(estimates: RecordingEstimates) -> np.ndarray:
+    """Mean EE of each window: its basal value or the mean over its strides (0 for a window without estimates)"""
+    if not len(estimates.ee):
+        return np.empty(0)
+    return (np.bincount(estimates.window_index, weights=estimates.ee, minlength=estimates.windows)
+            / np.maximum(np.bincount(estimates.window_index, minlength=estimates.windows), 1))
+
+def calibrate_window(gyro_filtered: np.ndarray, acc_filtered: np.ndarray, rotation_solver: str = 'grid',
+                     metrics: StageMetrics = None):
+    """
+    Full orientation search for one low-pass filtered window.
+    Returns (gyro_cal, opt_rotm, opt_rotm_z_pocket, theta_z, prin_idx, theta_y), or None when the window has
+    no gait to align.
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+
+    # Orientation alignment with superior-inferior axis
+    with metrics.time('rotate_z'):
+        opt_rotm_z_pocket, theta_z = utils.get_rotate_z(acc_filtered, solver=rotation_solver)
+    gyro_rot_zx = np.matmul(gyro_filtered, opt_rotm_z_pocket)
+
+    # Find principal axis
+    prin_idx = utils.find_prin_axis(gyro_rot_zx)
+    prin_gyro = gyro_rot_zx[:, prin_idx]
+
+    if np.abs(np.max(prin_gyro)) < np.abs(np.min(prin_gyro)):
+        prin_gyro = -prin_gyro
+
+    # Detect peaks
+    with metrics.time('peak_detect'):
+        gait_peaks = utils.peak_detect(prin_gyro)
+
+    if len(gait_peaks) <= 1:
+        return None
+
+    # Segment data
+    with metrics.time('features'):
+        gait_data = utils.segment_data(gait_peaks, gyro_rot_zx, sliding_win)
+    if len(gait_data) < 1:
+        return None
+
+    # Orientation alignment with mediolateral axis
+    avg_gait_data = np.mean(gait_data, axis=0)
+    with metrics.time('rotate_y'):
+        opt_rotm_y, theta_y = utils.get_rotate_y(avg_gait_data, prin_idx, solver=rotation_solver)
+    opt_rotm = np.matmul(opt_rotm_z_pocket, opt_rotm_y)
+    gyro_cal = np.matmul(gyro_filtered, opt_rotm)
+
+    # Adjust rotation if necessary
+    pos_idx = gyro_cal[:, -1] > 0
+    neg_idx = gyro_cal[:, -1] < 0
+    gyro_z_norm_pos = norm(gyro_cal[pos_idx, -1], ord=2)
+    gyro_z_norm_neg = norm(gyro_cal[neg_idx, -1], ord=2)
+
+    if gyro_z_norm_pos <= gyro_z_norm_neg:
+        opt_rotm = np.matmul(opt_rotm, flip_y)
+        gyro_cal = np.matmul(gyro_filtered, opt_rotm)
+    return gyro_cal, opt_rotm, opt_rotm_z_pocket, theta_z, prin_idx, theta_y
+
+def segment_window_strides(gyro_filtered: np.ndarray, acc_filtered: np.ndarray, rotation_solver: str = 'grid',
+                           gyro_norm_thres: float = 0, metrics: StageMetrics = None,
+                           calibration: CalibrationCache = None):
+    """
+    Align and segment one low-pass filtered window into binned strides.
+    With a session's CalibrationCache, the cached orientation is reused when it fits the window, and a
+    full search otherwise updates the cache.
+    Returns (bin_inputs, dur_stride, stride_starts), with no strides when the final alignment leaves none,
+    or None when the window gets the basal rate.
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+
+    # Calculate L2 norm of gyro data
+    l2_norm_gyro = np.linalg.norm(gyro_filtered, axis=1)
+
+    if np.max(l2_norm_gyro) <= gyro_norm_thres:
+        return None
+
+    cached = None
+    if calibration is not None:
+        with metrics.time('calibration'):
+            cached = calibration.lookup(gyro_filtered, acc_filtered)
+    if cached is not None:
+        gyro_cal, opt_rotm = cached
+    else:
+        calibrated = calibrate_window(gyro_filtered, acc_filtered, rotation_solver, metrics)
+        if calibrated is None:
+            return None
+        gyro_cal, opt_rotm, opt_rotm_z_pocket, theta_z, prin_idx, theta_y = calibrated
+        if calibration is not None:
+            calibration.store(acc_filtered, opt_rotm_z_pocket, theta_z, prin_idx, opt_rotm, theta_y)
+
+    # Final gait segmentation into binned strides for EE estimation. With no stride left after the final
+    # alignment the window gets no estimate at all, as in the original main.py and worker
+    with metrics.time('peak_detect'):
+        gait_peaks = utils.peak_detect(gyro_cal[:, -1])
+    with metrics.time('features'):
+        return utils.segment_strides(gyro_cal, gait_peaks, sliding_win)
+
+def estimate_windows(window_strides: List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]], weight: float,
+                     height: float, basal: float, model_loader: Callable[[], Tuple[Any, Any]],
+                     metrics: StageMetrics = None) -> List[List[float]]:
+    """
+    EE values per window from segment_window_strides outputs; None windows get [basal].
+    The strides of all windows are stacked so the correction and EE models run once. model_loader()
+    returns (ee_model, correction_model) and is only called when there is at least one stride.
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+    stride_batches = [strides for strides in window_strides if strides is not None and len(strides[2]) > 0]
+
+    ee_all = np.empty(0)
+    if stride_batches:
+        bin_inputs = np.concatenate([strides[0] for strides in stride_batches])
+        dur_stride = np.concatenate([strides[1] for strides in stride_batches])
+        ee_model, correction_model = model_loader()
+        with metrics.time('correction'):
+            model_input = utils.processRawGait_model_batch(bin_inputs, dur_stride, weight, height, correction_model)
+        try:
+            with metrics.time('predict'):
+                ee_all = ee_model.predict(model_input)
+        except Exception as e:
+            raise Exception(f"Error during data_driven_model.predict: {str(e)}. Input shape: {model_input.shape}")
+
+    # Split the batched predictions back into per-window lists
+    ee_per_window = []
+    offset = 0
+    for strides in window_strides:
+        if strides is None:
+            ee_per_window.append([basal])
+            continue
+        n_strides = len(strides[2])
+        ee_per_window.append(list(ee_all[offset:offset + n_strides]))
+        offset += n_strides
+    return ee_per_window
+
+def analyze_recording(times: np.ndarray, sensors: np.ndarray, weight: float, height: float, basal: float, ee_model,
+                      correction_model, gyro_norm_thres: float = 0.5, rotation_solver: str = 'grid',
+                      metrics: StageMetrics = None, calibration: CalibrationCache = None) -> RecordingEstimates:
+    """
+    EE for a whole recording, times (n,) and sensors (n, 6) (gyro xyz, acc xyz), in consecutive sliding_win
+    windows as main.py defines them: each window is filtered on its own, windows whose raw gyro norm (over the
+    whole window) is at most gyro_norm_thres get the basal rate, and strides are timed at their first sample.
+    Trailing samples that do not fill a window are ignored. Windows are processed chunk_windows at a time.
+    The columns may be views of a memory-mapped session file (session_format); windows are sliced from them
+    without copying, and only windows that pass the gyro norm gate are copied for filtering.
+    A CalibrationCache carries orientations from window to window (see calibration_cache).
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+    num_windows = len(times) // sliding_win
+    time_parts, ee_parts, index_parts = [], [], []
+    active_windows = 0
+    for chunk_start in range(0, num_windows, chunk_windows):
+        chunk_count = min(chunk_windows, num_windows - chunk_start)
+        first_sample = chunk_start * sliding_win
+        windows = window_view(sensors[first_sample:], chunk_count, sliding_win)
+        window_times = window_view(times[first_sample:, None], chunk_count, sliding_win)[:, :, 0]
+
+        # Gates for every window of the chunk at once; only moving windows are filtered
+        moving = np.flatnonzero(np.linalg.norm(windows[:, :, :3], axis=(1, 2)) > gyro_norm_thres)
+        with metrics.time('filter'):
+            filtered = signal.filtfilt(b, a, windows[moving], axis=1) if len(moving) else np.empty((0, sliding_win, 6))
+        with metrics.time('activity_filter'):
+            possible_strides = ~peak_stationary(filtered[:, :, :3].reshape(-1, 3), len(moving), sliding_win)
+        active = moving[possible_strides]
+        active_windows += len(active)
+
+        window_strides = [None] * chunk_count
+        for window_index, window_filtered in zip(active, filtered[possible_strides]):
+            window_strides[window_index] = segment_window_strides(window_filtered[:, :3], window_filtered[:, 3:],
+                                                                  rotation_solver, metrics=metrics,
+                                                                  calibration=calibration)
+        ee_per_window = estimate_windows(window_strides, weight, height, basal, lambda: (ee_model, correction_model),
+                                         metrics)
+
+        for window_index, (strides, window_ee) in enumerate(zip(window_strides, ee_per_window)):
+            if strides is None:
+                time_parts.append([np.median(window_times[window_index])])
+            else:
+                time_parts.append(window_times[window_index, strides[2]])
+            ee_parts.append(window_ee)
+            index_parts.append(np.full(len(window_ee), chunk_start + window_index))
+
+    if not ee_parts:
+        return RecordingEstimates(np.empty(0), np.empty(0), np.empty(0, dtype=int), num_windows, 0)
+    return RecordingEstimates(np.concatenate(time_parts), np.concatenate(ee_parts).astype(float),
+                              np.concatenate(index_parts), num_windows, active_windows)
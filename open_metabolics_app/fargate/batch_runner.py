@@ -0,0 +1,235 @@
+"""
+Multi-subject batch runner: main.py's analysis for every (subject, recording) pair of a manifest.
+
+The manifest is a CSV with a subject column and a recording column (a CSV recording or a session file;
+relative paths are resolved against the manifest's directory). A blank subject is taken from the session
+file header. Weight, height, age and gender come from subject_info.csv.
+
+Recordings are spread over a process pool; each process loads the models once. For every recording the
+runner writes <output>/<subject>/<recording>.ee.csv (time, EE, window index) and
+<output>/<subject>/<recording>.summary.json, then collects all summaries into <output>/daily_summary.csv
+(one row per recording, each treated as one subject-day). A recording whose summary already exists for the
+same recording file, models and settings is skipped, so reruns only process what is new or changed.
+
+Usage: python batch_runner.py --manifest manifest.csv --output results/ [--workers 4] [--force]
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, NamedTuple
+import numpy as np
+import pandas as pd
+import utils
+import batch_analyzer
+from main import gyro_norm_thres, stand_aug_fact
+from model_artifacts import MODEL_FORMATS, load_model_pair, model_files
+from session_format import is_session_file, load_recording, open_session
+
+SUMMARY_SUFFIX = '.summary.json'
+EE_SUFFIX = '.ee.csv'
+
+class Job(NamedTuple):
+    """One recording to analyze, with the subject's anthropometrics joined in"""
+    subject: str
+    recording: str
+    weight: float
+    height: float
+    basal: float
+    output_prefix: str  # <output>/<subject>/<recording name>; the suffixes are appended
+    fingerprint: dict
+
+_models = None
+_rotation_solver = 'grid'
+
+def _init_process(model_dir: str, model_format: str, rotation_solver: str):
+    """Pool initializer: load the models once per process and keep XGBoost single-threaded"""
+    global _models, _rotation_solver
+    _models = load_model_pair(model_dir, model_format)
+    _models[0].get_booster().set_param({'nthread': 1})
+    _rotation_solver = rotation_solver
+
+def models_sha256(model_dir: str, model_format: str) -> str:
+    """Digest of the model artifacts, so a model update invalidates earlier results"""
+    digest = hashlib.sha256()
+    for name in model_files(model_format):
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def read_manifest(manifest_path: str) -> pd.DataFrame:
+    """Manifest rows as (subject, recording) with recording paths made absolute"""
+    manifest = pd.read_csv(manifest_path, dtype=str, keep_default_na=False)
+    missing = {'subject', 'recording'} - set(manifest.columns)
+    if missing:
+        raise SystemExit(f"{manifest_path} lacks column(s) {sorted(missing)}")
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    manifest = manifest[['subject', 'recording']].copy()
+    manifest['recording'] = [os.path.normpath(os.path.join(base_dir, path)) for path in manifest['recording']]
+    return manifest
+
+def build_jobs(manifest: pd.DataFrame, subject_csv: str, output_dir: str, settings: dict) -> List[Job]:
+    """
+    Join the manifest with subject_info.csv. Every problem (unknown subject, missing recording, two
+    recordings writing the same output) is reported before anything runs.
+    """
+    subjects = pd.read_csv(subject_csv, dtype={'subject': str}).drop_duplicates('subject').set_index('subject')
+    jobs, errors, prefixes = [], [], {}
+    for subject, recording in manifest.itertuples(index=False):
+        if not os.path.isfile(recording):
+            errors.append(f"{recording}: file not found")
+            continue
+        if not subject and is_session_file(recording):
+            subject = open_session(recording).subject_id
+        if not subject:
+            errors.append(f"{recording}: no subject in the manifest or the session header")
+            continue
+        if subject not in subjects.index:
+            errors.append(f"{recording}: subject {subject!r} not found in {subject_csv}")
+            continue
+        row = subjects.loc[subject]
+        prefix = os.path.join(output_dir, subject, os.path.splitext(os.path.basename(recording))[0])
+        if prefix in prefixes:
+            errors.append(f"{recording}: same output as {prefixes[prefix]}")
+            continue
+        prefixes[prefix] = recording
+        stat = os.stat(recording)
+        basal = utils.basalEst(row['height'], row['weight'], row['age'], row['gender'], stand_aug_fact)
+        fingerprint = dict(settings, recordingBytes=stat.st_size, recordingMtimeNs=stat.st_mtime_ns,
+                           weight=float(row['weight']), height=float(row['height']), basal=float(basal))
+        jobs.append(Job(subject, recording, float(row['weight']), float(row['height']), float(basal), prefix, fingerprint))
+    if errors:
+        raise SystemExit("Manifest errors:\n  " + "\n  ".join(errors))
+    return jobs
+
+def load_summary(job: Job):
+    """The summary of an earlier run, or None when there is none or it was made from other inputs"""
+    try:
+        with open(job.output_prefix + SUMMARY_SUFFIX) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return summary if summary.get('fingerprint') == job.fingerprint else None
+
+def _write_atomic(path: str, write):
+    """Write through a temporary file and rename it, so an interrupted run never leaves a partial file"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def analyze_job(job: Job) -> dict:
+    """Analyze one recording and write its EE time series and summary; runs in a pool process"""
+    start_time = time.perf_counter()
+    recording = load_recording(job.recording)
+    if recording.sample_rate != batch_analyzer.sampling_freq:
+        raise ValueError(f"sampled at {recording.sample_rate:g} Hz; the models expect {batch_analyzer.sampling_freq} Hz")
+    ee_model, correction_model = _models
+    estimates = batch_analyzer.analyze_recording(recording.time, recording.sensors, job.weight, job.height, job.basal,
+                                                 ee_model, correction_model, gyro_norm_thres=gyro_norm_thres,
+                                                 rotation_solver=_rotation_solver)
+
+    # Each window contributes its mean EE (basal or over its strides) for its 4 seconds
+    window_seconds = batch_analyzer.sliding_win / batch_analyzer.sampling_freq
+    energy_joules = float(batch_analyzer.window_mean_ee(estimates).sum() * window_seconds)
+    summary = {
+        'subject': job.subject,
+        'recording': job.recording,
+        'hours': estimates.windows * window_seconds / 3600,
+        'windows': estimates.windows,
+        'activeWindows': estimates.active_windows,
+        'estimates': len(estimates.ee),
+        'meanEeWatts': float(np.mean(estimates.ee)) if len(estimates.ee) else None,
+        'energyKcal': energy_joules / 4184,
+        'analysisSeconds': time.perf_counter() - start_time,
+        'fingerprint': job.fingerprint,
+    }
+
+    os.makedirs(os.path.dirname(job.output_prefix), exist_ok=True)
+    series = pd.DataFrame({'time': estimates.time, 'energyExpenditure': estimates.ee, 'windowIndex': estimates.window_index})
+    _write_atomic(job.output_prefix + EE_SUFFIX, lambda path: series.to_csv(path, index=False))
+    # The summary goes last: its presence marks the recording as done
+    def write_summary(path):
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+    _write_atomic(job.output_prefix + SUMMARY_SUFFIX, write_summary)
+    return summary
+
+def run_jobs(jobs: List[Job], workers: int, model_dir: str, model_format: str, rotation_solver: str):
+    """Run the jobs, largest recording first; yields (job, summary, error) as each one finishes"""
+    jobs = sorted(jobs, key=lambda job: job.fingerprint['recordingBytes'], reverse=True)
+    init_args = (model_dir, model_format, rotation_solver)
+    if workers <= 1:
+        _init_process(*init_args)
+        for job in jobs:
+            try:
+                yield job, analyze_job(job), None
+            except Exception as e:
+                yield job, None, e
+        return
+    # spawn: the children never inherit OpenMP state from this process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_process, initargs=init_args) as pool:
+        futures = {pool.submit(analyze_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate energy expenditure for many subject recordings')
+    parser.add_argument('--manifest', required=True, help='CSV with subject and recording columns')
+    parser.add_argument('--output', required=True, help='Directory for per-subject outputs and daily_summary.csv')
+    parser.add_argument('--subject-csv', default='./subject_info.csv', help='Subject information CSV')
+    parser.add_argument('--model-dir', default='.', help='Directory holding the model artifacts')
+    parser.add_argument('--model-format', choices=MODEL_FORMATS, default=os.environ.get('MODEL_FORMAT', 'native'))
+    parser.add_argument('--rotation-solver', choices=['closed_form', 'grid', 'grid_loop'], default=os.environ.get('ROTATION_SOLVER', 'grid'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Pool processes; 1 runs in this process')
+    parser.add_argument('--force', action='store_true', help='Reprocess recordings that already have results')
+    args = parser.parse_args()
+
+    settings = {'modelFormat': args.model_format, 'modelSha256': models_sha256(args.model_dir, args.model_format),
+                'rotationSolver': args.rotation_solver, 'gyroNormThres': gyro_norm_thres}
+    jobs = build_jobs(read_manifest(args.manifest), args.subject_csv, args.output, settings)
+    summaries = {}
+    pending = []
+    for job in jobs:
+        summary = None if args.force else load_summary(job)
+        if summary is None:
+            pending.append(job)
+        else:
+            summaries[job.output_prefix] = summary
+    print(f"{len(jobs):,} recordings: {len(summaries):,} already done, {len(pending):,} to process "
+          f"with {min(args.workers, len(pending)) or 1} worker(s)")
+
+    start_time = time.perf_counter()
+    failures = []
+    for done, (job, summary, error) in enumerate(run_jobs(pending, min(args.workers, len(pending)), args.model_dir,
+                                                          args.model_format, args.rotation_solver), start=1):
+        if error is not None:
+            failures.append((job, error))
+            print(f"[{done}/{len(pending)}] {job.subject} {job.recording}: FAILED: {error}")
+            continue
+        summaries[job.output_prefix] = summary
+        print(f"[{done}/{len(pending)}] {job.subject} {os.path.basename(job.recording)}: {summary['hours']:.2f} h, "
+              f"{summary['energyKcal']:,.0f} kcal in {summary['analysisSeconds']:.1f} s")
+    elapsed = time.perf_counter() - start_time
+
+    if summaries:
+        rows = [{key: value for key, value in summary.items() if key != 'fingerprint'}
+                for _, summary in sorted(summaries.items())]
+        os.makedirs(args.output, exist_ok=True)
+        summary_path = os.path.join(args.output, 'daily_summary.csv')
+        _write_atomic(summary_path, lambda path: pd.DataFrame(rows).to_csv(path, index=False))
+        print(f"Wrote {summary_path} ({len(rows):,} recordings)")
+    hours = sum(summaries[job.output_prefix]['hours'] for job in pending if job.output_prefix in summaries)
+    print(f"Processed {len(pending) - len(failures):,} recordings ({hours:,.1f} h) in {elapsed:.1f} s, "
+          f"{len(failures):,} failed")
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+"""
+Offline benchmark of the worker's EE pipeline on the bundled daily_sp_pocket_data.csv.
+
+Replays the recording (and tiled versions of it) through the same stages as process_message:
+page decoding, session-level filtering, orientation alignment, stride segmentation, the correction
+and EE models, and result building/buffering. No AWS access is needed: pages are built in memory
+and result batches go to a sink.
+
+Usage: python benchmark.py --hours 0,1 --save-baseline baseline.json
+       python benchmark.py --hours 0,1 --baseline baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+sampling_freq = 50  # Sampling frequency in Hz
+page_size = 1000  # Items per DynamoDB query page, as in sensor_reader
+session_start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+percentiles = (0.5, 0.95, 0.99)
+
+class DiscardingClient:
+    """Result sink standing in for DynamoDB's batch_write_item"""
+
+    def batch_write_item(self, RequestItems):
+        return {}
+
+def load_dataset(hours, recording_path='./daily_sp_pocket_data.csv'):
+    """
+    The recording (hours=0) or the recording tiled to `hours`, as an (n, 7) float64 array at 50 Hz.
+    recording_path is a CSV in the daily_sp_pocket_data.csv layout or a session file (session_format).
+    """
+    from session_format import load_recording
+
+    source = load_recording(recording_path)
+    recording = np.column_stack((source.time, source.sensors)).astype(np.float64)
+    if hours > 0:
+        n_samples = int(hours * 3600 * sampling_freq)
+        recording = np.tile(recording, (int(np.ceil(n_samples / len(recording))), 1))[:n_samples]
+    # Evenly spaced sample times so tiled copies stay in Timestamp order
+    recording[:, 0] = session_start.timestamp() + np.arange(len(recording)) / sampling_freq
+    return recording
+
+def make_page(rows, first_index):
+    """DynamoDB items for one query page, shaped like RAW_SENSOR_TABLE items"""
+    items = []
+    for offset, row in enumerate(rows):
+        moment = session_start + timedelta(microseconds=(first_index + offset) * 1_000_000 // sampling_freq)
+        key = moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z_000000"
+        items.append({
+            'Timestamp': {'S': key},
+            'Gyroscope_X': {'N': repr(row[1])}, 'Gyroscope_Y': {'N': repr(row[2])}, 'Gyroscope_Z': {'N': repr(row[3])},
+            'Accelerometer_X': {'N': repr(row[4])}, 'Accelerometer_Y': {'N': repr(row[5])}, 'Accelerometer_Z': {'N': repr(row[6])},
+        })
+    return items
+
+def run_session(worker, recording, subject, metrics, collect=None):
+    """
+    Run one session through the worker pipeline, windowed by the worker's own WindowStream.
+    Returns (windows, strides, basal windows, EE values, seconds spent building input pages, summary counters);
+    the result dicts are appended to collect when given.
+    """
+    from sensor_decoding import decode_sensor_page
+    from result_writer import ResultWriter
+    from worker_logging import SessionSummary
+
+    stream = worker.WindowStream(worker.processing_chunk_target_size())
+    result_writer = ResultWriter(DiscardingClient(), 'benchmark-results', metrics=metrics)
+    summary = SessionSummary('benchmark', 'benchmark')
+    ee_values = []
+    page_build_seconds = 0.0
+
+    page_starts = range(0, len(recording), page_size)
+    for page_number, page_start in enumerate(page_starts):
+        build_start = time.perf_counter()
+        items = make_page(recording[page_start:page_start + page_size], page_start)
+        page_build_seconds += time.perf_counter() - build_start
+        with metrics.time('decode'):
+            page = decode_sensor_page(items)
+        batch = stream.add(page, is_last=page_number == len(page_starts) - 1)
+        if batch is not None and batch[1] > 0:
+            results = worker.process_window_batch(stream, batch[0], batch[1], 'benchmark', 'benchmark', subject,
+                                                  result_writer, summary, metrics)
+            ee_values.extend(result['energyExpenditure'] for result in results if result['energyExpenditure'] is not None)
+            if collect is not None:
+                collect.extend(results)
+    with metrics.time('result_flush'):
+        result_writer.close()
+    counters = summary.counters
+    return (counters.get('windows', 0), counters.get('strides', 0), counters.get('basalFallbackWindows', 0),
+            np.array(ee_values), page_build_seconds, counters)
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Peak resident set size in MB (ru_maxrss is KB on Linux, bytes on macOS).
+    RUSAGE_CHILDREN covers pool processes once they have exited.
+    """
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss * scale / 2 ** 20
+
+def benchmark_dataset(worker, hours, subject, repeat, recording_path):
+    from metrics import StageMetrics
+
+    recording = load_dataset(hours, recording_path)
+    best = None
+    for _ in range(repeat):
+        metrics = StageMetrics(keep_samples=True)
+        start_time = time.perf_counter()
+        windows, strides, basal_windows, ee_values, page_build_seconds, counters = run_session(worker, recording, subject, metrics)
+        # Building the input items stands in for DynamoDB and is not part of the pipeline
+        elapsed = time.perf_counter() - start_time - page_build_seconds
+        if best is None or elapsed < best[0]:
+            best = (elapsed, windows, strides, basal_windows, ee_values, metrics, counters)
+    elapsed, windows, strides, basal_windows, ee_values, metrics, counters = best
+    stages = {}
+    for stage, histogram in sorted(metrics.histograms().items()):
+        stages[stage] = {'count': histogram.count, 'totalSeconds': histogram.sum}
+        stages[stage].update({f'p{int(q * 100)}Seconds': histogram.quantile(q) for q in percentiles})
+    return {
+        'samples': len(recording),
+        'seconds': elapsed,
+        'windows': windows,
+        'strides': strides,
+        'basalWindows': basal_windows,
+        'stationaryWindows': counters.get('stationaryWindows', 0),
+        'calibrationReused': counters.get('calibrationReused', 0),
+        'calibrationSearched': counters.get('calibrationSearched', 0),
+        'windowsPerSecond': windows / elapsed,
+        'stridesPerSecond': strides / elapsed,
+        'peakRssMb': peak_rss_mb(),
+        # Parity: identical inputs must give identical EE output across performance changes
+        'eeCount': int(len(ee_values)),
+        'eeSum': float(np.sum(ee_values)),
+        'eeMean': float(np.mean(ee_values)) if len(ee_values) else 0.0,
+        'stages': stages,
+    }
+
+def dataset_name(hours):
+    return 'csv' if hours == 0 else f'{hours:g}h'
+
+def print_report(name, result):
+    print(f"\n{name}: {result['samples']:,} samples, {result['windows']:,} windows, {result['strides']:,} strides "
+          f"({result['basalWindows']:,} basal windows, {result.get('stationaryWindows', 0):,} skipped as stationary) "
+          f"in {result['seconds']:.3f} s")
+    print(f"  {result['windowsPerSecond']:,.1f} windows/s  {result['stridesPerSecond']:,.1f} strides/s  "
+          f"peak RSS {result['peakRssMb']:.0f} MB")
+    aligned = result.get('calibrationReused', 0) + result.get('calibrationSearched', 0)
+    if aligned:
+        print(f"  calibration reused in {result['calibrationReused']:,} of {aligned:,} aligned windows "
+              f"({result['calibrationReused'] / aligned:.1%})")
+    print(f"  {'stage':<16}{'count':>9}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, values in result['stages'].items():
+        print(f"  {stage:<16}{values['count']:>9}{values['totalSeconds']:>10.3f}{values['p50Seconds'] * 1e3:>10.3f}"
+              f"{values['p95Seconds'] * 1e3:>10.3f}{values['p99Seconds'] * 1e3:>10.3f}")
+
+def compare(results, baseline, tolerance, min_seconds=0.0005, ee_rtol=1e-6):
+    """
+    Regressions of results against a baseline: lower throughput, a slower stage median, or different EE output.
+    Tail percentiles are reported but not compared; they are too noisy on short runs.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('datasets', {}).get(name)
+        if base is None:
+            continue
+        for key in ('windowsPerSecond', 'stridesPerSecond'):
+            if base[key] and result[key] < base[key] * (1 - tolerance):
+                regressions.append(f"{name}: {key} {result[key]:,.1f} < baseline {base[key]:,.1f}")
+        for stage, values in result['stages'].items():
+            base_values = base['stages'].get(stage)
+            if base_values is None:
+                continue
+            current, previous = values['p50Seconds'], base_values['p50Seconds']
+            if current > previous * (1 + tolerance) and current - previous > min_seconds:
+                regressions.append(f"{name}: {stage} p50 {current * 1e3:.3f} ms > baseline {previous * 1e3:.3f} ms")
+        if result['eeCount'] != base['eeCount'] or not np.isclose(result['eeSum'], base['eeSum'], rtol=ee_rtol, atol=0):
+            regressions.append(f"{name}: EE output changed ({result['eeCount']} values, sum {result['eeSum']:.6f}; "
+                               f"baseline {base['eeCount']} values, sum {base['eeSum']:.6f})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', default='0,1', help='Comma-separated session lengths in hours; 0 is the bundled CSV as-is')
+    parser.add_argument('--recording', default='./daily_sp_pocket_data.csv', help='Recording to replay: a CSV or a session file')
+    parser.add_argument('--subject', default='S1', help='Subject in subject_info.csv')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per dataset; the fastest is reported')
+    parser.add_argument('--executor', choices=['serial', 'process'], help='Override EXECUTOR_MODE')
+    parser.add_argument('--filter-mode', choices=['session', 'window'], help='Override FILTER_MODE')
+    parser.add_argument('--rotation-solver', choices=['closed_form', 'grid', 'grid_loop'], help='Override ROTATION_SOLVER')
+    parser.add_argument('--model-format', choices=['native', 'pickle'], help='Override MODEL_FORMAT')
+    parser.add_argument('--activity-filter', choices=['peak', 'energy', 'off'], help='Override ACTIVITY_FILTER')
+    parser.add_argument('--calibration-cache', choices=['on', 'off'], help='Override CALIBRATION_CACHE')
+    parser.add_argument('--save-baseline', metavar='PATH', help='Write the results as a JSON baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='Compare against a JSON baseline; exits 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative slowdown before a regression is reported')
+    args = parser.parse_args()
+
+    for env_name, value in (('EXECUTOR_MODE', args.executor), ('FILTER_MODE', args.filter_mode),
+                            ('ROTATION_SOLVER', args.rotation_solver), ('MODEL_FORMAT', args.model_format),
+                            ('ACTIVITY_FILTER', args.activity_filter), ('CALIBRATION_CACHE', args.calibration_cache)):
+        if value:
+            os.environ[env_name] = value
+    # The worker creates its boto3 clients at import; they need a region but are never called here
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('RESULTS_TABLE', 'benchmark-results')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import process_energy_expenditure_worker as worker
+    import utils
+    from profile_cache import make_subject_context
+    from metrics import StageMetrics
+
+    subjects = pd.read_csv('./subject_info.csv')
+    row = subjects.loc[subjects['subject'] == args.subject].iloc[0]
+    subject = make_subject_context({'weight': float(row['weight']), 'height': float(row['height']),
+                                    'age': int(row['age']), 'gender': row['gender']}, utils.basalEst)
+
+    config = {'executorMode': worker.executor_mode, 'executorWorkers': worker.executor_workers,
+              'filterMode': worker.filter_mode, 'rotationSolver': worker.rotation_solver, 'modelFormat': worker.model_format,
+              'activityFilter': worker.activity_filter_mode, 'calibrationCache': worker.calibration_cache_mode,
+              'subject': args.subject}
+    print(f"Benchmark config: {config}")
+    # Warm-up: imports, model caches and (in process mode) pool start-up stay out of the timings
+    run_session(worker, load_dataset(0, args.recording), subject, StageMetrics())
+    results = {}
+    for hours in [float(value) for value in args.hours.split(',')]:
+        name = dataset_name(hours)
+        results[name] = benchmark_dataset(worker, hours, subject, args.repeat, args.recording)
+        print_report(name, results[name])
+    worker.shutdown_window_pool()
+    pool_rss = peak_rss_mb(resource.RUSAGE_CHILDREN) if worker.executor_mode == 'process' else None
+    if pool_rss is not None:
+        print(f"\nPeak RSS of a pool worker: {pool_rss:.0f} MB")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'createdAt': datetime.now(timezone.utc).isoformat(), 'config': config,
+                       'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                                       'machine': platform.machine(), 'cpus': os.cpu_count()},
+                       'poolPeakRssMb': pool_rss, 'datasets': results}, f, indent=2)
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('config') != config:
+            print(f"\nWARNING: baseline config {baseline.get('config')} differs from this run")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Validate the activity pre-filter (ACTIVITY_FILTER) against the full pipeline on a mixed-activity day.
+
+The bundled recording is all walking, so walking bouts cut from it are interleaved with synthetic
+stationary bouts: the phone on a desk (gyro sensor noise and bias, gravity on one axis) and in the
+pocket while sitting (slow posture sway and small fidgets). Each classifier runs the same session
+through the worker pipeline; the report gives the fraction of windows skipped, the speedup over
+ACTIVITY_FILTER=off (end to end, and for the window computation alone) and every window whose EE differs from the full pipeline.
+
+Usage: python benchmark_activity.py --hours 1 --active-fraction 0.3
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+
+sampling_freq = 50  # Sampling frequency in Hz
+bout_seconds = (20, 300)  # Shortest and longest bout
+
+def stationary_bout(rng, n_samples, kind):
+    """(n, 6) gyro (rad/s) and acc (g) samples of the phone lying still ('desk') or in a seated user's pocket ('seated')"""
+    gravity = rng.normal(size=3)
+    gravity /= np.linalg.norm(gravity)
+    t = np.arange(n_samples) / sampling_freq
+    gyro = rng.normal(scale=0.005, size=(n_samples, 3)) + rng.normal(scale=0.01, size=3)
+    acc = np.tile(gravity, (n_samples, 1)) + rng.normal(scale=0.005, size=(n_samples, 3))
+    if kind == 'seated':
+        # Posture sway plus a short fidget every few seconds, all well below walking rates
+        gyro += 0.05 * np.sin(2 * np.pi * 0.2 * t)[:, None] * rng.normal(size=3)
+        fidgets = np.zeros(n_samples)
+        for start in rng.integers(0, n_samples, size=max(1, n_samples // 400)):
+            fidgets[start:start + 25] = 0.3 * np.hanning(len(fidgets[start:start + 25]))
+        gyro += fidgets[:, None] * rng.normal(size=3)
+        acc += 0.02 * rng.normal(size=(n_samples, 3))
+    return np.column_stack((gyro, acc))
+
+def mixed_recording(hours, active_fraction, seed=0, recording_path='./daily_sp_pocket_data.csv'):
+    """An (n, 7) recording like load_dataset's, alternating walking and stationary bouts"""
+    from benchmark import load_dataset
+
+    rng = np.random.default_rng(seed)
+    walking = load_dataset(0, recording_path)[:, 1:]
+    n_samples = int(hours * 3600 * sampling_freq)
+    bouts, total = [], 0
+    while total < n_samples:
+        length = int(rng.uniform(*bout_seconds) * sampling_freq)
+        if rng.random() < active_fraction:
+            offset = rng.integers(len(walking))
+            bout = np.roll(walking, -offset, axis=0)
+            bout = np.tile(bout, (length // len(walking) + 1, 1))[:length]
+        else:
+            bout = stationary_bout(rng, length, rng.choice(['desk', 'seated']))
+        bouts.append(bout)
+        total += length
+    samples = np.concatenate(bouts)[:n_samples]
+    times = np.arange(len(samples)) / sampling_freq
+    return np.column_stack((times, samples))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=1.0, help='Session length in hours')
+    parser.add_argument('--active-fraction', type=float, default=0.3, help='Share of bouts that are walking')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the bout sequence')
+    parser.add_argument('--recording', default='./daily_sp_pocket_data.csv', help='Walking recording for the active bouts: a CSV or a session file')
+    parser.add_argument('--subject', default='S1', help='Subject in subject_info.csv')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per classifier; the fastest is reported')
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    os.environ.setdefault('RESULTS_TABLE', 'benchmark-results')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import pandas as pd
+    import process_energy_expenditure_worker as worker
+    import utils
+    from benchmark import run_session
+    from metrics import StageMetrics
+    from profile_cache import make_subject_context
+
+    subjects = pd.read_csv('./subject_info.csv')
+    row = subjects.loc[subjects['subject'] == args.subject].iloc[0]
+    subject = make_subject_context({'weight': float(row['weight']), 'height': float(row['height']),
+                                    'age': int(row['age']), 'gender': row['gender']}, utils.basalEst)
+    recording = mixed_recording(args.hours, args.active_fraction, args.seed, args.recording)
+    print(f"{len(recording):,} samples ({args.hours:g} h, about {args.active_fraction:.0%} walking bouts), "
+          f"filter mode {worker.filter_mode}, executor {worker.executor_mode}")
+
+    # Models (and in process mode the pool) are loaded before the first timed run
+    worker.warm_up()
+    reference = None
+    for mode in ('off', 'peak', 'energy'):
+        worker.activity_filter_mode = mode
+        best = None
+        for _ in range(args.repeat):
+            results, metrics = [], StageMetrics()
+            start_time = time.perf_counter()
+            windows, _, _, _, page_build_seconds, counters = run_session(worker, recording, subject, metrics, results)
+            elapsed = time.perf_counter() - start_time - page_build_seconds
+            if best is None or elapsed < best[0]:
+                # window_batch covers filtering, the pre-filter and the per-window pipeline, not decoding or results
+                compute = metrics.histograms()['window_batch'].sum
+                best = (elapsed, compute, windows, counters, results)
+        elapsed, compute, windows, counters, results = best
+        per_window = {}
+        for result in results:
+            per_window.setdefault(result['windowIndex'], []).append(result['energyExpenditure'])
+        line = (f"{mode:>7}: {elapsed:7.3f} s ({compute:.3f} s computing windows), "
+                f"{counters.get('stationaryWindows', 0) / windows:6.1%} of {windows:,} windows skipped")
+        if reference is None:
+            reference = (elapsed, compute, per_window)
+        else:
+            changed = [index for index, values in reference[2].items() if per_window.get(index) != values]
+            # Mean power over the session, as the sum of per-window means
+            session_mean = lambda windows_ee: np.mean([np.mean(values) for values in windows_ee.values()])
+            deviation = session_mean(per_window) / session_mean(reference[2]) - 1
+            line += (f"; speedup {reference[0] / elapsed:.2f}x ({reference[1] / compute:.2f}x computing windows), "
+                     f"{len(changed)} windows differ from the full pipeline, mean EE deviation {deviation:+.3%}")
+        print(line)
+    worker.shutdown_window_pool()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Calibration cache validation: reuse rate and EE deviation against the full orientation search.
+
+Each recording is analyzed by batch_analyzer.analyze_recording twice per gravity tolerance, once with a
+full search in every window and once with a CalibrationCache, on:
+
+- sample: the bundled recording as-is
+- tiled: the bundled recording tiled to --hours
+- mixed: walking bouts and synthetic stationary bouts, as in benchmark_activity.py
+
+Usage: python benchmark_calibration.py --hours 1 --tolerances 2,5,10
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import utils
+import batch_analyzer
+from benchmark import load_dataset
+from benchmark_activity import mixed_recording
+from calibration_cache import CalibrationCache
+from metrics import StageMetrics
+from model_artifacts import load_model_pair
+
+alignment_stages = ('calibration', 'rotate_z', 'rotate_y')
+
+def analyze(recording, subject, models, rotation_solver, calibration=None):
+    metrics = StageMetrics()
+    start_time = time.perf_counter()
+    estimates = batch_analyzer.analyze_recording(recording[:, 0], recording[:, 1:7], subject['weight'],
+                                                 subject['height'], subject['basal'], *models,
+                                                 rotation_solver=rotation_solver, metrics=metrics,
+                                                 calibration=calibration)
+    elapsed = time.perf_counter() - start_time
+    histograms = metrics.histograms()
+    alignment = sum(histograms[stage].sum for stage in alignment_stages if stage in histograms)
+    return estimates, elapsed, alignment
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=1.0, help='Length of the tiled and mixed recordings in hours')
+    parser.add_argument('--tolerances', default='2,5,10', help='Comma-separated gravity tolerances in degrees')
+    parser.add_argument('--rotation-solver', choices=['closed_form', 'grid', 'grid_loop'], default='grid')
+    parser.add_argument('--subject', default='S1', help='Subject in subject_info.csv')
+    args = parser.parse_args()
+
+    subjects = pd.read_csv('./subject_info.csv')
+    row = subjects.loc[subjects['subject'] == args.subject].iloc[0]
+    subject = {'weight': float(row['weight']), 'height': float(row['height']),
+               'basal': utils.basalEst(row['height'], row['weight'], row['age'], row['gender'])}
+    models = load_model_pair('.', 'native')
+    recordings = {'sample': load_dataset(0), 'tiled': load_dataset(args.hours), 'mixed': mixed_recording(args.hours, 0.3)}
+    print(f"Rotation solver {args.rotation_solver}; alignment covers the {', '.join(alignment_stages)} stages")
+
+    for name, recording in recordings.items():
+        reference, elapsed, alignment = analyze(recording, subject, models, args.rotation_solver)
+        reference_window_ee = batch_analyzer.window_mean_ee(reference)
+        print(f"\n{name}: {reference.windows:,} windows, {reference.active_windows:,} analyzed for strides; "
+              f"full search {elapsed:.2f} s ({alignment:.2f} s aligning)")
+        for tolerance in [float(value) for value in args.tolerances.split(',')]:
+            calibration = CalibrationCache(tolerance)
+            estimates, cached_elapsed, cached_alignment = analyze(recording, subject, models, args.rotation_solver,
+                                                                  calibration)
+            window_ee = batch_analyzer.window_mean_ee(estimates)
+            deviation = window_ee - reference_window_ee
+            changed = int(np.count_nonzero(deviation))
+            print(f"  {tolerance:4g} deg: reuse {calibration.reuse_rate():6.1%} of {calibration.reused + calibration.searched:,} "
+                  f"aligned windows, {cached_elapsed:.2f} s ({cached_alignment:.2f} s aligning, "
+                  f"{elapsed / cached_elapsed:.2f}x overall); {changed:,} windows changed, "
+                  f"max |window EE dev| {np.max(np.abs(deviation), initial=0):.2f} W, "
+                  f"mean EE deviation {window_ee.mean() / reference_window_ee.mean() - 1:+.3%}")
+
+if __name__ == '__main__':
+    main()
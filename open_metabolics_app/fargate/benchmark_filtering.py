@@ -0,0 +1,65 @@
+"""
+Benchmark per-window filtfilt against session-level filtering on a long synthetic session.
+
+Usage: python benchmark_filtering.py --hours 3
+"""
+
+import argparse
+import time
+import numpy as np
+from scipy import signal
+import utils
+from session_format import load_recording
+# Same filter and window as the worker
+from batch_analyzer import a, b, sampling_freq, sliding_win
+
+def synthetic_session(hours, recording_path='./daily_sp_pocket_data.csv'):
+    """Tile a recording (CSV or session file) to the requested length and return (gyro, acc) arrays"""
+    sensors = load_recording(recording_path).sensors
+    n_samples = int(hours * 3600 * sampling_freq)
+    n_samples -= n_samples % sliding_win
+    reps = int(np.ceil(n_samples / len(sensors)))
+    session = np.tile(np.asarray(sensors, dtype=np.float64), (reps, 1))[:n_samples]
+    return session[:, :3], session[:, 3:]
+
+def filter_per_window(gyro, acc):
+    """Current worker behaviour: filtfilt every 200-sample window separately"""
+    gyro_filtered = np.empty(gyro.shape)
+    acc_filtered = np.empty(acc.shape)
+    for start in range(0, len(gyro), sliding_win):
+        gyro_filtered[start:start + sliding_win] = signal.filtfilt(b, a, gyro[start:start + sliding_win], axis=0)
+        acc_filtered[start:start + sliding_win] = signal.filtfilt(b, a, acc[start:start + sliding_win], axis=0)
+    return gyro_filtered, acc_filtered
+
+def filter_session(gyro, acc):
+    """Filter the whole session in a single pass"""
+    return signal.filtfilt(b, a, gyro, axis=0), signal.filtfilt(b, a, acc, axis=0)
+
+def filter_chunked(gyro, acc, chunk_size=sliding_win * 10):
+    """Bounded-memory session filtering, chunked like the worker's processing batches"""
+    return (utils.filtfilt_chunked(b, a, gyro, chunk_size=chunk_size, overlap=sliding_win),
+            utils.filtfilt_chunked(b, a, acc, chunk_size=chunk_size, overlap=sliding_win))
+
+def run(name, filter_fn, gyro, acc, reference=None):
+    start_time = time.perf_counter()
+    gyro_filtered, acc_filtered = filter_fn(gyro, acc)
+    elapsed = time.perf_counter() - start_time
+    n_windows = len(gyro) // sliding_win
+    line = f"{name:<12} {elapsed:8.3f} s  {len(gyro) / elapsed:14,.0f} samples/s  {n_windows / elapsed:12,.0f} windows/s"
+    if reference is not None:
+        max_dev = max(np.max(np.abs(gyro_filtered - reference[0])), np.max(np.abs(acc_filtered - reference[1])))
+        line += f"  max |dev| vs session: {max_dev:.2e}"
+    print(line)
+    return gyro_filtered, acc_filtered
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hours', type=float, default=3.0, help='Length of the synthetic session in hours')
+    parser.add_argument('--recording', default='./daily_sp_pocket_data.csv', help='Recording to tile: a CSV or a session file')
+    args = parser.parse_args()
+
+    gyro, acc = synthetic_session(args.hours, args.recording)
+    print(f"Synthetic session: {args.hours} h, {len(gyro):,} samples, {len(gyro) // sliding_win:,} windows")
+    reference = run('session', filter_session, gyro, acc)
+    run('chunked', filter_chunked, gyro, acc, reference)
+    run('per-window', filter_per_window, gyro, acc, reference)
@@ -0,0 +1,98 @@
+"""
+Startup benchmark: import time, time to ready and peak RSS for each SERVICE_TYPE in start.sh.
+
+Every run is a fresh interpreter, as in a new ECS task. 'api' imports process_energy_expenditure (what
+gunicorn loads); 'worker' imports process_energy_expenditure_worker and then runs warm_up(), which is
+what main() does before its first SQS poll unless PRELOAD_MODELS=false. Clients are created for the
+real AWS backend but never called, so no AWS access is needed.
+
+Usage: python benchmark_startup.py --service api,worker --repeat 5
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules the API should never import; reported per run so regressions are easy to spot
+heavy_modules = ('numpy', 'scipy', 'pandas', 'matplotlib', 'sklearn', 'xgboost')
+
+service_modules = {'api': 'process_energy_expenditure', 'worker': 'process_energy_expenditure_worker'}
+
+child_script = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import {module} as service
+import_seconds = time.perf_counter() - start
+import_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+loaded = [name for name in {heavy_modules!r} if name in sys.modules]
+if getattr(service, 'preload_models', False):
+    service.warm_up()
+ready_seconds = time.perf_counter() - start
+children_rss_mb = 0.0
+if hasattr(service, 'shutdown_window_pool'):
+    service.shutdown_window_pool()
+    children_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+print(json.dumps({{'importSeconds': import_seconds, 'readySeconds': ready_seconds, 'importRssMb': import_rss_mb,
+                  'peakRssMb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  'poolWorkerRssMb': children_rss_mb, 'heavyModules': loaded}}))
+'''
+
+def run_once(service: str, env: dict) -> dict:
+    script = child_script.format(module=service_modules[service], heavy_modules=heavy_modules)
+    completed = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        raise SystemExit(f"{service} failed to start:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--service', default='api,worker', help='Comma-separated service types (api, worker)')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per service type')
+    parser.add_argument('--executor', choices=['serial', 'process'], help='Override EXECUTOR_MODE for the worker')
+    parser.add_argument('--no-preload', action='store_true', help='Skip the worker warm-up (PRELOAD_MODELS=false)')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    if args.executor:
+        env['EXECUTOR_MODE'] = args.executor
+    if args.no_preload:
+        env['PRELOAD_MODELS'] = 'false'
+
+    results = {}
+    for service in args.service.split(','):
+        if service not in service_modules:
+            raise SystemExit(f"Unknown service type {service!r}; expected one of {sorted(service_modules)}")
+        runs = [run_once(service, env) for _ in range(args.repeat)]
+        results[service] = {
+            'importSeconds': round(median([run['importSeconds'] for run in runs]), 3),
+            'readySeconds': round(median([run['readySeconds'] for run in runs]), 3),
+            'maxReadySeconds': round(max(run['readySeconds'] for run in runs), 3),
+            'importRssMb': round(median([run['importRssMb'] for run in runs]), 1),
+            'peakRssMb': round(median([run['peakRssMb'] for run in runs]), 1),
+            'poolWorkerRssMb': round(median([run['poolWorkerRssMb'] for run in runs]), 1),
+            'heavyModules': runs[-1]['heavyModules'],
+        }
+        summary = results[service]
+        print(f"{service:>6}: import {summary['importSeconds']:.3f} s, ready {summary['readySeconds']:.3f} s "
+              f"(max {summary['maxReadySeconds']:.3f} s), RSS {summary['importRssMb']:.0f} MB after import, "
+              f"{summary['peakRssMb']:.0f} MB peak"
+              + (f", pool worker {summary['poolWorkerRssMb']:.0f} MB" if summary['poolWorkerRssMb'] else '')
+              + f"; heavy modules at import: {', '.join(summary['heavyModules']) or 'none'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.json}")
+
+if __name__ == '__main__':
+    main()
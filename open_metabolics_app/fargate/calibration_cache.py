@@ -0,0 +1,122 @@
+"""
+Per-session calibration cache: reuse one window's pocket orientation for the windows after it.
+
+The phone usually stays in the same pocket orientation for minutes, yet every window reruns the z and y
+orientation searches. The cache keeps the result of the last full search: the z rotation and theta_z, the
+complete calibration rotation (z, y and the 180-degree flip) and theta_y, and the gravity direction and
+principal axis it was found for. A new window reuses the cached rotation when all of these hold:
+
+- its gravity direction (mean filtered acceleration) is within gravity_tolerance_deg of the cached one
+- its principal gyro axis after the cached z rotation is the cached one
+- under the cached rotation its positive calibrated z gyro samples outweigh the negative ones, so the
+  180-degree flip would not be applied
+
+Otherwise the window gets the full search, and its result replaces the cache.
+
+CalibrationCache(), the worker's CALIBRATION_GRAVITY_TOLERANCE_DEG and main.py's --calibration-tolerance all
+default to DEFAULT_GRAVITY_TOLERANCE_DEG, so offline and worker runs reuse calibrations under the same rule. In the worker's
+EXECUTOR_MODE=process, each pool slice of a batch runs on a fork() of the cache as of the batch start and
+the slices are join()ed afterwards. A slice therefore cannot reuse a calibration found by an earlier slice
+of the same batch, and reuse (and EE) differs from serial mode.
+
+A reused rotation is close to, but not always exactly, what the full search would find, so EE values can
+differ. benchmark_calibration.py reports the reuse rate and the EE deviation.
+"""
+
+import json
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from scipy.linalg import norm
+import utils
+
+DEFAULT_GRAVITY_TOLERANCE_DEG = 2.0  # Largest gravity direction change that keeps the cached orientation
+
+def _unit(vector: np.ndarray) -> Optional[np.ndarray]:
+    length = np.linalg.norm(vector)
+    return vector / length if length > 0 and np.isfinite(length) else None
+
+class CalibrationCache:
+    """The last calibration of a session, with counts of reused and searched windows"""
+
+    def __init__(self, gravity_tolerance_deg: float = DEFAULT_GRAVITY_TOLERANCE_DEG):
+        self.gravity_tolerance_deg = gravity_tolerance_deg
+        self.min_gravity_cos = np.cos(np.deg2rad(gravity_tolerance_deg))
+        self.rotation_z = None
+        self.rotation = None
+        self.gravity = None
+        self.prin_idx = None
+        self.theta_z = 0
+        self.theta_y = 0
+        self.reused = 0
+        self.searched = 0
+
+    def lookup(self, gyro_filtered: np.ndarray, acc_filtered: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(calibrated gyro, rotation) when the cached calibration fits this filtered window, else None"""
+        if self.rotation is not None and self._fits(gyro_filtered, acc_filtered):
+            gyro_cal = np.matmul(gyro_filtered, self.rotation)
+            gyro_z = gyro_cal[:, -1]
+            if norm(gyro_z[gyro_z > 0], ord=2) > norm(gyro_z[gyro_z < 0], ord=2):
+                self.reused += 1
+                return gyro_cal, self.rotation
+        self.searched += 1
+        return None
+
+    def _fits(self, gyro_filtered: np.ndarray, acc_filtered: np.ndarray) -> bool:
+        gravity = _unit(np.mean(acc_filtered, axis=0))
+        if gravity is None or np.dot(gravity, self.gravity) < self.min_gravity_cos:
+            return False
+        return utils.find_prin_axis(np.matmul(gyro_filtered, self.rotation_z)) == self.prin_idx
+
+    def store(self, acc_filtered: np.ndarray, rotation_z: np.ndarray, theta_z: int, prin_idx: int, rotation: np.ndarray,
+              theta_y: int):
+        """Cache the result of a full search on this window (batch_analyzer.calibrate_window)"""
+        gravity = _unit(np.mean(acc_filtered, axis=0))
+        if gravity is None:
+            return
+        self.rotation_z, self.theta_z, self.prin_idx = np.asarray(rotation_z, dtype=float), int(theta_z), int(prin_idx)
+        self.rotation, self.theta_y, self.gravity = np.asarray(rotation, dtype=float), int(theta_y), gravity
+
+    def _copy_calibration(self, other: 'CalibrationCache'):
+        self.rotation_z, self.theta_z, self.prin_idx = other.rotation_z, other.theta_z, other.prin_idx
+        self.rotation, self.theta_y, self.gravity = other.rotation, other.theta_y, other.gravity
+
+    def reuse_rate(self) -> float:
+        total = self.reused + self.searched
+        return self.reused / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {'reused': self.reused, 'searched': self.searched, 'reuseRate': round(self.reuse_rate(), 4)}
+
+    def fork(self) -> 'CalibrationCache':
+        """A copy of the cached calibration with zero counts, for a slice of windows run elsewhere"""
+        forked = CalibrationCache(self.gravity_tolerance_deg)
+        forked._copy_calibration(self)
+        return forked
+
+    def join(self, forks: Iterable['CalibrationCache']):
+        """Take over the counts of forks run in window order, and the calibration of the last one that has one"""
+        for forked in forks:
+            self.reused += forked.reused
+            self.searched += forked.searched
+            if forked.rotation is not None:
+                self._copy_calibration(forked)
+
+    def state(self) -> str:
+        """JSON for a checkpoint; floats round-trip exactly, so a resumed session reuses the same rotation"""
+        fields = {'reused': self.reused, 'searched': self.searched}
+        if self.rotation is not None:
+            fields.update(rotationZ=self.rotation_z.ravel().tolist(), thetaZ=self.theta_z, prinIdx=self.prin_idx,
+                          rotation=self.rotation.ravel().tolist(), thetaY=self.theta_y, gravity=self.gravity.tolist())
+        return json.dumps(fields)
+
+    @classmethod
+    def from_state(cls, state: Optional[str], gravity_tolerance_deg: float = DEFAULT_GRAVITY_TOLERANCE_DEG) -> 'CalibrationCache':
+        cache = cls(gravity_tolerance_deg)
+        if state:
+            fields = json.loads(state)
+            cache.reused, cache.searched = fields.get('reused', 0), fields.get('searched', 0)
+            if 'rotation' in fields:
+                cache.rotation_z, cache.theta_z = np.array(fields['rotationZ']).reshape(3, 3), fields['thetaZ']
+                cache.rotation, cache.theta_y = np.array(fields['rotation']).reshape(3, 3), fields['thetaY']
+                cache.gravity, cache.prin_idx = np.array(fields['gravity']), fields['prinIdx']
+        return cache
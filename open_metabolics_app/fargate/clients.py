@@ -0,0 +1,36 @@
+"""
+DynamoDB and SQS clients of the API and the worker, created the same way for both services.
+"""
+
+import os
+from typing import Any, Dict
+import boto3
+from botocore.config import Config
+
+storage_backend = os.environ.get('STORAGE_BACKEND', 'aws')  # 'aws', or 'memory' for the local_backends stand-ins
+
+def create_clients():
+    """DynamoDB and SQS clients for STORAGE_BACKEND"""
+    if storage_backend == 'memory':
+        import local_backends
+        return local_backends.shared_dynamodb(), local_backends.shared_sqs()
+    return boto3.client('dynamodb', config=Config(
+        retries = dict(
+            max_attempts = 3,
+            mode = 'adaptive'
+        ),
+        connect_timeout = 5,
+        read_timeout = 30
+    )), boto3.client('sqs')
+
+def client_setter(service_globals: Dict[str, Any]):
+    """
+    The set_clients(dynamodb_client=None, sqs_client=None) of a service module: it replaces the module's
+    dynamodb and/or sqs client, e.g. with local_backends stand-ins in tests and load runs
+    """
+    def set_clients(dynamodb_client=None, sqs_client=None):
+        if dynamodb_client is not None:
+            service_globals['dynamodb'] = dynamodb_client
+        if sqs_client is not None:
+            service_globals['sqs'] = sqs_client
+    return set_clients
@@ -0,0 +1,120 @@
+"""
+End-to-end load generator: pushes synthetic sessions through the API and the worker on local backends.
+
+Every session is the bundled daily_sp_pocket_data.csv tiled to --minutes. Raw items are written to the
+in-memory RAW_SENSOR_TABLE, jobs are queued through the Flask app's POST /process, and the worker's own
+main loop consumes them (queue -> read -> compute -> write). No AWS access is needed.
+
+Usage: python load_generator.py --sessions 20 --minutes 5 --concurrency 2
+"""
+
+import argparse
+import os
+import threading
+import time
+import numpy as np
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=10, help='Number of synthetic sessions')
+    parser.add_argument('--minutes', type=float, default=5.0, help='Length of each session in minutes')
+    parser.add_argument('--concurrency', type=int, default=1, help='MAX_IN_FLIGHT_SESSIONS for the worker')
+    parser.add_argument('--executor', choices=['serial', 'process'], help='Override EXECUTOR_MODE')
+    parser.add_argument('--direct', action='store_true', help='Send jobs straight to the queue instead of POST /process')
+    parser.add_argument('--timeout', type=float, default=600.0, help='Give up after this many seconds')
+    args = parser.parse_args()
+
+    os.environ['STORAGE_BACKEND'] = 'memory'
+    os.environ['MAX_IN_FLIGHT_SESSIONS'] = str(args.concurrency)
+    if args.executor:
+        os.environ['EXECUTOR_MODE'] = args.executor
+    for env_name, default in (('RAW_SENSOR_TABLE', 'RawSensorData'), ('RESULTS_TABLE', 'EnergyExpenditureResults'),
+                              ('USER_PROFILES_TABLE', 'UserProfiles'), ('PROCESSING_STATUS_TABLE', 'ProcessingStatus'),
+                              ('PROCESSING_QUEUE_URL', 'local://sqs/processing'), ('LOG_LEVEL', 'WARNING')):
+        os.environ.setdefault(env_name, default)
+
+    import json
+    import local_backends
+    import process_energy_expenditure as api
+    import process_energy_expenditure_worker as worker
+    from benchmark import load_dataset, make_page
+
+    dynamodb = local_backends.shared_dynamodb()
+    sqs = local_backends.shared_sqs()
+    user_email = 'load-test@example.com'
+    dynamodb.put_item(TableName=os.environ['USER_PROFILES_TABLE'], Item={
+        'UserEmail': {'S': user_email}, 'Weight': {'N': '77'}, 'Height': {'N': '1.78'},
+        'Age': {'N': '34'}, 'Gender': {'S': 'M'}, 'LastUpdated': {'S': '2025-01-01T00:00:00.000Z'}})
+
+    # Seed raw sensor data the way uploads store it
+    recording = load_dataset(args.minutes / 60)
+    session_ids = [f'load-session-{i:04d}' for i in range(args.sessions)]
+    seed_start = time.perf_counter()
+    for session_id in session_ids:
+        for page_start in range(0, len(recording), 1000):
+            items = make_page(recording[page_start:page_start + 1000], page_start)
+            for batch_start in range(0, len(items), 25):
+                dynamodb.batch_write_item(RequestItems={os.environ['RAW_SENSOR_TABLE']: [
+                    {'PutRequest': {'Item': dict(item, SessionId={'S': session_id})}}
+                    for item in items[batch_start:batch_start + 25]]})
+    print(f"Seeded {args.sessions} sessions x {len(recording):,} samples in {time.perf_counter() - seed_start:.1f} s")
+
+    # Queue every job, then let the worker drain the queue
+    enqueued_at = {}
+    client = api.app.test_client()
+    for session_id in session_ids:
+        enqueued_at[session_id] = time.perf_counter()
+        if args.direct:
+            sqs.send_message(QueueUrl=os.environ['PROCESSING_QUEUE_URL'],
+                             MessageBody=json.dumps({'session_id': session_id, 'user_email': user_email}))
+        else:
+            response = client.post('/process', json={'session_id': session_id, 'user_email': user_email})
+            if response.status_code != 202:
+                raise SystemExit(f"POST /process failed for {session_id}: {response.status_code} {response.get_json()}")
+
+    finished_at = {}
+    final_status = {}
+
+    def monitor():
+        deadline = time.perf_counter() + args.timeout
+        while len(finished_at) < len(session_ids) and time.perf_counter() < deadline:
+            for session_id in session_ids:
+                if session_id in finished_at:
+                    continue
+                item = dynamodb.get_item(TableName=os.environ['PROCESSING_STATUS_TABLE'],
+                                         Key={'SessionId': {'S': session_id}}).get('Item', {})
+                status = item.get('Status', {}).get('S')
+                if status in ('completed', 'failed'):
+                    finished_at[session_id] = time.perf_counter()
+                    final_status[session_id] = status
+            time.sleep(0.01)
+        worker.shutdown_requested.set()
+
+    monitor_thread = threading.Thread(target=monitor, name='load-monitor', daemon=True)
+    monitor_thread.start()
+    worker.main()
+    monitor_thread.join()
+    worker.shutdown_window_pool()
+
+    latencies = np.array([finished_at[session_id] - enqueued_at[session_id] for session_id in finished_at])
+    wall_time = max(finished_at.values()) - min(enqueued_at.values()) if finished_at else 0.0
+    completed = sum(1 for status in final_status.values() if status == 'completed')
+    results = sum(len(dynamodb.query(TableName=os.environ['RESULTS_TABLE'], KeyConditionExpression='SessionId = :sid',
+                                     ExpressionAttributeValues={':sid': {'S': session_id}})['Items'])
+                  for session_id in session_ids)
+    samples = len(recording) * len(finished_at)
+
+    print(f"\nSessions: {completed} completed, {len(final_status) - completed} failed, "
+          f"{args.sessions - len(finished_at)} unfinished (concurrency {args.concurrency}, executor {worker.executor_mode})")
+    if wall_time > 0:
+        print(f"Throughput: {len(finished_at) / wall_time:.2f} sessions/s, {samples / wall_time:,.0f} samples/s, "
+              f"{results / wall_time:,.0f} results/s over {wall_time:.2f} s")
+    print(f"Latency (queued -> finished): p50 {percentile(latencies, 50):.2f} s, p95 {percentile(latencies, 95):.2f} s, "
+          f"p99 {percentile(latencies, 99):.2f} s, max {latencies.max() if len(latencies) else 0.0:.2f} s")
+    print(f"DynamoDB calls (including this script's seeding and status polling): {dynamodb.call_counts}")
+
+if __name__ == '__main__':
+    main()
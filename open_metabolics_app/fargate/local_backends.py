@@ -0,0 +1,387 @@
+"""
+In-memory stand-ins for the DynamoDB and SQS clients used by the API and the worker.
+
+They implement the boto3 low-level client calls the services make (query, get_item, put_item,
+batch_write_item, update_item; send_message, receive_message, delete_message,
+change_message_visibility) with the same request and response shapes, so the full
+queue -> read -> compute -> write path runs in one process without AWS.
+Select them with STORAGE_BACKEND=memory.
+"""
+
+import copy
+import itertools
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Any, List, Optional, Tuple
+
+# Key schema of the application tables (environment variable -> (hash key, range key))
+APP_TABLES = {
+    'RAW_SENSOR_TABLE': ('SessionId', 'Timestamp'),
+    'RESULTS_TABLE': ('SessionId', 'Timestamp'),
+    'USER_PROFILES_TABLE': ('UserEmail', None),
+    'PROCESSING_STATUS_TABLE': ('SessionId', None),
+}
+
+_KEY_CONDITION = re.compile(
+    r'^\s*(?P<hash_name>[#\w]+)\s*=\s*(?P<hash_value>:\w+)'
+    r'(?:\s+AND\s+(?P<range_name>[#\w]+)\s*(?P<op>=|<=|>=|<|>|BETWEEN)\s*(?P<value>:\w+)(?:\s+AND\s+(?P<value2>:\w+))?)?\s*$',
+    re.IGNORECASE)
+_SET_ACTION = re.compile(r'^\s*([#\w]+)\s*=\s*(:\w+)\s*$')
+_CONDITION_TOKEN = re.compile(r'\s*(\(|\)|=|attribute_not_exists\b|attribute_exists\b|AND\b|OR\b|NOT\b|[#\w.]+|:\w+)')
+
+class LocalClientError(Exception):
+    """
+    Raised for requests the real service would reject (unknown table, malformed expression). Like
+    botocore's ClientError, it carries the error code in response['Error']['Code'].
+    """
+
+    def __init__(self, message: str, code: str = 'ValidationException'):
+        super().__init__(message)
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+def _scalar(attribute: Dict[str, Any]):
+    """Comparable value of a key attribute ({'S': ...} or {'N': ...})"""
+    if 'N' in attribute:
+        return float(attribute['N'])
+    return attribute.get('S', attribute.get('B'))
+
+def _condition_holds(item: Optional[Dict[str, Any]], condition: str, names: Dict[str, str],
+                     values: Dict[str, Any]) -> bool:
+    """
+    Evaluate a ConditionExpression built from attribute_exists/attribute_not_exists(path), path = :value,
+    NOT, AND, OR and parentheses; paths may reach into map attributes (#a.#b)
+    """
+    tokens = _CONDITION_TOKEN.findall(condition)
+    if ''.join(tokens).replace(' ', '') != condition.replace(' ', ''):
+        raise LocalClientError(f"Unsupported condition expression: {condition}")
+    position = 0
+
+    def take(expected: str = None) -> str:
+        nonlocal position
+        if position >= len(tokens) or (expected is not None and tokens[position].upper() != expected.upper()):
+            raise LocalClientError(f"Unsupported condition expression: {condition}")
+        position += 1
+        return tokens[position - 1]
+
+    def peek() -> str:
+        return tokens[position].upper() if position < len(tokens) else ''
+
+    def resolve(path: str) -> Optional[Dict[str, Any]]:
+        value = {'M': item or {}}
+        for name in path.split('.'):
+            value = value.get('M', {}).get(names.get(name, name)) if value is not None else None
+        return value
+
+    def operand() -> bool:
+        token = take()
+        if token.upper() == 'NOT':
+            return not operand()
+        if token == '(':
+            result = disjunction()
+            take(')')
+            return result
+        if token.lower() in ('attribute_exists', 'attribute_not_exists'):
+            take('(')
+            exists = resolve(take()) is not None
+            take(')')
+            return exists if token.lower() == 'attribute_exists' else not exists
+        take('=')
+        actual, expected = resolve(token), values[take()]
+        if actual is not None and 'N' in actual and 'N' in expected:
+            return float(actual['N']) == float(expected['N'])
+        return actual == expected
+
+    def conjunction() -> bool:
+        result = operand()
+        while peek() == 'AND':
+            take()
+            result = operand() and result
+        return result
+
+    def disjunction() -> bool:
+        result = conjunction()
+        while peek() == 'OR':
+            take()
+            result = conjunction() or result
+        return result
+
+    result = disjunction()
+    if position != len(tokens):
+        raise LocalClientError(f"Unsupported condition expression: {condition}")
+    return result
+
+class _Table:
+    def __init__(self, hash_key: str, range_key: Optional[str]):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # hash value -> (sorted range values, {range value: item})
+        self.partitions: Dict[Any, Tuple[List[Any], Dict[Any, Dict[str, Any]]]] = {}
+
+    def key_of(self, item: Dict[str, Any]):
+        try:
+            hash_value = _scalar(item[self.hash_key])
+            range_value = _scalar(item[self.range_key]) if self.range_key else None
+        except KeyError as e:
+            raise LocalClientError(f"Item is missing key attribute {e}")
+        return hash_value, range_value
+
+    def put(self, item: Dict[str, Any]):
+        hash_value, range_value = self.key_of(item)
+        order, items = self.partitions.setdefault(hash_value, ([], {}))
+        if range_value not in items:
+            insort(order, range_value)
+        items[range_value] = copy.deepcopy(item)
+
+    def get(self, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        hash_value, range_value = self.key_of(key)
+        partition = self.partitions.get(hash_value)
+        return partition[1].get(range_value) if partition else None
+
+    def delete(self, key: Dict[str, Any]):
+        hash_value, range_value = self.key_of(key)
+        partition = self.partitions.get(hash_value)
+        if partition and range_value in partition[1]:
+            del partition[1][range_value]
+            partition[0].remove(range_value)
+
+class LocalDynamoDB:
+    """Thread-safe in-memory DynamoDB low-level client for the calls this service makes"""
+
+    def __init__(self):
+        self._tables: Dict[str, _Table] = {}
+        self._lock = threading.Lock()
+        self.call_counts: Dict[str, int] = {}
+
+    def create_table(self, table_name: str, hash_key: str, range_key: Optional[str] = None):
+        with self._lock:
+            self._tables.setdefault(table_name, _Table(hash_key, range_key))
+
+    def _table(self, table_name: str) -> _Table:
+        table = self._tables.get(table_name)
+        if table is None:
+            raise LocalClientError(f"Requested resource not found: Table: {table_name} not found")
+        return table
+
+    def _count(self, operation: str):
+        self.call_counts[operation] = self.call_counts.get(operation, 0) + 1
+
+    def put_item(self, TableName: str, Item: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._count('put_item')
+            self._table(TableName).put(Item)
+        return {}
+
+    def get_item(self, TableName: str, Key: Dict[str, Any], **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            self._count('get_item')
+            item = self._table(TableName).get(Key)
+            return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def batch_write_item(self, RequestItems: Dict[str, List[Dict[str, Any]]], **kwargs) -> Dict[str, Any]:
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise LocalClientError("Too many items requested for the BatchWriteItem call")
+        with self._lock:
+            self._count('batch_write_item')
+            for table_name, requests in RequestItems.items():
+                table = self._table(table_name)
+                for request in requests:
+                    if 'PutRequest' in request:
+                        table.put(request['PutRequest']['Item'])
+                    else:
+                        table.delete(request['DeleteRequest']['Key'])
+        return {'UnprocessedItems': {}}
+
+    def update_item(self, TableName: str, Key: Dict[str, Any], UpdateExpression: str,
+                    ExpressionAttributeNames: Dict[str, str] = None,
+                    ExpressionAttributeValues: Dict[str, Any] = None, ConditionExpression: str = None,
+                    **kwargs) -> Dict[str, Any]:
+        """Supports SET actions of the form 'SET #a = :a, b = :b' and the conditions of _condition_holds"""
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        if not UpdateExpression.strip().upper().startswith('SET '):
+            raise LocalClientError(f"Unsupported update expression: {UpdateExpression}")
+        updates = {}
+        for action in UpdateExpression.strip()[4:].split(','):
+            match = _SET_ACTION.match(action)
+            if not match:
+                raise LocalClientError(f"Unsupported update action: {action}")
+            updates[names.get(match.group(1), match.group(1))] = values[match.group(2)]
+        with self._lock:
+            self._count('update_item')
+            table = self._table(TableName)
+            stored = table.get(Key)
+            if ConditionExpression and not _condition_holds(stored, ConditionExpression, names, values):
+                raise LocalClientError("The conditional request failed", 'ConditionalCheckFailedException')
+            item = dict(stored or Key)
+            item.update(updates)
+            table.put(item)
+        return {}
+
+    def query(self, TableName: str, KeyConditionExpression: str, ExpressionAttributeValues: Dict[str, Any],
+              ExpressionAttributeNames: Dict[str, str] = None, Limit: int = None, ScanIndexForward: bool = True,
+              ExclusiveStartKey: Dict[str, Any] = None, ProjectionExpression: str = None, **kwargs) -> Dict[str, Any]:
+        names = ExpressionAttributeNames or {}
+        match = _KEY_CONDITION.match(KeyConditionExpression)
+        if not match:
+            raise LocalClientError(f"Unsupported key condition: {KeyConditionExpression}")
+        with self._lock:
+            self._count('query')
+            table = self._table(TableName)
+            if names.get(match.group('hash_name'), match.group('hash_name')) != table.hash_key:
+                raise LocalClientError("Query key condition must use the table's hash key")
+            partition = table.partitions.get(_scalar(ExpressionAttributeValues[match.group('hash_value')]))
+            if partition is None:
+                return {'Items': [], 'Count': 0}
+            order, items = partition
+
+            lo, hi = 0, len(order)
+            op = (match.group('op') or '').upper()
+            if op:
+                value = _scalar(ExpressionAttributeValues[match.group('value')])
+                if op in ('=', '>=', 'BETWEEN'):
+                    lo = bisect_left(order, value)
+                elif op == '>':
+                    lo = bisect_right(order, value)
+                if op == '=':
+                    hi = bisect_right(order, value)
+                elif op == '<=':
+                    hi = bisect_right(order, value)
+                elif op == '<':
+                    hi = bisect_left(order, value)
+                elif op == 'BETWEEN':
+                    hi = bisect_right(order, _scalar(ExpressionAttributeValues[match.group('value2')]))
+            selected = order[lo:hi] if ScanIndexForward else order[lo:hi][::-1]
+
+            if ExclusiveStartKey:
+                start_value = _scalar(ExclusiveStartKey[table.range_key])
+                if ScanIndexForward:
+                    selected = selected[bisect_right(selected, start_value):]
+                else:
+                    selected = [value for value in selected if value < start_value]
+            page = selected[:Limit] if Limit else selected
+            page_items = [copy.deepcopy(items[value]) for value in page]
+
+        if ProjectionExpression:
+            projected = [names.get(name.strip(), name.strip()) for name in ProjectionExpression.split(',')]
+            page_items = [{name: item[name] for name in projected if name in item} for item in page_items]
+        response = {'Items': page_items, 'Count': len(page_items)}
+        if Limit and len(selected) > Limit:
+            last = items[page[-1]]
+            response['LastEvaluatedKey'] = {table.hash_key: last[table.hash_key], table.range_key: last[table.range_key]}
+        return response
+
+class _Message:
+    def __init__(self, body: str):
+        self.message_id = str(uuid.uuid4())
+        self.body = body
+        self.visible_at = 0.0
+        self.receipt_handle = None
+        self.receive_count = 0
+
+class LocalSQS:
+    """
+    Thread-safe in-memory SQS low-level client with visibility timeouts.
+    receive_message waits at most max_wait_seconds (instead of WaitTimeSeconds), so local runs stop quickly.
+    """
+
+    def __init__(self, visibility_timeout: float = 30.0, max_wait_seconds: float = 1.0):
+        self.visibility_timeout = visibility_timeout
+        self.max_wait_seconds = max_wait_seconds
+        self._queues: Dict[str, List[_Message]] = {}
+        self._condition = threading.Condition()
+        self._handles = itertools.count()
+
+    def create_queue(self, QueueName: str, **kwargs) -> Dict[str, Any]:
+        queue_url = QueueName if '://' in QueueName else f'local://sqs/{QueueName}'
+        with self._condition:
+            self._queues.setdefault(queue_url, [])
+        return {'QueueUrl': queue_url}
+
+    def _queue(self, queue_url: str) -> List[_Message]:
+        if queue_url not in self._queues:
+            raise LocalClientError(f"The specified queue does not exist: {queue_url}")
+        return self._queues[queue_url]
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **kwargs) -> Dict[str, Any]:
+        message = _Message(MessageBody)
+        with self._condition:
+            self._queue(QueueUrl).append(message)
+            self._condition.notify_all()
+        return {'MessageId': message.message_id}
+
+    def receive_message(self, QueueUrl: str, MaxNumberOfMessages: int = 1, WaitTimeSeconds: float = 0,
+                        VisibilityTimeout: float = None, **kwargs) -> Dict[str, Any]:
+        deadline = time.monotonic() + min(WaitTimeSeconds, self.max_wait_seconds)
+        visibility = self.visibility_timeout if VisibilityTimeout is None else VisibilityTimeout
+        with self._condition:
+            queue = self._queue(QueueUrl)
+            while True:
+                now = time.monotonic()
+                visible = [message for message in queue if message.visible_at <= now][:MaxNumberOfMessages]
+                if visible or now >= deadline:
+                    break
+                # Wake up for new messages, or when the next in-flight message becomes visible again
+                next_visible = min((message.visible_at for message in queue), default=deadline)
+                self._condition.wait(max(0.0, min(deadline, max(next_visible, now + 0.01)) - now))
+            messages = []
+            for message in visible:
+                message.visible_at = now + visibility
+                message.receive_count += 1
+                message.receipt_handle = f'{message.message_id}#{next(self._handles)}'
+                messages.append({'MessageId': message.message_id, 'ReceiptHandle': message.receipt_handle,
+                                 'Body': message.body})
+        return {'Messages': messages} if messages else {}
+
+    def _find(self, queue_url: str, receipt_handle: str) -> Optional[_Message]:
+        return next((message for message in self._queue(queue_url) if message.receipt_handle == receipt_handle), None)
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str, **kwargs) -> Dict[str, Any]:
+        with self._condition:
+            message = self._find(QueueUrl, ReceiptHandle)
+            if message is not None:
+                self._queues[QueueUrl].remove(message)
+        return {}
+
+    def change_message_visibility(self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: float, **kwargs) -> Dict[str, Any]:
+        with self._condition:
+            message = self._find(QueueUrl, ReceiptHandle)
+            if message is None:
+                raise LocalClientError("Message does not exist or is not available for visibility timeout change")
+            message.visible_at = time.monotonic() + VisibilityTimeout
+            self._condition.notify_all()
+        return {}
+
+    def approximate_counts(self, queue_url: str) -> Tuple[int, int]:
+        """(visible, in flight) message counts"""
+        with self._condition:
+            now = time.monotonic()
+            queue = self._queue(queue_url)
+            visible = sum(1 for message in queue if message.visible_at <= now)
+            return visible, len(queue) - visible
+
+_shared_lock = threading.Lock()
+_shared_dynamodb: Optional[LocalDynamoDB] = None
+_shared_sqs: Optional[LocalSQS] = None
+
+def shared_dynamodb() -> LocalDynamoDB:
+    """Process-wide LocalDynamoDB with the application tables (names from the environment) created"""
+    global _shared_dynamodb
+    with _shared_lock:
+        if _shared_dynamodb is None:
+            _shared_dynamodb = LocalDynamoDB()
+            for env_name, (hash_key, range_key) in APP_TABLES.items():
+                _shared_dynamodb.create_table(os.environ.get(env_name, env_name), hash_key, range_key)
+        return _shared_dynamodb
+
+def shared_sqs() -> LocalSQS:
+    """Process-wide LocalSQS with PROCESSING_QUEUE_URL created"""
+    global _shared_sqs
+    with _shared_lock:
+        if _shared_sqs is None:
+            _shared_sqs = LocalSQS()
+            _shared_sqs.create_queue(QueueName=os.environ.get('PROCESSING_QUEUE_URL', 'local://sqs/processing'))
+        return _shared_sqs
@@ -1,146 +1,96 @@
 """
 Copyright (c) 2025 Harvard Ability Lab
 Title: "A smartphone activity monitor that accurately estimates energy expenditure"
+
+Offline analyzer: energy expenditure for a recording in the daily_sp_pocket_data.csv layout (time, gyro xyz
+in rad/s, acc xyz), computed by batch_analyzer, the pipeline the worker uses. The recording may also be a
+binary session file (session_format), which is memory-mapped instead of parsed.
+
+Usage: python main.py --recording ./daily_sp_pocket_data.csv --subject S1 [--output ee.csv]
+       python main.py --recording ./day.omsession [--output ee.csv]
 """
 
+import argparse
 import os
-import numpy as np
+import time
 import pandas as pd
-import pickle
-import matplotlib.pyplot as plt
-from scipy import signal
-from scipy.linalg import norm
 import utils
-
-# Load subject information from a CSV file
-subj_csv = pd.read_csv('./subject_info.csv')
-target_subj = 'S1'
-subj_info = {
-    'code': subj_csv.loc[subj_csv['subject'] == target_subj, 'subject'].values[0],
-    'weight': subj_csv.loc[subj_csv['subject'] == target_subj, 'weight'].values[0],
-    'height': subj_csv.loc[subj_csv['subject'] == target_subj, 'height'].values[0],
-    'gender': subj_csv.loc[subj_csv['subject'] == target_subj, 'gender'].values[0],
-    'age': subj_csv.loc[subj_csv['subject'] == target_subj, 'age'].values[0]
-}
-
-# Compute the basal metabolic 
-stand_aug_fact = 1.41  # Standing augmentation factor
-height = subj_info['height']
-weight = subj_info['weight']
-age = subj_info['age']
-gender = subj_info['gender']
-cur_basal = utils.basalEst(height, weight, age, gender, stand_aug_fact, kcalPerDay2Watt=0.048426)
-
-# Load energy expenditure estimation and pocket motion correction models
-data_driven_model = pickle.load(open('./data_driven_ee_model.pkl', 'rb'))
-pocket_motion_correction_model = pickle.load(open('./pocket_motion_correction_model.pkl', 'rb'))
-
-# Load daily smartphone data
-csv_path = './daily_sp_pocket_data.csv'
-df_sp = pd.read_csv(csv_path).values
-
-# Constants for the low-pass filter
-sampling_freq = 50  # Sampling frequency in Hz
-cutoff_freq = 6  # Crossover frequency for low-pass filter in Hz
-filt_order = 4  # Filter order
+import batch_analyzer
+from model_artifacts import MODEL_FORMATS, load_model_pair
+from calibration_cache import DEFAULT_GRAVITY_TOLERANCE_DEG, CalibrationCache
+from session_format import load_recording
 
 # Constants for bout detection algorithm
-sliding_win = 200  # Window size for sliding window in samples (4 seconds at 50Hz)
 gyro_norm_thres = 0.5  # Threshold for gyro norm in rad/s
-
-# Define low-pass filter parameters
-b, a = signal.butter(filt_order, cutoff_freq, btype='low', fs=sampling_freq)
-
-# Filter the collected smartphone data
-time_sp = df_sp[:, 0]  # Time data
-gyro_sp = df_sp[:, 1:4]  # Gyroscope data
-acc_sp = df_sp[:, 4:]  # Accelerometer data
-
-# Initialize lists to collect energy expenditure data
-ee_all = []
-time_all = []
-
-start_idx = 0
-n_samples = len(gyro_sp)
-
-while start_idx + sliding_win <= n_samples:
-    # Step 1: Process each detected active bout
-    cur_window_time = time_sp[start_idx:start_idx+sliding_win]
-    cur_pocket_gyro = gyro_sp[start_idx:start_idx+sliding_win, :]
-    cur_pocket_acc = acc_sp[start_idx:start_idx+sliding_win, :]
-
-    # Calculate the L2 norm of gyro data within the current window
-    l2_norm_gyro = np.linalg.norm(cur_pocket_gyro)
-
-    if l2_norm_gyro > gyro_norm_thres:
-        # Apply a low-pass filter to the current window signals
-        cur_pocket_gyro = signal.filtfilt(b, a, cur_pocket_gyro, axis=0)
-        cur_pocket_acc = signal.filtfilt(b, a, cur_pocket_acc, axis=0)
-
-        # Step 2: Orientation alignment with the superior-inferior axis of the thigh
-        opt_rotm_z_pocket, theta_z = utils.get_rotate_z(cur_pocket_acc)
-        cur_pocket_gyro_rot_zx = np.matmul(cur_pocket_gyro, opt_rotm_z_pocket)
-
-        # Find principal axis of angular velocity
-        prin_idx_pocket = utils.find_prin_axis(cur_pocket_gyro_rot_zx)
-        prin_gyro_pocket = cur_pocket_gyro_rot_zx[:, prin_idx_pocket]
-        
-        if np.abs(np.max(prin_gyro_pocket)) < np.abs(np.min(prin_gyro_pocket)):
-            prin_gyro_pocket = -prin_gyro_pocket
-
-        # Detect peaks in the principal angular velocity
-        gait_peaks = utils.peak_detect(prin_gyro_pocket)
-        
-        if len(gait_peaks) > 1:  # Consider it a bout if more than 1 peak is detected
-            gait_data_pocket = utils.segment_data(gait_peaks, cur_pocket_gyro_rot_zx, sliding_win)
-            if len(gait_data_pocket) < 1: # if there is no data segmented
-                continue
-
-            # Step 2: Orientation alignment with the mediolateral axis of the thigh
-            avg_gait_data_pocket = np.mean(gait_data_pocket, axis=0)
-            opt_rotm_y_pocket, theta_y = utils.get_rotate_y(avg_gait_data_pocket, prin_idx_pocket)
-            opt_rotm_pocket = np.matmul(opt_rotm_z_pocket, opt_rotm_y_pocket)
-            cur_pocket_gyro_cal = np.matmul(cur_pocket_gyro, opt_rotm_pocket) 
-
-            # Adjust rotation if necessary
-            # If the observed positive peaks are smaller than negative peaks, rotate along y-axis of 180 degrees
-            pos_idx = cur_pocket_gyro_cal[:, -1] > 0
-            neg_idx = cur_pocket_gyro_cal[:, -1] < 0
-            gyro_z_norm_pos = norm(cur_pocket_gyro_cal[pos_idx, -1], ord=2)
-            gyro_z_norm_neg = norm(cur_pocket_gyro_cal[neg_idx, -1], ord=2)
-            
-            if gyro_z_norm_pos <= gyro_z_norm_neg:
-                opt_rotm_pocket = np.matmul(opt_rotm_pocket, utils.rotm_y(np.pi))
-                theta_y += 180
-                if theta_y > 180:
-                    theta_y -= 360
-                cur_pocket_gyro_cal = np.matmul(cur_pocket_gyro, opt_rotm_pocket)
-
-            # Step 3: Gait segmentation and energy expenditure estimation
-            gait_peaks = utils.peak_detect(cur_pocket_gyro_cal[:, -1])
-
-            ee_time, ee_est = utils.estimateMetabolics(
-                model= data_driven_model, time= cur_window_time,
-                gait_data = cur_pocket_gyro_cal, peak_index= gait_peaks,
-                weight = weight, height= height, stride_detect_window=sliding_win, 
-                correction_model=pocket_motion_correction_model
-            )
-            for cur_ee_time, cur_ee_est in zip(ee_time, ee_est):
-                time_all.append(cur_ee_time)
-                ee_all.append(cur_ee_est)
-        else:
-            # If it's not a detectable bout, assign basal rate
-            time_all.append(np.median(cur_window_time))
-            ee_all.append(cur_basal)
+stand_aug_fact = utils.STAND_AUG_FACT  # Standing augmentation factor
+
+def load_subject(subject_csv: str, target_subj: str) -> dict:
+    """Subject information from a CSV file"""
+    subj_csv = pd.read_csv(subject_csv)
+    row = subj_csv.loc[subj_csv['subject'] == target_subj]
+    if row.empty:
+        raise SystemExit(f"Subject {target_subj!r} not found in {subject_csv}")
+    row = row.iloc[0]
+    return {'code': row['subject'], 'weight': row['weight'], 'height': row['height'], 'gender': row['gender'],
+            'age': row['age']}
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate energy expenditure for a smartphone pocket recording')
+    parser.add_argument('--recording', default='./daily_sp_pocket_data.csv',
+                        help='Recording in the daily_sp_pocket_data.csv layout, or a session file')
+    parser.add_argument('--subject', help="Subject in the subject CSV (default: the session file's subject ID, else S1)")
+    parser.add_argument('--subject-csv', default='./subject_info.csv', help='Subject information CSV')
+    parser.add_argument('--model-dir', default='.', help='Directory holding the model artifacts')
+    parser.add_argument('--model-format', choices=MODEL_FORMATS, default=os.environ.get('MODEL_FORMAT', 'native'))
+    parser.add_argument('--rotation-solver', choices=['closed_form', 'grid', 'grid_loop'],
+                        default=os.environ.get('ROTATION_SOLVER', 'grid'),
+                        help="Orientation solver; 'grid' is the original 1000-angle search, batched over a rotation bank, "
+                             "'grid_loop' the original loop")
+    parser.add_argument('--calibration-tolerance', type=float, metavar='DEG', nargs='?',
+                        const=DEFAULT_GRAVITY_TOLERANCE_DEG,
+                        help='Reuse a window\'s orientation for the next windows while gravity stays within DEG '
+                             f'(calibration_cache; approximate; DEG defaults to {DEFAULT_GRAVITY_TOLERANCE_DEG:g}, '
+                             'as in the worker). Default: full search in every window')
+    parser.add_argument('--output', help='Write time, EE and window index to this CSV instead of printing every value')
+    args = parser.parse_args()
+
+    recording = load_recording(args.recording)
+    if recording.sample_rate != batch_analyzer.sampling_freq:
+        raise SystemExit(f"{args.recording} is sampled at {recording.sample_rate:g} Hz; the models expect "
+                         f"{batch_analyzer.sampling_freq} Hz")
+
+    # Compute the basal metabolic rate
+    subj_info = load_subject(args.subject_csv, args.subject or recording.subject_id or 'S1')
+    height = subj_info['height']
+    weight = subj_info['weight']
+    cur_basal = utils.basalEst(height, weight, subj_info['age'], subj_info['gender'], stand_aug_fact)
+
+    # Load energy expenditure estimation and pocket motion correction models
+    data_driven_model, pocket_motion_correction_model = load_model_pair(args.model_dir, args.model_format)
+
+    calibration = CalibrationCache(args.calibration_tolerance) if args.calibration_tolerance is not None else None
+    start_time = time.perf_counter()
+    estimates = batch_analyzer.analyze_recording(recording.time, recording.sensors, weight, height, cur_basal,
+                                                 data_driven_model, pocket_motion_correction_model,
+                                                 gyro_norm_thres=gyro_norm_thres,
+                                                 rotation_solver=args.rotation_solver, calibration=calibration)
+    elapsed = time.perf_counter() - start_time
+
+    if args.output:
+        pd.DataFrame({'time': estimates.time, 'energyExpenditure': estimates.ee,
+                      'windowIndex': estimates.window_index}).to_csv(args.output, index=False)
+        print(f"Wrote {len(estimates.ee):,} estimates to {args.output}")
     else:
-        # If no movement is detected, assign basal rate
-        time_all.append(np.median(cur_window_time))
-        ee_all.append(cur_basal)
-
-    # Move to the next window
-    start_idx += sliding_win
-
-# Print all energy expenditure predictions
-print("\nEnergy Expenditure Predictions (in Watts):")
-for i, ee in enumerate(ee_all):
-    print(f"Time {time_all[i]:.2f}s: {ee:.2f} W")
+        # Print all energy expenditure predictions
+        print("\nEnergy Expenditure Predictions (in Watts):")
+        for cur_time, ee in zip(estimates.time, estimates.ee):
+            print(f"Time {cur_time:.2f}s: {ee:.2f} W")
+    print(f"\n{estimates.windows:,} windows ({estimates.active_windows:,} analyzed for strides, "
+          f"{len(recording.time) / batch_analyzer.sampling_freq / 3600:.2f} h) in {elapsed:.2f} s, "
+          f"{estimates.windows / max(elapsed, 1e-9):,.0f} windows/s")
+    if calibration is not None:
+        print(f"Calibration reused in {calibration.reused:,} of {calibration.reused + calibration.searched:,} aligned "
+              f"windows ({calibration.reuse_rate():.1%})")
+
+if __name__ == '__main__':
+    main()
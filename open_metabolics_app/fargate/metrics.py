@@ -0,0 +1,171 @@
+"""
+Low-overhead stage timing histograms for the EE pipeline, with Prometheus text exposition.
+
+A StageMetrics registry keeps one Histogram per stage. The worker fills one registry per session,
+merges it into the process-wide `process_metrics` when the session ends and stores its summary in
+the processing-status record. Histograms are plain picklable objects, so process-pool workers can
+send their timings back with their results.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Union
+
+# Upper bounds in seconds; covers per-window stages (sub-ms) up to whole sessions
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, float('inf'))
+
+class Histogram:
+    """
+    Fixed-bucket histogram of durations in seconds.
+    With keep_samples=True the raw durations are kept too and quantiles are exact (for benchmarks).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, keep_samples: bool = False):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = [] if keep_samples else None
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+        if self.samples is not None:
+            self.samples.append(value)
+
+    def merge(self, other: 'Histogram'):
+        if other.buckets != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        if self.samples is not None:
+            if other.samples is not None:
+                self.samples.extend(other.samples)
+            elif other.count:
+                self.samples = None  # Exact quantiles are no longer possible
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """
+        The q-quantile: exact when samples are kept, otherwise the upper bound of the bucket
+        holding it (the max for the open last bucket)
+        """
+        if not self.count:
+            return 0.0
+        if self.samples is not None:
+            ordered = sorted(self.samples)
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        rank = q * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+class StageMetrics:
+    """Thread-safe registry of per-stage duration histograms"""
+
+    def __init__(self, keep_samples: bool = False):
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self.keep_samples = keep_samples
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(keep_samples=self.keep_samples)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def histograms(self) -> Dict[str, Histogram]:
+        """Copy of the histograms, e.g. to return them from a pool worker"""
+        with self._lock:
+            copies = {}
+            for stage, histogram in self._histograms.items():
+                copies[stage] = Histogram(histogram.buckets, keep_samples=histogram.samples is not None)
+                copies[stage].merge(histogram)
+            return copies
+
+    def merge(self, other: Union['StageMetrics', Dict[str, Histogram]]):
+        histograms = other.histograms() if isinstance(other, StageMetrics) else other
+        with self._lock:
+            for stage, histogram in histograms.items():
+                if stage not in self._histograms:
+                    self._histograms[stage] = Histogram(histogram.buckets, keep_samples=self.keep_samples)
+                self._histograms[stage].merge(histogram)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage count, total, p50, p95 and max seconds"""
+        return {stage: {'count': histogram.count,
+                        'totalSeconds': round(histogram.sum, 6),
+                        'p50Seconds': round(histogram.quantile(0.5), 6),
+                        'p95Seconds': round(histogram.quantile(0.95), 6),
+                        'maxSeconds': round(histogram.max, 6)}
+                for stage, histogram in sorted(self.histograms().items())}
+
+    def to_prometheus(self, name: str = 'ee_stage_duration_seconds', help_text: str = 'EE pipeline stage durations') -> str:
+        """Prometheus text exposition format, one histogram series per stage"""
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for stage, histogram in sorted(self.histograms().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+# Everything this process has timed since it started
+process_metrics = StageMetrics()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def summary_to_dynamodb(summary: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """StageMetrics.summary() as a DynamoDB map attribute value"""
+    return {'M': {stage: {'M': {field: {'N': str(value)} for field, value in values.items()}}
+                  for stage, values in summary.items()}}
+
+def summary_from_dynamodb(attribute: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    return {stage: {field: float(value['N']) for field, value in values['M'].items()}
+            for stage, values in attribute.get('M', {}).items()}
+
+def start_metrics_server(port: int, registry: StageMetrics = process_metrics) -> ThreadingHTTPServer:
+    """Serve GET /metrics in Prometheus text format on a daemon thread (for processes without Flask)"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes would otherwise log a line each
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
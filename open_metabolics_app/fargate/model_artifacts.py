@@ -0,0 +1,152 @@
+"""
+Model artifacts for the worker: the original pickles or their native, version-safe equivalents.
+
+MODEL_FORMAT=native (the default) loads the EE model as an XGBoost UBJSON booster and the pocket motion
+correction model as its LinearRegression coefficients in a .npz file. Neither needs pickle or the exact
+xgboost/scikit-learn versions that wrote the pickles. The native models predict with
+Booster.inplace_predict on raw NumPy arrays (no sklearn wrapper, no DMatrix) and a plain matmul, and
+return exactly what the pickled models return. MODEL_FORMAT=pickle loads the .pkl files instead.
+
+In both formats the correction model is a LinearCorrection: its weights are extracted once at load time
+and the whole correction stage runs as one matrix multiply per batch of strides. tests/test_model_artifacts.py
+checks it against the original per-stride correction on real strides.
+
+Regenerate (and check) the native files after retraining: python model_artifacts.py --model-dir .
+"""
+
+import argparse
+import os
+import pickle
+from typing import Any, Tuple
+import numpy as np
+
+EE_MODEL_PICKLE = 'data_driven_ee_model.pkl'
+CORRECTION_MODEL_PICKLE = 'pocket_motion_correction_model.pkl'
+EE_MODEL_NATIVE = 'data_driven_ee_model.ubj'
+CORRECTION_MODEL_NATIVE = 'pocket_motion_correction_model.npz'
+
+MODEL_FORMATS = ('native', 'pickle')
+
+class BoosterRegressor:
+    """XGBRegressor.predict without the sklearn wrapper: inplace_predict on the raw booster"""
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    @classmethod
+    def load(cls, path: str) -> 'BoosterRegressor':
+        import xgboost  # Imported here so MODEL_FORMAT=pickle and the API never need it at import
+        booster = xgboost.Booster()
+        booster.load_model(path)
+        return cls(booster)
+
+    def get_booster(self):
+        return self.booster
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # The sklearn wrapper makes this same call for dense CPU input; default missing=nan and all trees
+        return self.booster.inplace_predict(X, predict_type='value')
+
+class LinearCorrection:
+    """
+    LinearRegression.predict from its stored coefficients, plus the whole correction stage folded into
+    one operator: for X = [dur_stride | bin_inputs], bin_inputs - predict(X) == X @ weights + offset.
+    """
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        # [0 | I] selects the binned inputs; subtracting coef folds the artifact estimate into the same matmul
+        n_outputs, n_inputs = self.coef.shape
+        selector = np.hstack((np.zeros((n_outputs, n_inputs - n_outputs)), np.identity(n_outputs)))
+        self.weights = np.ascontiguousarray((selector - self.coef).T)
+        self.offset = -self.intercept
+
+    @classmethod
+    def load(cls, path: str) -> 'LinearCorrection':
+        with np.load(path) as arrays:
+            return cls(arrays['coef'], arrays['intercept'])
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'LinearCorrection':
+        """Extract the weights of a fitted LinearRegression once, so it never runs on the hot loop"""
+        return cls(model.coef_, model.intercept_)
+
+    def save(self, path: str):
+        np.savez(path, coef=self.coef, intercept=self.intercept)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # Same expression as LinearRegression.predict for dense input, so results match bit for bit
+        return X @ self.coef.T + self.intercept
+
+    def correct(self, dur_stride: np.ndarray, bin_inputs: np.ndarray) -> np.ndarray:
+        """Corrected (n_strides, 90) bins for a whole batch: bin_inputs minus the estimated artifact"""
+        return np.column_stack((dur_stride, bin_inputs)) @ self.weights + self.offset
+
+def model_files(model_format: str) -> Tuple[str, str]:
+    """(EE model, correction model) file names for a MODEL_FORMAT"""
+    if model_format == 'native':
+        return EE_MODEL_NATIVE, CORRECTION_MODEL_NATIVE
+    if model_format == 'pickle':
+        return EE_MODEL_PICKLE, CORRECTION_MODEL_PICKLE
+    raise ValueError(f"Unknown model format {model_format!r}; expected one of {MODEL_FORMATS}")
+
+def load_pickles(model_dir: str = '.') -> Tuple[Any, Any]:
+    """The original (XGBRegressor, LinearRegression) pickles, unwrapped"""
+    with open(os.path.join(model_dir, EE_MODEL_PICKLE), 'rb') as f_ddm:
+        ee_model = pickle.load(f_ddm)
+    with open(os.path.join(model_dir, CORRECTION_MODEL_PICKLE), 'rb') as f_pmcm:
+        correction_model = pickle.load(f_pmcm)
+    return ee_model, correction_model
+
+def load_model_pair(model_dir: str = '.', model_format: str = 'native') -> Tuple[Any, Any]:
+    """
+    Load (EE model, correction model). The EE model exposes predict(X); the correction model is always
+    a LinearCorrection, so the sklearn LinearRegression never runs on the hot loop.
+    """
+    ee_file, correction_file = model_files(model_format)
+    if model_format == 'native':
+        return (BoosterRegressor.load(os.path.join(model_dir, ee_file)),
+                LinearCorrection.load(os.path.join(model_dir, correction_file)))
+    ee_model, correction_model = load_pickles(model_dir)
+    return ee_model, LinearCorrection.from_sklearn(correction_model)
+
+def export_native(model_dir: str = '.', check_rows: int = 2000, seed: int = 0) -> bool:
+    """
+    Write the native artifacts next to the pickles and check that both formats predict identically
+    on random inputs. Returns True when the outputs match exactly.
+    """
+    ee_model, correction_model = load_pickles(model_dir)
+    ee_model.get_booster().save_model(os.path.join(model_dir, EE_MODEL_NATIVE))
+    LinearCorrection.from_sklearn(correction_model).save(os.path.join(model_dir, CORRECTION_MODEL_NATIVE))
+    native_ee, native_correction = load_model_pair(model_dir, 'native')
+
+    rng = np.random.default_rng(seed)
+    # Gyro bins are in deg/s and stride durations around 1 s, so scale the inputs to reach most tree splits
+    correction_input = rng.normal(scale=100.0, size=(check_rows, correction_model.n_features_in_))
+    correction_input[:, 0] = rng.uniform(0.6, 2.0, check_rows)
+    ee_input = rng.normal(scale=100.0, size=(check_rows, ee_model.get_booster().num_features()))
+    ee_input[:, :2] = np.column_stack((rng.uniform(40, 120, check_rows), rng.uniform(1.4, 2.0, check_rows)))
+
+    checks = {'ee': (ee_model.predict(ee_input), native_ee.predict(ee_input)),
+              'correction': (correction_model.predict(correction_input), native_correction.predict(correction_input))}
+    identical = True
+    for name, (expected, actual) in checks.items():
+        same = expected.dtype == actual.dtype and np.array_equal(expected, actual)
+        identical = identical and same
+        print(f"{name}: {'identical' if same else 'MISMATCH'} on {check_rows} rows "
+              f"(max abs difference {np.max(np.abs(expected.astype(np.float64) - actual)):.3g})")
+    return identical
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the pickled models to the native artifact format')
+    parser.add_argument('--model-dir', default='.', help='Directory holding the .pkl models')
+    parser.add_argument('--check-rows', type=int, default=2000, help='Random rows used to compare the two formats')
+    args = parser.parse_args()
+    exported = export_native(args.model_dir, args.check_rows)
+    print(f"Wrote {EE_MODEL_NATIVE} and {CORRECTION_MODEL_NATIVE} to {args.model_dir}")
+    if not exported:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
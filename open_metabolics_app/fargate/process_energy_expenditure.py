@@ -1,22 +1,28 @@
 import os
 import json
-import boto3
+import time
 from datetime import datetime
-from flask import Flask, request, jsonify
-from botocore.config import Config
+from flask import Flask, Response, g, request, jsonify
+from clients import client_setter, create_clients
+from metrics import process_metrics, summary_from_dynamodb, PROMETHEUS_CONTENT_TYPE
 
 app = Flask(__name__)
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb', config=Config(
-    retries = dict(
-        max_attempts = 3,
-        mode = 'adaptive'
-    ),
-    connect_timeout = 5,
-    read_timeout = 30
-))
-sqs = boto3.client('sqs')
+dynamodb, sqs = create_clients()
+# Replace the storage and/or queue client, e.g. with local_backends stand-ins in tests and load runs
+set_clients = client_setter(globals())
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    # One histogram per route, e.g. stage="api_get_processing_status"
+    if request.endpoint and request.endpoint != 'metrics':
+        process_metrics.observe(f'api_{request.endpoint}', time.perf_counter() - g.request_start)
+    return response
 
 @app.route('/process', methods=['POST'])
 def queue_energy_expenditure():
@@ -31,6 +37,9 @@ def queue_energy_expenditure():
 
         session_id = data['session_id']
         user_email = data['user_email']
+        # Streaming mode: the client posts after each upload and sets final on the last one
+        incremental = bool(data.get('incremental'))
+        final = bool(data.get('final'))
 
         # Verify session exists in DynamoDB
         try:
@@ -56,18 +65,45 @@ def queue_energy_expenditure():
                 'error': 'Error verifying session data'
             }), 500
 
-        # Initialize processing status in DynamoDB
+        # The profile's LastUpdated tells the worker whether its cached copy of the profile is still current
+        profile_version = None
         try:
-            dynamodb.put_item(
-                TableName=os.environ['PROCESSING_STATUS_TABLE'],
-                Item={
-                    'SessionId': {'S': session_id},
-                    'Status': {'S': 'queued'},
-                    'UserEmail': {'S': user_email},
-                    'QueuedAt': {'S': datetime.utcnow().isoformat()},
-                    'Progress': {'N': '0'}
-                }
+            response = dynamodb.get_item(
+                TableName=os.environ['USER_PROFILES_TABLE'],
+                Key={'UserEmail': {'S': user_email.lower()}},
+                ProjectionExpression='LastUpdated'
             )
+            profile_version = response.get('Item', {}).get('LastUpdated', {}).get('S')
+        except Exception as e:
+            # Without a version the worker falls back to its cache TTL
+            print(f"Error reading profile version: {str(e)}")
+
+        # Initialize processing status in DynamoDB
+        try:
+            if incremental:
+                # Keep the record's Checkpoint: it is where the worker resumes this session's stream
+                dynamodb.update_item(
+                    TableName=os.environ['PROCESSING_STATUS_TABLE'],
+                    Key={'SessionId': {'S': session_id}},
+                    UpdateExpression='SET #status = :status, #userEmail = :userEmail, #queuedAt = :queuedAt',
+                    ExpressionAttributeNames={'#status': 'Status', '#userEmail': 'UserEmail', '#queuedAt': 'QueuedAt'},
+                    ExpressionAttributeValues={
+                        ':status': {'S': 'queued' if final else 'streaming'},
+                        ':userEmail': {'S': user_email},
+                        ':queuedAt': {'S': datetime.utcnow().isoformat()}
+                    }
+                )
+            else:
+                dynamodb.put_item(
+                    TableName=os.environ['PROCESSING_STATUS_TABLE'],
+                    Item={
+                        'SessionId': {'S': session_id},
+                        'Status': {'S': 'queued'},
+                        'UserEmail': {'S': user_email},
+                        'QueuedAt': {'S': datetime.utcnow().isoformat()},
+                        'Progress': {'N': '0'}
+                    }
+                )
         except Exception as e:
             print(f"Error initializing processing status: {str(e)}")
             return jsonify({
@@ -80,6 +116,10 @@ def queue_energy_expenditure():
                 'session_id': session_id,
                 'user_email': user_email
             }
+            if incremental:
+                message.update(incremental=True, final=final)
+            if profile_version:
+                message['profile_version'] = profile_version
             
             response = sqs.send_message(
                 QueueUrl=os.environ['PROCESSING_QUEUE_URL'],
@@ -133,12 +173,19 @@ def get_processing_status(session_id):
         status = response['Item']['Status']['S']
         progress = response['Item'].get('Progress', {'N': '0'})['N']
         error = response['Item'].get('Error', {'S': None})['S']
+        # Per-stage timings written by the worker when the session finished
+        stage_timings = summary_from_dynamodb(response['Item']['StageTimings']) if 'StageTimings' in response['Item'] else None
+        # Windows with stored results so far, for sessions processed in streaming mode
+        checkpoint = response['Item'].get('Checkpoint', {}).get('M', {})
+        windows_processed = int(checkpoint['WindowCount']['N']) if 'WindowCount' in checkpoint else None
 
         return jsonify({
             'session_id': session_id,
             'status': status,
             'progress': float(progress),
-            'error': error
+            'error': error,
+            'stage_timings': stage_timings,
+            'windows_processed': windows_processed
         })
     except Exception as e:
         print(f"Error getting status: {str(e)}")
@@ -164,6 +211,11 @@ def get_processing_results(session_id):
         print(f"Error getting results: {str(e)}")
         return jsonify({'error': 'Error getting processing results'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request timings of this API process in Prometheus text format"""
+    return Response(process_metrics.to_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy'}), 200
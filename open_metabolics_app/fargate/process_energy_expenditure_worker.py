@@ -1,52 +1,115 @@
 import os
 import json
-import boto3
 import time
+import signal as os_signal
+import threading
+import multiprocessing
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
-import pickle
 from scipy import signal
-from scipy.linalg import norm
 import utils
-from botocore.config import Config
+import activity_filter
+import batch_analyzer
+from batch_analyzer import a, b, sliding_win
+from calibration_cache import DEFAULT_GRAVITY_TOLERANCE_DEG, CalibrationCache
+from sensor_decoding import SensorColumns
+from sensor_reader import read_session_pages, prefetch_session_pages, with_last_flag
+from result_writer import ResultWriter
+from profile_cache import PROFILE_VERSION_KEY, ProfileCache, SubjectContext
+from worker_logging import get_logger, log_event, LogSampler, SessionSummary
+from metrics import StageMetrics, process_metrics, summary_to_dynamodb, start_metrics_server
+from model_artifacts import load_model_pair, model_files
+from clients import client_setter, create_clients
 
 # Initialize AWS clients
-dynamodb = boto3.client('dynamodb', config=Config(
-    retries = dict(
-        max_attempts = 3,
-        mode = 'adaptive'
-    ),
-    connect_timeout = 5,
-    read_timeout = 30
-))
-sqs = boto3.client('sqs')
-
-# Load models
-try:
-    data_driven_model = pickle.load(open('./data_driven_ee_model.pkl', 'rb'))
-    with open('./pocket_motion_correction_model.pkl', 'rb') as f_pmcm:
-        pocket_motion_correction_model = pickle.load(f_pmcm)
-    print("Successfully loaded data_driven_ee_model.pkl and pocket_motion_correction_model.pkl")
-except FileNotFoundError as e:
-    print(f"ERROR: Model file not found: {e}. Ensure models are present in the Docker image.")
-    raise
-except Exception as e:
-    print(f"ERROR: Could not load models: {e}")
-    raise
-
-# Constants for signal processing
-sampling_freq = 50  # Sampling frequency in Hz
-cutoff_freq = 6  # Crossover frequency for low-pass filter in Hz
-filt_order = 4  # Filter order
-sliding_win = 200  # Window size for sliding window in samples (4 seconds at 50Hz)
+dynamodb, sqs = create_clients()
+# Replace the storage and/or queue client, e.g. with local_backends stand-ins in tests and load runs
+set_clients = client_setter(globals())
+
+logger = get_logger('worker')
+# Sampled debug records for the per-window and per-stride hot path
+window_log_sampler = LogSampler()
+stride_log_sampler = LogSampler()
+
+# Models, loaded lazily once per process by load_models(): at worker startup (PRELOAD_MODELS) or on
+# the first window batch. Importing this module does not load them (or import xgboost/sklearn).
+model_dir = os.environ.get('MODEL_DIR', '.')  # Directory holding the model artifacts
+model_format = os.environ.get('MODEL_FORMAT', 'native')  # 'native' (UBJSON booster + .npz coefficients) or 'pickle'
+preload_models = os.environ.get('PRELOAD_MODELS', 'true').lower() == 'true'  # Load in main() before polling SQS
+data_driven_model = None
+pocket_motion_correction_model = None
+_models_lock = threading.Lock()
+
+def load_models() -> Tuple[Any, Any]:
+    """Load the EE and pocket motion correction models into this process (no-op when already loaded)"""
+    global data_driven_model, pocket_motion_correction_model
+    if data_driven_model is not None and pocket_motion_correction_model is not None:
+        return data_driven_model, pocket_motion_correction_model
+    with _models_lock:
+        if data_driven_model is not None and pocket_motion_correction_model is not None:
+            return data_driven_model, pocket_motion_correction_model
+        load_start = time.perf_counter()
+        try:
+            ee_model, correction_model = load_model_pair(model_dir, model_format)
+        except FileNotFoundError as e:
+            log_event(logger, logging.ERROR, 'model_file_not_found', error=str(e),
+                      hint='Ensure models are present in the Docker image.')
+            raise
+        except Exception as e:
+            log_event(logger, logging.ERROR, 'model_load_failed', error=str(e))
+            raise
+        # Publish the pair only once both loaded, so other threads never see half of it
+        data_driven_model, pocket_motion_correction_model = ee_model, correction_model
+        load_seconds = time.perf_counter() - load_start
+        process_metrics.observe('model_load', load_seconds)
+        log_event(logger, logging.INFO, 'models_loaded', modelDir=model_dir, modelFormat=model_format,
+                  seconds=round(load_seconds, 3), models=list(model_files(model_format)))
+        return data_driven_model, pocket_motion_correction_model
+
+# Constants for signal processing; the window size and low-pass filter (b, a) come from batch_analyzer
 gyro_norm_thres = 0  # Threshold for gyro norm in rad/s
+rotation_solver = os.environ.get('ROTATION_SOLVER', 'grid')  # 'grid' (original 1000-angle search, batched), 'grid_loop' (its original loop) or 'closed_form' (analytic; changes EE slightly)
+filter_mode = os.environ.get('FILTER_MODE', 'session')  # 'session' (filter each processing batch once) or 'window'
+filter_context = sliding_win  # Raw samples of left/right context kept around session-level filtering
+activity_filter_mode = os.environ.get('ACTIVITY_FILTER', 'peak')  # 'peak' (exact), 'energy' (raw gyro energy/variance) or 'off'
+activity_rms_threshold = float(os.environ.get('ACTIVITY_RMS_THRESHOLD', 0.5))  # 'energy': highest 1 s RMS gyro norm of a stationary window, rad/s
+activity_variance_threshold = float(os.environ.get('ACTIVITY_VARIANCE_THRESHOLD', 0.05))  # 'energy': gyro norm variance of a stationary window, (rad/s)^2
+calibration_cache_mode = os.environ.get('CALIBRATION_CACHE', 'off')  # 'on' reuses a window's orientation for the next windows of the session (approximate)
+calibration_gravity_tolerance = float(os.environ.get('CALIBRATION_GRAVITY_TOLERANCE_DEG', DEFAULT_GRAVITY_TOLERANCE_DEG))  # 'on': largest gravity direction change that keeps the cached orientation, degrees
+executor_mode = os.environ.get('EXECUTOR_MODE', 'serial')  # 'serial' or 'process' (fan windows out to a process pool)
+reader_segments = int(os.environ.get('READER_SEGMENTS', 4))  # Concurrent Timestamp segments per session read; 0 reads sequentially
+reader_queue_pages = int(os.environ.get('READER_QUEUE_PAGES', 4))  # Decoded pages each segment may read ahead
+result_writer_background = os.environ.get('RESULT_WRITER_BACKGROUND', 'false').lower() == 'true'  # Write result batches on a background thread
 
-# Define low-pass filter parameters
-b, a = signal.butter(filt_order, cutoff_freq, btype='low', fs=sampling_freq)
+# Constants for queue consumption
+max_in_flight_sessions = int(os.environ.get('MAX_IN_FLIGHT_SESSIONS', 1))  # Sessions processed concurrently
+heartbeat_interval = int(os.environ.get('HEARTBEAT_INTERVAL_SECONDS', 300))  # 0 disables visibility heartbeats
+visibility_extension = int(os.environ.get('VISIBILITY_EXTENSION_SECONDS', 900))  # Visibility timeout set by each heartbeat
+receive_wait_seconds = 20  # SQS long poll; a SIGTERM during a poll starts the drain up to this late
+drain_timeout = int(os.environ.get('DRAIN_TIMEOUT_SECONDS', 90))  # Time in-flight sessions get to finish after SIGTERM; keep below the task's stopTimeout (120) minus receive_wait_seconds
+checkpoint_interval = float(os.environ.get('CHECKPOINT_INTERVAL_SECONDS', 60))  # Batch jobs save a resume checkpoint this often; 0 disables
+profile_cache_ttl = float(os.environ.get('PROFILE_CACHE_TTL_SECONDS', 300))  # How long a cached user profile is trusted
+profile_cache_size = int(os.environ.get('PROFILE_CACHE_SIZE', 1024))  # Most user profiles kept in the cache
+metrics_port = int(os.environ.get('METRICS_PORT', 0))  # Serve Prometheus /metrics on this port; 0 disables
+shutdown_requested = threading.Event()
 
-def update_processing_status(session_id: str, status: str, progress: float = None, error: str = None):
-    """Update the processing status in DynamoDB"""
+class CheckpointConflict(Exception):
+    """The session's stored checkpoint moved on, or completed, since this run resumed from it"""
+
+def update_processing_status(session_id: str, status: str, progress: float = None, error: str = None,
+                             stage_timings: Dict[str, Dict[str, Any]] = None, checkpoint: Dict[str, Any] = None,
+                             expected_window_count: int = None):
+    """
+    Update the processing status in DynamoDB; stage_timings is a StageMetrics.summary() and checkpoint a
+    WindowStream.checkpoint(), written in the same update as the status.
+    With expected_window_count, the update only applies while the stored checkpoint is still at that
+    WindowCount (0 also matches no checkpoint) and not final; otherwise CheckpointConflict is raised.
+    """
     update_expr = 'SET #status = :status'
     expr_attrs = {
         '#status': 'Status'
@@ -64,6 +127,25 @@ def update_processing_status(session_id: str, status: str, progress: float = Non
         update_expr += ', #error = :error'
         expr_attrs['#error'] = 'Error'
         expr_vals[':error'] = {'S': error}
+
+    if stage_timings is not None:
+        update_expr += ', #stageTimings = :stageTimings'
+        expr_attrs['#stageTimings'] = 'StageTimings'
+        expr_vals[':stageTimings'] = summary_to_dynamodb(stage_timings)
+
+    if checkpoint is not None:
+        update_expr += ', #checkpoint = :checkpoint'
+        expr_attrs['#checkpoint'] = 'Checkpoint'
+        expr_vals[':checkpoint'] = checkpoint_to_dynamodb(checkpoint)
+
+    condition = {}
+    if expected_window_count is not None:
+        expr_attrs.update({'#checkpoint': 'Checkpoint', '#windowCount': 'WindowCount', '#final': 'Final'})
+        expr_vals.update({':expectedWindowCount': {'N': str(expected_window_count)}, ':final': {'BOOL': True}})
+        at_resume_point = '#checkpoint.#windowCount = :expectedWindowCount'
+        if expected_window_count == 0:
+            at_resume_point = f'(attribute_not_exists(#checkpoint) OR {at_resume_point})'
+        condition['ConditionExpression'] = f'{at_resume_point} AND NOT #checkpoint.#final = :final'
     
     try:
         dynamodb.update_item(
@@ -71,10 +153,49 @@ def update_processing_status(session_id: str, status: str, progress: float = Non
             Key={'SessionId': {'S': session_id}},
             UpdateExpression=update_expr,
             ExpressionAttributeNames=expr_attrs,
-            ExpressionAttributeValues=expr_vals
+            ExpressionAttributeValues=expr_vals,
+            **condition
         )
     except Exception as e:
-        print(f"Error updating processing status: {str(e)}")
+        if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            raise CheckpointConflict(f"Checkpoint of session {session_id} is no longer at window {expected_window_count}")
+        log_event(logger, logging.ERROR, 'status_update_failed', sessionId=session_id, status=status, error=str(e))
+
+def checkpoint_to_dynamodb(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    """A WindowStream checkpoint as a DynamoDB map attribute value"""
+    fields = {}
+    for name, value in checkpoint.items():
+        if value is None:
+            fields[name] = {'NULL': True}
+        elif isinstance(value, bool):
+            fields[name] = {'BOOL': value}
+        elif isinstance(value, (int, float)):
+            fields[name] = {'N': str(value)}
+        else:
+            fields[name] = {'S': str(value)}
+    return {'M': fields}
+
+def checkpoint_from_dynamodb(attribute: Dict[str, Any]) -> Dict[str, Any]:
+    checkpoint = {}
+    for name, value in attribute.get('M', {}).items():
+        if 'N' in value:
+            checkpoint[name] = int(value['N'])
+        elif 'BOOL' in value:
+            checkpoint[name] = value['BOOL']
+        elif 'S' in value:
+            checkpoint[name] = value['S']
+        else:
+            checkpoint[name] = None
+    return checkpoint
+
+def load_checkpoint(session_id: str) -> Optional[Dict[str, Any]]:
+    """The checkpoint stored in the session's processing-status record, if any"""
+    response = dynamodb.get_item(
+        TableName=os.environ['PROCESSING_STATUS_TABLE'],
+        Key={'SessionId': {'S': session_id}}
+    )
+    attribute = response.get('Item', {}).get('Checkpoint')
+    return checkpoint_from_dynamodb(attribute) if attribute else None
 
 def get_user_profile(user_email: str) -> Dict[str, Any]:
     """Fetch user profile from DynamoDB"""
@@ -88,7 +209,7 @@ def get_user_profile(user_email: str) -> Dict[str, Any]:
         
         if 'Item' not in response:
             error_msg = f"User profile not found for email: {user_email}"
-            print(f"ERROR: {error_msg}")
+            log_event(logger, logging.ERROR, 'user_profile_not_found', userEmail=user_email)
             raise Exception(error_msg)
             
         item = response['Item']
@@ -97,173 +218,312 @@ def get_user_profile(user_email: str) -> Dict[str, Any]:
                 'weight': float(item['Weight']['N']),
                 'height': float(item['Height']['N']),
                 'age': int(item['Age']['N']),
-                'gender': item['Gender']['S']
+                'gender': item['Gender']['S'],
+                PROFILE_VERSION_KEY: item.get('LastUpdated', {}).get('S')
             }
             if not all(k in user_profile_data for k in ['weight', 'height', 'age', 'gender']):
                 raise ValueError("One or more profile fields are missing.")
             return user_profile_data
         except KeyError as ke:
             error_msg = f"Missing expected field in user profile for {user_email}: {ke}"
-            print(f"ERROR: {error_msg}")
+            log_event(logger, logging.ERROR, 'user_profile_invalid', userEmail=user_email, error=error_msg)
             raise Exception(error_msg)
         except ValueError as ve:
             error_msg = f"Invalid data type in user profile for {user_email}: {ve}"
-            print(f"ERROR: {error_msg}")
+            log_event(logger, logging.ERROR, 'user_profile_invalid', userEmail=user_email, error=error_msg)
             raise Exception(error_msg)
 
     except Exception as e:
-        print(f"Error fetching/parsing user profile for {user_email}: {e}")
+        log_event(logger, logging.ERROR, 'user_profile_fetch_failed', userEmail=user_email, error=str(e))
         raise Exception(f"Could not retrieve or parse user profile for {user_email}.")
 
+# Profiles and their basal rates are looked up once per user, not once per session or window
+profile_cache = ProfileCache(get_user_profile, utils.basalEst, ttl=profile_cache_ttl, max_entries=profile_cache_size)
+
+def segment_window_strides(gyro_array: np.ndarray, acc_array: np.ndarray, prefiltered: bool = False, metrics: StageMetrics = None,
+                           calibration: CalibrationCache = None):
+    """
+    Filter, align and segment one window into binned strides with the worker's rotation solver.
+    Pass prefiltered=True when the arrays were already low-pass filtered at session level.
+    Stage timings go to metrics when given; a session's CalibrationCache is used and updated when given.
+    Returns (bin_inputs, dur_stride, stride_starts), or None when the window gets the basal rate.
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+
+    # Apply low-pass filter
+    if prefiltered:
+        gyro_filtered, acc_filtered = gyro_array, acc_array
+    else:
+        with metrics.time('filter'):
+            gyro_filtered = signal.filtfilt(b, a, gyro_array, axis=0)
+            acc_filtered = signal.filtfilt(b, a, acc_array, axis=0)
+    return batch_analyzer.segment_window_strides(gyro_filtered, acc_filtered, rotation_solver=rotation_solver,
+                                                 gyro_norm_thres=gyro_norm_thres, metrics=metrics, calibration=calibration)
+
+def calculate_energy_expenditure_batch(windows: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], user_email: str, prefiltered: bool = False, subject: SubjectContext = None, metrics: StageMetrics = None,
+                                       calibration: CalibrationCache = None) -> List[List[float]]:
+    """
+    Calculate energy expenditure for a batch of (gyro_array, acc_array, window_time) windows.
+    Strides from every window are stacked so the correction and EE models run once per batch.
+    Pass the session's SubjectContext to skip the profile lookup, a StageMetrics to collect stage timings,
+    and its CalibrationCache to carry orientations across windows (in window order).
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+    try:
+        if subject is None:
+            subject = profile_cache.get_subject(user_email)
+        weight, height, cur_basal = subject.weight, subject.height, subject.basal
+
+        window_strides = []
+        for window_index, (gyro_array, acc_array, _) in enumerate(windows):
+            try:
+                window_strides.append(segment_window_strides(gyro_array, acc_array, prefiltered=prefiltered, metrics=metrics,
+                                                             calibration=calibration))
+            except Exception as e:
+                # A failing window falls back to the basal rate without failing the whole batch
+                log_event(logger, logging.WARNING, 'window_segmentation_failed', batchWindow=window_index + 1, error=str(e))
+                window_strides.append(None)
+        return batch_analyzer.estimate_windows(window_strides, weight, height, cur_basal, load_models, metrics)
+    except Exception as e:
+        error_message = f"Error in calculate_energy_expenditure_batch for user {user_email}. Details: {str(e)}. "
+        error_message += f"Number of windows: {len(windows)}"
+        log_event(logger, logging.ERROR, 'ee_batch_failed', error=error_message)
+        raise Exception(error_message)
+
 def calculate_energy_expenditure(gyro_data: List[Dict[str, float]], acc_data: List[Dict[str, float]], window_time: List[float], user_email: str) -> List[float]:
     """
     Calculate energy expenditure from gyroscope and accelerometer data
     """
     try:
-        # Get user profile
-        user_profile = get_user_profile(user_email)
-        
-        # Compute basal metabolic rate
-        stand_aug_fact = 1.41  # Standing augmentation factor
-        height = user_profile['height']
-        weight = user_profile['weight']
-        age = user_profile['age']
-        gender = user_profile['gender']
-        cur_basal = utils.basalEst(height, weight, age, gender, stand_aug_fact, kcalPerDay2Watt=0.048426)
-
         # Convert input data to numpy arrays
         gyro_array = np.array([[d['x'], d['y'], d['z']] for d in gyro_data])
         acc_array = np.array([[d['x'], d['y'], d['z']] for d in acc_data])
-        time_array = np.array(window_time)
-
-        # Apply low-pass filter
-        gyro_filtered = signal.filtfilt(b, a, gyro_array, axis=0)
-        acc_filtered = signal.filtfilt(b, a, acc_array, axis=0)
-
-        # Calculate L2 norm of gyro data
-        l2_norm_gyro = np.linalg.norm(gyro_filtered, axis=1)
-
-        if np.max(l2_norm_gyro) > gyro_norm_thres:
-            # Orientation alignment with superior-inferior axis
-            opt_rotm_z_pocket, theta_z = utils.get_rotate_z(acc_filtered)
-            gyro_rot_zx = np.matmul(gyro_filtered, opt_rotm_z_pocket)
-
-            # Find principal axis
-            prin_idx = utils.find_prin_axis(gyro_rot_zx)
-            prin_gyro = gyro_rot_zx[:, prin_idx]
-
-            if np.abs(np.max(prin_gyro)) < np.abs(np.min(prin_gyro)):
-                prin_gyro = -prin_gyro
-
-            # Detect peaks
-            gait_peaks = utils.peak_detect(prin_gyro)
-
-            if len(gait_peaks) > 1:
-                # Segment data
-                gait_data = utils.segment_data(gait_peaks, gyro_rot_zx, sliding_win)
-                if len(gait_data) < 1:
-                    return [cur_basal]
-
-                # Orientation alignment with mediolateral axis
-                avg_gait_data = np.mean(gait_data, axis=0)
-                opt_rotm_y, theta_y = utils.get_rotate_y(avg_gait_data, prin_idx)
-                opt_rotm = np.matmul(opt_rotm_z_pocket, opt_rotm_y)
-                gyro_cal = np.matmul(gyro_filtered, opt_rotm)
-
-                # Adjust rotation if necessary
-                pos_idx = gyro_cal[:, -1] > 0
-                neg_idx = gyro_cal[:, -1] < 0
-                gyro_z_norm_pos = norm(gyro_cal[pos_idx, -1], ord=2)
-                gyro_z_norm_neg = norm(gyro_cal[neg_idx, -1], ord=2)
-                
-                if gyro_z_norm_pos <= gyro_z_norm_neg:
-                    opt_rotm = np.matmul(opt_rotm, utils.rotm_y(np.pi))
-                    gyro_cal = np.matmul(gyro_filtered, opt_rotm)
-
-                # Final gait segmentation and EE estimation
-                gait_peaks = utils.peak_detect(gyro_cal[:, -1])
-                ee_time, ee_est = utils.estimateMetabolics(
-                    model=data_driven_model,
-                    time=time_array,
-                    gait_data=gyro_cal,
-                    peak_index=gait_peaks,
-                    weight=weight,
-                    height=height,
-                    stride_detect_window=sliding_win,
-                    correction_model=pocket_motion_correction_model
-                )
-                return ee_est
-            else:
-                return [cur_basal]
-        else:
-            return [cur_basal]
+        return calculate_energy_expenditure_batch([(gyro_array, acc_array, window_time)], user_email)[0]
     except Exception as e:
         error_message = f"Error in calculate_energy_expenditure for user {user_email}. Details: {str(e)}. "
         error_message += f"Gyro data shape: {np.array(gyro_data).shape if gyro_data else 'N/A'}, "
         error_message += f"Acc data shape: {np.array(acc_data).shape if acc_data else 'N/A'}, "
         error_message += f"Window time length: {len(window_time) if window_time else 'N/A'}"
-        print(f"ERROR: {error_message}")
+        log_event(logger, logging.ERROR, 'ee_window_failed', error=error_message)
         raise Exception(error_message)
 
-def process_window(window: List[Dict[str, Any]], window_index: int, session_id: str, user_email: str, cur_basal: float) -> List[Dict[str, Any]]:
+def container_vcpus() -> int:
+    """
+    Number of vCPUs available to this container: the cgroup CPU quota on ECS/Fargate,
+    otherwise the CPUs this process may run on.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    quota_files = [('/sys/fs/cgroup/cpu.max', None),  # cgroup v2: "<quota> <period>"
+                   ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us')]  # cgroup v1
+    for quota_file, period_file in quota_files:
+        try:
+            with open(quota_file) as f:
+                fields = f.read().split()
+            if period_file is not None:
+                with open(period_file) as f:
+                    fields.append(f.read().strip())
+            if fields[0] in ('max', '-1'):
+                continue
+            return max(1, min(available, int(int(fields[0]) // int(fields[1]))))
+        except (OSError, ValueError, IndexError):
+            continue
+    return available
+
+executor_workers = int(os.environ.get('EXECUTOR_WORKERS', 0)) or container_vcpus()  # Pool size in 'process' mode
+_window_pool = None
+_window_pool_lock = threading.Lock()
+
+def _init_pool_worker():
+    """Pool initializer: load the models once per worker process and keep XGBoost single-threaded"""
+    ee_model, _ = load_models()
+    ee_model.get_booster().set_param({'nthread': 1})
+
+def warm_up():
+    """Load the models before polling SQS so the first session does not pay for it"""
+    if executor_mode == 'process':
+        # The parent never predicts in this mode; start the pool so every child loads its own copy
+        pool = get_window_pool()
+        wait([pool.submit(os.getpid) for _ in range(executor_workers)])
+    else:
+        load_models()
+
+def get_window_pool() -> ProcessPoolExecutor:
+    """Create the window process pool on first use; it is reused across sessions"""
+    global _window_pool
+    with _window_pool_lock:
+        if _window_pool is None:
+            # spawn: the children never inherit OpenMP or boto3 state from this process
+            _window_pool = ProcessPoolExecutor(max_workers=executor_workers,
+                                               mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=_init_pool_worker)
+            log_event(logger, logging.INFO, 'window_pool_started', workers=executor_workers)
+        return _window_pool
+
+def shutdown_window_pool():
+    """Stop the window process pool, if one was started"""
+    global _window_pool
+    with _window_pool_lock:
+        pool, _window_pool = _window_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+def _calculate_energy_expenditure_task(task: Tuple[List[Tuple[np.ndarray, np.ndarray, np.ndarray]], str, bool, SubjectContext, Optional[CalibrationCache]]):
+    windows, user_email, prefiltered, subject, calibration = task
+    # Raw samples are cheap per task and keep exact percentiles for callers that track them
+    task_metrics = StageMetrics(keep_samples=True)
+    ee_values = calculate_energy_expenditure_batch(windows, user_email, prefiltered=prefiltered, subject=subject, metrics=task_metrics,
+                                                   calibration=calibration)
+    # Timings and the calibration travel back with the results; the pool worker keeps nothing
+    return ee_values, task_metrics.histograms(), calibration
+
+def run_window_batch(windows: List[Tuple[np.ndarray, np.ndarray, np.ndarray]], user_email: str, prefiltered: bool, subject: SubjectContext, metrics: StageMetrics = None,
+                     calibration: CalibrationCache = None) -> List[List[float]]:
+    """
+    Calculate EE for a batch of windows with the configured executor.
+    In 'process' mode the batch is split into contiguous slices, one per pool worker, and the
+    per-window results come back in the original window order. Pool worker timings are merged into metrics.
+    Every slice starts from the calibration as of the batch start; calibration then takes over their counts
+    and the last slice's calibration. Slices cannot reuse each other's calibrations, so reuse differs from serial.
+    """
+    global _window_pool
+    if executor_mode != 'process' or len(windows) < 2:
+        return calculate_energy_expenditure_batch(windows, user_email, prefiltered=prefiltered, subject=subject, metrics=metrics,
+                                                  calibration=calibration)
+
+    num_tasks = min(executor_workers, len(windows))
+    bounds = np.linspace(0, len(windows), num_tasks + 1).astype(int)
+    tasks = [(windows[start:stop], user_email, prefiltered, subject, calibration.fork() if calibration is not None else None)
+             for start, stop in zip(bounds[:-1], bounds[1:])]
+    try:
+        task_results = list(get_window_pool().map(_calculate_energy_expenditure_task, tasks))
+    except BrokenProcessPool:
+        # Start a fresh pool for the next batch
+        with _window_pool_lock:
+            _window_pool = None
+        raise
+    if metrics is not None:
+        for _, task_histograms, _ in task_results:
+            metrics.merge(task_histograms)
+    if calibration is not None:
+        calibration.join(task_calibration for _, _, task_calibration in task_results)
+    return [window_ee_values for task_ee_values, _, _ in task_results for window_ee_values in task_ee_values]
+
+def compute_window_batch(data: SensorColumns, num_samples: int, gyro_context: np.ndarray, acc_context: np.ndarray,
+                         user_email: str, subject: SubjectContext, metrics: StageMetrics = None,
+                         summary: SessionSummary = None, calibration: CalibrationCache = None):
+    """
+    EE values for the full windows in data[:num_samples] with the configured filter mode and executor.
+    In session filter mode the whole batch is filtered once, using gyro_context/acc_context (the raw
+    samples before data) on the left and everything after num_samples on the right.
+    Windows the activity pre-filter marks as stationary get the basal rate without being computed;
+    they are counted as stationaryWindows in summary when given. With a CalibrationCache, windows that reuse
+    the cached orientation are counted as calibrationReused and the others as calibrationSearched.
+    Returns (ee values per window, updated gyro_context, updated acc_context).
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+    num_windows = num_samples // sliding_win
+    stationary = np.zeros(num_windows, dtype=bool)
+    if activity_filter_mode == 'energy':
+        with metrics.time('activity_filter'):
+            stationary = activity_filter.energy_stationary(data.gyro, num_windows, sliding_win, activity_rms_threshold,
+                                                           activity_variance_threshold)
+
+    prefiltered = filter_mode == 'session'
+    if prefiltered:
+        gyro_signal, acc_signal = data.gyro, data.acc
+        if not stationary.all():
+            # Filter the whole batch once instead of every window separately
+            with metrics.time('filter'):
+                gyro_signal = utils.filtfilt_with_context(b, a, data.gyro, gyro_context)
+                acc_signal = utils.filtfilt_with_context(b, a, data.acc, acc_context)
+            if activity_filter_mode == 'peak':
+                with metrics.time('activity_filter'):
+                    stationary = activity_filter.peak_stationary(gyro_signal, num_windows, sliding_win)
+        gyro_context = np.concatenate((gyro_context, data.gyro[:num_samples]))[-filter_context:]
+        acc_context = np.concatenate((acc_context, data.acc[:num_samples]))[-filter_context:]
+    else:
+        gyro_signal, acc_signal = data.gyro, data.acc
+        if activity_filter_mode == 'peak' and num_windows:
+            with metrics.time('activity_filter'):
+                # Every window filtered on its own, as segment_window_strides will, in one call
+                windows_filtered = signal.filtfilt(b, a, activity_filter.window_view(data.gyro, num_windows, sliding_win), axis=1)
+                stationary = activity_filter.peak_stationary(windows_filtered.reshape(-1, 3), num_windows, sliding_win)
+
+    active = np.flatnonzero(~stationary)
+    windows = [(gyro_signal[i : i + sliding_win], acc_signal[i : i + sliding_win], data.time[i : i + sliding_win])
+               for i in active * sliding_win]
+    calibration_counts = (calibration.reused, calibration.searched) if calibration is not None else None
+    active_ee_values = run_window_batch(windows, user_email, prefiltered, subject, metrics, calibration) if windows else []
+    ee_values = [[subject.basal] for _ in range(num_windows)]
+    for window_index, window_ee_values in zip(active, active_ee_values):
+        ee_values[window_index] = window_ee_values
+    if summary is not None and len(active) < num_windows:
+        summary.add('stationaryWindows', num_windows - len(active))
+    if summary is not None and calibration_counts is not None:
+        summary.add('calibrationReused', calibration.reused - calibration_counts[0])
+        summary.add('calibrationSearched', calibration.searched - calibration_counts[1])
+    return ee_values, gyro_context, acc_context
+
+def read_session(session_id: str, metrics: StageMetrics = None, start_key: str = None):
+    """
+    Decoded raw sensor pages of a session in Timestamp order, from start_key (inclusive) when given;
+    prefetched unless READER_SEGMENTS=0
+    """
+    if reader_segments > 0:
+        return prefetch_session_pages(dynamodb, os.environ['RAW_SENSOR_TABLE'], session_id, segments=reader_segments,
+                                      queue_pages=reader_queue_pages, metrics=metrics, start_key=start_key)
+    return read_session_pages(dynamodb, os.environ['RAW_SENSOR_TABLE'], session_id, metrics=metrics, start_key=start_key)
+
+def process_window(window: SensorColumns, window_index: int, session_id: str, user_email: str, cur_basal: float, ee_values: List[float] = None, result_writer: ResultWriter = None, metrics: StageMetrics = None) -> List[Dict[str, Any]]:
     """
     Process a window of sensor data and calculate energy expenditure values.
+    Pass ee_values when they were already computed by calculate_energy_expenditure_batch.
+    Results go to result_writer when given, otherwise they are stored with one put_item each.
+    The window's duration is recorded in metrics as 'process_window' when given.
     """
-    # Extract gyroscope and accelerometer data
-    gyro_data = [{
-        'x': float(item['Gyroscope_X']['N']),
-        'y': float(item['Gyroscope_Y']['N']),
-        'z': float(item['Gyroscope_Z']['N'])
-    } for item in window]
-
-    acc_data = [{
-        'x': float(item['Accelerometer_X']['N']),
-        'y': float(item['Accelerometer_Y']['N']),
-        'z': float(item['Accelerometer_Z']['N'])
-    } for item in window]
-
-    # Extract timestamps and convert to seconds since epoch
-    window_time = [
-        datetime.fromisoformat(item['Timestamp']['S'].split('_')[0].replace('Z', '+00:00')).timestamp()
-        for item in window
-    ]
-
-    print(f"\nProcessing window {window_index + 1}:")
-    print(f"Window size: {len(window)}")
-    print(f"Window start time: {window[0]['Timestamp']['S']}")
-    print(f"Window end time: {window[-1]['Timestamp']['S']}")
+    process_start = time.perf_counter()
+    # Checked once per window so nothing below formats debug output when DEBUG is off
+    log_debug = logger.isEnabledFor(logging.DEBUG)
 
     # Calculate energy expenditure for this window
     try:
-        ee_values = calculate_energy_expenditure(gyro_data, acc_data, window_time, user_email)
-        print(f"Raw ee_values from calculate_energy_expenditure: {ee_values}")
-        print(f"Type of ee_values: {type(ee_values)}")
+        if ee_values is None:
+            ee_values = calculate_energy_expenditure_batch([(window.gyro, window.acc, window.time)], user_email, metrics=metrics)[0]
         
         if ee_values is None:
-            print(f"WARNING: calculate_energy_expenditure returned None for window {window_index + 1}")
+            log_event(logger, logging.WARNING, 'ee_values_missing', sessionId=session_id, window=window_index + 1)
             ee_values = [cur_basal]
         else:
             # Convert numpy float32 to regular Python float
             try:
                 ee_values = [float(value) for value in ee_values]
-                print(f"Converted ee_values: {ee_values}")
             except (ValueError, TypeError) as e:
-                print(f"ERROR: Failed to convert ee_values to float: {e}")
-                print(f"Problematic ee_values: {ee_values}")
+                log_event(logger, logging.ERROR, 'ee_values_not_numeric', sessionId=session_id,
+                          window=window_index + 1, error=str(e), eeValues=repr(ee_values))
                 ee_values = [cur_basal]
     except Exception as e:
-        print(f"ERROR: Exception in calculate_energy_expenditure: {str(e)}")
+        log_event(logger, logging.ERROR, 'ee_window_failed', sessionId=session_id, window=window_index + 1, error=str(e))
         ee_values = [cur_basal]
 
-    print(f"Final ee_values before processing: {ee_values}")
+    if log_debug and window_log_sampler():
+        log_event(logger, logging.DEBUG, 'window', sessionId=session_id, window=window_index + 1, size=len(window),
+                  start=window.timestamps[0], end=window.timestamps[-1], eeValues=ee_values)
 
     results = []
     if len(ee_values) > 0:
-        window_start_time = datetime.fromisoformat(window[0]['Timestamp']['S'].split('_')[0].replace('Z', '+00:00'))
-        window_end_time = datetime.fromisoformat(window[-1]['Timestamp']['S'].split('_')[0].replace('Z', '+00:00'))
+        window_start_time = datetime.fromisoformat(window.timestamps[0].split('_')[0].replace('Z', '+00:00'))
+        window_end_time = datetime.fromisoformat(window.timestamps[-1].split('_')[0].replace('Z', '+00:00'))
         time_per_gait_cycle = (window_end_time - window_start_time).total_seconds() / len(ee_values)
     else:
-        print(f"WARNING: No EE values for window {window_index + 1} in session {session_id}. Skipping window.")
+        log_event(logger, logging.WARNING, 'window_without_ee_values', sessionId=session_id, window=window_index + 1)
+        if metrics is not None:
+            metrics.observe('process_window', time.perf_counter() - process_start)
         return results
 
     # Store each result
@@ -272,7 +532,8 @@ def process_window(window: List[Dict[str, Any]], window_index: int, session_id:
         
         # Validate ee_value and cur_basal before storing
         if not np.isfinite(ee_value) or not np.isfinite(cur_basal):
-            print(f"WARNING: Non-finite EE value ({ee_value}) or BMR ({cur_basal}) for session {session_id}, user {user_email}, window {window_index + 1}, gait cycle {j + 1}. Skipping DynamoDB put for this entry.")
+            log_event(logger, logging.WARNING, 'non_finite_ee_skipped', sessionId=session_id, userEmail=user_email,
+                      window=window_index + 1, gaitCycle=j + 1, eeValue=ee_value, basal=cur_basal)
             results.append({
                 'timestamp': gait_cycle_timestamp.isoformat(),
                 'energyExpenditure': None,
@@ -282,13 +543,10 @@ def process_window(window: List[Dict[str, Any]], window_index: int, session_id:
             })
             continue
 
-        print(f"Window {window_index + 1}, Gait Cycle {j + 1}:")
-        print(f"Window start: {window_start_time.isoformat()}")
-        print(f"Window end: {window_end_time.isoformat()}")
-        print(f"Time per cycle: {time_per_gait_cycle}")
-        print(f"Timestamp: {gait_cycle_timestamp.isoformat()}")
-        print(f"EE value: {ee_value}")
-        print(f"Basal metabolic rate: {cur_basal}")
+        if log_debug and stride_log_sampler():
+            log_event(logger, logging.DEBUG, 'gait_cycle', sessionId=session_id, window=window_index + 1, gaitCycle=j + 1,
+                      timestamp=gait_cycle_timestamp.isoformat(), timePerCycle=time_per_gait_cycle,
+                      eeValue=ee_value, basal=cur_basal)
 
         # Store result in DynamoDB
         result_item = {
@@ -304,7 +562,10 @@ def process_window(window: List[Dict[str, Any]], window_index: int, session_id:
             }
         }
 
-        dynamodb.put_item(**result_item)
+        if result_writer is not None:
+            result_writer.put(result_item['Item'])
+        else:
+            dynamodb.put_item(**result_item)
         results.append({
             'timestamp': gait_cycle_timestamp.isoformat(),
             'energyExpenditure': ee_value,
@@ -312,168 +573,520 @@ def process_window(window: List[Dict[str, Any]], window_index: int, session_id:
             'gaitCycleIndex': j
         })
 
+    if metrics is not None:
+        metrics.observe('process_window', time.perf_counter() - process_start)
     return results
 
+def processing_chunk_target_size() -> int:
+    """Samples buffered before a batch of windows is computed"""
+    target_size = sliding_win * 10
+    if executor_mode == 'process':
+        # Give every pool worker about as much work per batch as the serial path gets
+        target_size *= executor_workers
+    return target_size
+
+class WindowStream:
+    """
+    Windowing state of one session, shared by batch processing and incremental pushes.
+
+    Pages are buffered until a batch is due and each batch is cut into the session's consecutive
+    sliding_win-sample windows. Samples that do not fill a window stay in the overlap buffer; in session
+    filter mode the last filter_context samples are also held back, as right-hand filter context, until
+    the session's last page. `context` holds the last filter_context samples already in windows (the
+    left-hand filter context of the next batch). The windows are therefore the same slices of the
+    session however its pages arrive. With CALIBRATION_CACHE=on, `calibration` is the session's
+    CalibrationCache; each batch runs on a fork of it that advance() joins, and it is saved with the
+    checkpoint, so a resumed session continues from the calibration of the last window it counts.
+    """
+
+    def __init__(self, target_size: int, context: SensorColumns = None, window_count: int = 0,
+                 samples_processed: int = 0, result_count: int = 0, calibration: CalibrationCache = None):
+        self.target_size = target_size
+        self.overlap = SensorColumns.empty()
+        self.pending: List[SensorColumns] = []
+        self.pending_size = 0
+        self.context = context if context is not None else SensorColumns.empty()
+        self.window_count = window_count
+        self.samples_processed = samples_processed
+        self.result_count = result_count
+        if calibration is None and calibration_cache_mode == 'on':
+            calibration = CalibrationCache(calibration_gravity_tolerance)
+        self.calibration = calibration
+
+    def add(self, page: SensorColumns, is_last: bool = False, flush: bool = False) -> Optional[Tuple[SensorColumns, int]]:
+        """
+        Buffer a page. When a batch is due (target_size reached, the session's last page, or flush)
+        returns (batch data, number of samples in its full windows); the rest becomes the overlap buffer.
+        """
+        self.pending.append(page)
+        self.pending_size += len(page)
+        if not (self.pending_size >= self.target_size or is_last or flush) or not (self.pending_size or len(self.overlap)):
+            return None
+        data = SensorColumns.concatenate([self.overlap] + self.pending)
+        self.pending, self.pending_size = [], 0
+        usable = len(data)
+        if filter_mode == 'session' and not is_last:
+            # Hold back windows without filter_context samples of right-hand context
+            usable = max(usable - filter_context, 0)
+        num_samples = usable // sliding_win * sliding_win
+        self.overlap = data[num_samples:]
+        return data, num_samples
+
+    def advance(self, data: SensorColumns, num_samples: int, result_count: int, calibration: CalibrationCache = None):
+        """
+        Move past the windows in data[:num_samples] once their results are written. calibration is the
+        fork of self.calibration these windows ran on; it is joined here, so a checkpoint never holds the
+        calibration of windows it does not count.
+        """
+        self.context = SensorColumns.concatenate(
+            [self.context, data[max(num_samples - filter_context, 0):num_samples]])[-filter_context:]
+        self.window_count += num_samples // sliding_win
+        self.samples_processed += num_samples
+        self.result_count += result_count
+        if calibration is not None:
+            self.calibration.join([calibration])
+
+    def checkpoint(self, final: bool = False) -> Dict[str, Any]:
+        """
+        Where the next run resumes: re-read the session from ResumeKey (inclusive). Its first
+        ContextSamples rows are filter context and the rest starts the next window.
+        """
+        return {'ResumeKey': str(self.context.timestamps[0]) if len(self.context) else None,
+                'ContextSamples': len(self.context), 'WindowCount': self.window_count,
+                'SamplesProcessed': self.samples_processed, 'ResultCount': self.result_count, 'Final': final,
+                'Calibration': self.calibration.state() if self.calibration is not None else None}
+
+    @classmethod
+    def resume(cls, target_size: int, checkpoint: Optional[Dict[str, Any]], pages):
+        """
+        A stream positioned at checkpoint, and the remaining pages of a session read from its ResumeKey.
+        The checkpoint's context rows are taken off the front of the pages.
+        """
+        if not checkpoint or not checkpoint.get('ResumeKey'):
+            return cls(target_size), pages
+        pages = iter(pages)
+        context_blocks, context_needed = [], checkpoint['ContextSamples']
+        first_page = SensorColumns.empty()
+        while context_needed > 0:
+            page = next(pages, None)
+            if page is None:
+                break
+            context_blocks.append(page[:context_needed])
+            first_page = page[context_needed:]
+            context_needed -= len(context_blocks[-1])
+        calibration = None
+        if calibration_cache_mode == 'on':
+            calibration = CalibrationCache.from_state(checkpoint.get('Calibration'), calibration_gravity_tolerance)
+        stream = cls(target_size, SensorColumns.concatenate(context_blocks), checkpoint['WindowCount'],
+                     checkpoint['SamplesProcessed'], checkpoint.get('ResultCount', 0), calibration)
+        return stream, itertools.chain([first_page] if len(first_page) else [], pages)
+
+def process_window_batch(stream: WindowStream, data: SensorColumns, num_samples: int, session_id: str, user_email: str,
+                         subject: SubjectContext, result_writer: ResultWriter, summary: SessionSummary,
+                         metrics: StageMetrics) -> List[Dict[str, Any]]:
+    """
+    EE and stored results for the windows in data[:num_samples], numbered from stream.window_count.
+    A failed batch falls back to the basal rate for each of its windows.
+    """
+    cur_basal = subject.basal
+    batch_windows = [data[i : i + sliding_win] for i in range(0, num_samples, sliding_win)]
+    # Run the models once for every stride in this batch of windows
+    compute_start = time.perf_counter()
+    # The batch's calibration only reaches the stream (and its checkpoint) with stream.advance
+    calibration = stream.calibration.fork() if stream.calibration is not None else None
+    try:
+        batch_ee_values, _, _ = compute_window_batch(data, num_samples, stream.context.gyro, stream.context.acc,
+                                                     user_email, subject, metrics, summary, calibration)
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'ee_batch_failed', sessionId=session_id,
+                  windows=len(batch_windows), error=str(e))
+        summary.add('failedBatches')
+        batch_ee_values = [[cur_basal] for _ in batch_windows]
+    metrics.observe('window_batch', time.perf_counter() - compute_start)
+
+    results = []
+    for window_index, (window_data, window_ee_values) in enumerate(zip(batch_windows, batch_ee_values), start=stream.window_count):
+        results.extend(process_window(window_data, window_index, session_id, user_email, cur_basal,
+                                      ee_values=window_ee_values, result_writer=result_writer, metrics=metrics))
+        if len(window_ee_values) == 1 and window_ee_values[0] == cur_basal:
+            summary.add('basalFallbackWindows')
+        else:
+            summary.add('strides', len(window_ee_values))
+    summary.add('windows', len(batch_windows))
+    stream.advance(data, num_samples, len(results), calibration)
+    return results
+
+_session_locks: Dict[str, threading.Lock] = {}
+_session_locks_guard = threading.Lock()
+
+def session_lock(session_id: str) -> threading.Lock:
+    """One lock per session, so pushes of the same session never run concurrently in this process"""
+    with _session_locks_guard:
+        return _session_locks.setdefault(session_id, threading.Lock())
+
+def process_increment(session_id: str, user_email: str, final: bool = False, profile_version: str = None):
+    """
+    Streaming mode: push the samples uploaded since the previous push through the session's windows.
+
+    The WindowStream resumes from the checkpoint in the processing-status record, results of every
+    window completed by the new samples are written, and the new checkpoint is saved with the status.
+    Without final the newest samples stay buffered (as the overlap buffer and held-back filter context
+    would in batch mode); with final the session's tail is handled as in batch mode and it completes.
+    Result keys are deterministic, so a push that is retried or repeated rewrites identical items.
+    The checkpoint is only saved if no other worker task moved it on since it was loaded; otherwise
+    CheckpointConflict is raised and the push is retried from the newer checkpoint.
+    profile_version is the profile's LastUpdated as seen by the API; a cached profile of another version is refetched.
+    """
+    with session_lock(session_id):
+        log_event(logger, logging.INFO, 'increment_started', sessionId=session_id, userEmail=user_email, final=final)
+        summary = SessionSummary(session_id, user_email)
+        increment_metrics = StageMetrics()
+        increment_start = time.perf_counter()
+
+        checkpoint = load_checkpoint(session_id)
+        if checkpoint and checkpoint.get('Final'):
+            log_event(logger, logging.INFO, 'increment_skipped', sessionId=session_id, reason='session already completed')
+            return
+        subject = profile_cache.get_subject(user_email, profile_version)
+        pages = read_session_pages(dynamodb, os.environ['RAW_SENSOR_TABLE'], session_id, metrics=increment_metrics,
+                                   start_key=checkpoint.get('ResumeKey') if checkpoint else None)
+        stream, pages = WindowStream.resume(processing_chunk_target_size(), checkpoint, pages)
+        windows_before = stream.window_count
+        result_writer = ResultWriter(dynamodb, os.environ['RESULTS_TABLE'], background=result_writer_background,
+                                     metrics=increment_metrics)
+        # Pushes of one session may run on several worker tasks; session_lock only serializes this one
+        try:
+            for page_columns, is_last_page in with_last_flag(pages):
+                summary.add('pages')
+                summary.add('samples', len(page_columns))
+                # The last page read is only the session's last page when the upload is final
+                batch = stream.add(page_columns, is_last=final and is_last_page, flush=is_last_page)
+                if batch is not None and batch[1] > 0:
+                    process_window_batch(stream, batch[0], batch[1], session_id, user_email, subject,
+                                         result_writer, summary, increment_metrics)
+            with increment_metrics.time('result_flush'):
+                result_writer.close()
+        except Exception as e:
+            # The checkpoint is not advanced, so the retried message recomputes these windows
+            log_event(logger, logging.ERROR, 'increment_failed', sessionId=session_id, error=str(e))
+            try:
+                result_writer.close()
+            except Exception as close_error:
+                log_event(logger, logging.ERROR, 'result_flush_failed', sessionId=session_id, error=str(close_error))
+            process_metrics.merge(increment_metrics)
+            raise
+
+        increment_metrics.observe('increment', time.perf_counter() - increment_start)
+        process_metrics.merge(increment_metrics)
+        stage_timings = increment_metrics.summary()
+        summary.log(logger, 'increment_summary', stages=stage_timings, final=final,
+                    newWindows=stream.window_count - windows_before, windowCount=stream.window_count)
+        try:
+            if not final:
+                update_processing_status(session_id, 'streaming', stage_timings=stage_timings,
+                                         checkpoint=stream.checkpoint(), expected_window_count=windows_before)
+            elif stream.result_count:
+                update_processing_status(session_id, 'completed', 100, stage_timings=stage_timings,
+                                         checkpoint=stream.checkpoint(final=True), expected_window_count=windows_before)
+            else:
+                update_processing_status(session_id, 'failed', error='No results generated from processing',
+                                         stage_timings=stage_timings, checkpoint=stream.checkpoint(final=True),
+                                         expected_window_count=windows_before)
+        except CheckpointConflict:
+            # The results written are identical to the other task's; only its newer checkpoint is kept
+            log_event(logger, logging.WARNING, 'increment_superseded', sessionId=session_id, final=final,
+                      resumedWindow=windows_before)
+            raise
+    if final:
+        with _session_locks_guard:
+            _session_locks.pop(session_id, None)
+
+def save_checkpoint(session_id: str, stream: WindowStream, result_writer: ResultWriter, progress: float,
+                    metrics: StageMetrics):
+    """Store every buffered result, then the stream's checkpoint, so a redelivered message resumes there"""
+    with metrics.time('checkpoint'):
+        result_writer.flush()
+        update_processing_status(session_id, 'processing', progress, checkpoint=stream.checkpoint())
+
 def process_message(message):
     """Process a single message from the queue"""
     try:
         data = json.loads(message['Body'])
         session_id = data['session_id']
         user_email = data['user_email']
+        if data.get('incremental'):
+            if data.get('profile_updated'):
+                profile_cache.invalidate(user_email)
+            process_increment(session_id, user_email, final=bool(data.get('final')),
+                              profile_version=data.get('profile_version'))
+            return
         
-        print(f"\n==============================\nProcessing session_id: {session_id} for user: {user_email}\n==============================")
-        update_processing_status(session_id, 'processing', 0)
+        summary = SessionSummary(session_id, user_email)
+        # Stage timings of this session; merged into process_metrics and stored in the status record at the end
+        session_metrics = StageMetrics()
+        session_start = time.perf_counter()
+        log_debug = logger.isEnabledFor(logging.DEBUG)
         
         try:
-            user_profile = get_user_profile(user_email)
-            cur_basal = utils.basalEst(user_profile['height'], user_profile['weight'], 
-                                     user_profile['age'], user_profile['gender'], 
-                                     1.41, kcalPerDay2Watt=0.048426)
+            # A checkpoint left in the status record means this message is a redelivery: /process resets the record
+            checkpoint = load_checkpoint(session_id)
+            if checkpoint and checkpoint.get('Final'):
+                log_event(logger, logging.INFO, 'session_skipped', sessionId=session_id, reason='session already completed')
+                return
+            log_event(logger, logging.INFO, 'session_started', sessionId=session_id, userEmail=user_email,
+                      resumeWindow=checkpoint.get('WindowCount') if checkpoint else None)
+            if data.get('profile_updated'):
+                # The sender changed this user's profile since it may have been cached
+                profile_cache.invalidate(user_email)
+            # profile_version (the profile's LastUpdated, sent by the API) refetches a profile edited since it was cached
+            subject = profile_cache.get_subject(user_email, data.get('profile_version'))
+            cur_basal = subject.basal
             
             # --- Chunked Processing Variables ---
-            last_evaluated_key = None
             all_results: List[Dict[str, Any]] = []
-            overlap_buffer: List[Dict[str, Any]] = []
-            window_size = 200
-            current_items_for_chunk: List[Dict[str, Any]] = []
-            PROCESSING_CHUNK_TARGET_SIZE = window_size * 10
-            total_items_processed_into_windows = 0
-            global_window_count = 0
+            session_pages = read_session(session_id, metrics=session_metrics,
+                                         start_key=checkpoint.get('ResumeKey') if checkpoint else None)
+            stream, session_pages = WindowStream.resume(processing_chunk_target_size(), checkpoint, session_pages)
+            session_pages = with_last_flag(session_pages)
+            windows_before = stream.window_count
+            # A resumed session keeps the progress stored with its checkpoint
+            update_processing_status(session_id, 'processing', 0 if checkpoint is None else None)
+            result_writer = ResultWriter(dynamodb, os.environ['RESULTS_TABLE'], background=result_writer_background,
+                                         metrics=session_metrics)
+            last_checkpoint = time.monotonic()
+            shutdown_checkpointed = False
             
             while True:
                 try:
-                    query_params = {
-                        'TableName': os.environ['RAW_SENSOR_TABLE'],
-                        'KeyConditionExpression': 'SessionId = :sessionId AND #ts >= :minTimestamp',
-                        'ExpressionAttributeNames': {'#ts': 'Timestamp'},
-                        'ExpressionAttributeValues': {
-                            ':sessionId': {'S': session_id},
-                            ':minTimestamp': {'S': '0000-01-01T00:00:00Z'}
-                        },
-                        'Limit': 1000,
-                        'ScanIndexForward': True
-                    }
-                    if last_evaluated_key:
-                        query_params['ExclusiveStartKey'] = last_evaluated_key
-                    
-                    query_result = dynamodb.query(**query_params)
-                    items_from_db_page = query_result.get('Items', [])
-                    
-                    last_evaluated_key = query_result.get('LastEvaluatedKey')
-                    print(f"[DEBUG] last_evaluated_key after query: {last_evaluated_key}")
-
-                    if not items_from_db_page:
+                    read_start = time.perf_counter()
+                    page = next(session_pages, None)
+                    session_metrics.observe('read_wait', time.perf_counter() - read_start)
+                    if page is None:
                         break
-                    
-                    current_items_for_chunk.extend(items_from_db_page)
+                    page_columns, is_last_batch_from_db = page
+                    summary.add('pages')
+                    summary.add('samples', len(page_columns))
+                    if log_debug:
+                        log_event(logger, logging.DEBUG, 'page_read', sessionId=session_id, items=len(page_columns),
+                                  lastPage=is_last_batch_from_db)
                     
                     # Process chunks as before
-                    can_process_chunk = len(current_items_for_chunk) >= PROCESSING_CHUNK_TARGET_SIZE
-                    is_last_batch_from_db = not last_evaluated_key
-                    has_pending_data_to_process = current_items_for_chunk or overlap_buffer
+                    batch = stream.add(page_columns, is_last=is_last_batch_from_db)
+                    if batch is None:
+                        continue
+                    data_to_process_now, end_index_for_full_windows = batch
+
+                    if log_debug:
+                        log_event(logger, logging.DEBUG, 'batch_started', sessionId=session_id, items=len(data_to_process_now),
+                                  firstTimestamp=data_to_process_now.timestamps[0] if len(data_to_process_now) else None,
+                                  lastTimestamp=data_to_process_now.timestamps[-1] if len(data_to_process_now) else None)
                     
-                    if (can_process_chunk or is_last_batch_from_db) and has_pending_data_to_process:
-                        data_to_process_now = overlap_buffer + current_items_for_chunk
-                        current_items_for_chunk = []
-                        overlap_buffer = []
-
-                        # Debug: print timestamps of first and last items in data_to_process_now
-                        if data_to_process_now:
-                            try:
-                                first_ts = data_to_process_now[0]['Timestamp']['S']
-                                last_ts = data_to_process_now[-1]['Timestamp']['S']
-                                print(f"[DEBUG] Processing batch: {len(data_to_process_now)} items, first_ts: {first_ts}, last_ts: {last_ts}")
-                            except Exception as e:
-                                print(f"[DEBUG] Could not extract timestamps from data_to_process_now: {e}")
-                        else:
-                            print("[DEBUG] data_to_process_now is empty")
-                        
-                        if not data_to_process_now or (is_last_batch_from_db and len(data_to_process_now) < window_size):
-                            # No more data, or not enough for a full window at the end
-                            break
-                        
-                        num_items_in_current_processing_batch = len(data_to_process_now)
-                        num_full_windows_in_batch = num_items_in_current_processing_batch // window_size
-                        end_index_for_full_windows = num_full_windows_in_batch * window_size
-                        
-                        if end_index_for_full_windows > 0:
-                            for i in range(0, end_index_for_full_windows, window_size):
-                                window_data = data_to_process_now[i : i + window_size]
-                                window_results = process_window(window_data, global_window_count, 
-                                                             session_id, user_email, cur_basal)
-                                all_results.extend(window_results)
-                                global_window_count += 1
-                            
-                            total_items_processed_into_windows += end_index_for_full_windows
-                            
-                            # Update progress
-                            denominator = total_items_processed_into_windows + len(overlap_buffer)
-                            if denominator > 0:
-                                progress = (total_items_processed_into_windows / denominator) * 100
-                                update_processing_status(session_id, 'processing', progress)
-                            else:
-                                # Only update status if there is meaningful progress
-                                update_processing_status(session_id, 'processing', 0.0)
+                    if end_index_for_full_windows > 0:
+                        all_results.extend(process_window_batch(stream, data_to_process_now, end_index_for_full_windows,
+                                                                session_id, user_email, subject, result_writer,
+                                                                summary, session_metrics))
                         
-                        overlap_buffer = data_to_process_now[end_index_for_full_windows:]
-                        print(f"[DEBUG] overlap_buffer length after processing: {len(overlap_buffer)}")
+                        # Update progress
+                        denominator = stream.samples_processed + len(stream.overlap)
+                        progress = (stream.samples_processed / denominator) * 100 if denominator > 0 else 0.0
+                        # Checkpoint every checkpoint_interval seconds, and right away once SIGTERM arrives
+                        checkpoint_due = checkpoint_interval > 0 and not is_last_batch_from_db and (
+                            time.monotonic() - last_checkpoint >= checkpoint_interval
+                            or (shutdown_requested.is_set() and not shutdown_checkpointed))
+                        if checkpoint_due:
+                            save_checkpoint(session_id, stream, result_writer, progress, session_metrics)
+                            last_checkpoint = time.monotonic()
+                            shutdown_checkpointed = shutdown_requested.is_set()
+                        else:
+                            update_processing_status(session_id, 'processing', progress)
 
-                        # Fix: break if last batch and overlap_buffer is less than window_size
-                        if is_last_batch_from_db and len(overlap_buffer) < window_size:
-                            print(f"[DEBUG] Breaking loop: last batch and overlap_buffer has {len(overlap_buffer)} items (less than window_size).")
-                            break
+                    if is_last_batch_from_db:
+                        # The tail of the session is shorter than a window
+                        if log_debug and len(stream.overlap):
+                            log_event(logger, logging.DEBUG, 'session_tail_dropped', sessionId=session_id,
+                                      items=len(stream.overlap))
+                        break
                 
                 except Exception as e:
-                    print(f"Error processing chunk: {str(e)}")
-                    update_processing_status(session_id, 'failed', error=str(e))
+                    log_event(logger, logging.ERROR, 'chunk_failed', sessionId=session_id, error=str(e))
+                    try:
+                        # Keep what was computed so far, as the unbuffered put_item path did
+                        result_writer.close()
+                        # Every window the stream moved past is stored, so a retry can resume after it
+                        failed_checkpoint = stream.checkpoint() if checkpoint_interval > 0 else None
+                    except Exception as close_error:
+                        log_event(logger, logging.ERROR, 'result_flush_failed', sessionId=session_id, error=str(close_error))
+                        failed_checkpoint = None
+                    update_processing_status(session_id, 'failed', error=str(e), checkpoint=failed_checkpoint)
+                    process_metrics.merge(session_metrics)
+                    summary.log(logger, 'session_failed', logging.ERROR, stages=session_metrics.summary())
                     raise
             
-            if not all_results:
+            # Every result must be stored before the session is marked completed
+            with session_metrics.time('result_flush'):
+                result_writer.close()
+            session_metrics.observe('session', time.perf_counter() - session_start)
+            process_metrics.merge(session_metrics)
+            stage_timings = session_metrics.summary()
+            summary.add('results', len(all_results))
+            summary.add('nonFiniteSkipped', sum(1 for result in all_results if result.get('error')))
+            summary.log(logger, stages=stage_timings, resultWriter=result_writer.stats(), profileCache=profile_cache.stats(),
+                        resumedWindows=windows_before,
+                        calibration=stream.calibration.stats() if stream.calibration is not None else None)
+            # A final checkpoint makes a redelivery of this message a no-op
+            final_checkpoint = stream.checkpoint(final=True) if checkpoint_interval > 0 else None
+            
+            if not stream.result_count:
                 update_processing_status(session_id, 'failed', 
-                                      error='No results generated from processing')
+                                      error='No results generated from processing', stage_timings=stage_timings,
+                                      checkpoint=final_checkpoint)
                 return
             
-            update_processing_status(session_id, 'completed', 100)
+            update_processing_status(session_id, 'completed', 100, stage_timings=stage_timings, checkpoint=final_checkpoint)
             
         except Exception as e:
-            print(f"Error processing session: {str(e)}")
+            log_event(logger, logging.ERROR, 'session_error', sessionId=session_id, error=str(e))
             update_processing_status(session_id, 'failed', error=str(e))
             raise
             
     except Exception as e:
-        print(f"Error processing message: {str(e)}")
+        log_event(logger, logging.ERROR, 'message_error', error=str(e))
         raise
 
+class VisibilityHeartbeat:
+    """
+    Background thread that keeps in-flight SQS messages invisible while their sessions are processed.
+    Every heartbeat_interval seconds each tracked message gets its visibility timeout reset to
+    visibility_extension seconds, so a crashed worker's messages come back after minutes, not hours.
+    """
+
+    def __init__(self, queue_url: str, interval: int = heartbeat_interval, extension: int = visibility_extension):
+        self.queue_url = queue_url
+        self.interval = interval
+        self.extension = extension
+        self._receipt_handles = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='visibility-heartbeat', daemon=True)
+
+    def start(self):
+        if self.interval > 0:
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def add(self, receipt_handle: str):
+        with self._lock:
+            self._receipt_handles.add(receipt_handle)
+        if self.interval > 0:
+            self._set_visibility(receipt_handle, self.extension)
+
+    def remove(self, receipt_handle: str):
+        with self._lock:
+            self._receipt_handles.discard(receipt_handle)
+
+    def release(self, receipt_handle: str):
+        """Stop tracking a message and make it visible to other workers right away"""
+        self.remove(receipt_handle)
+        self._set_visibility(receipt_handle, 0)
+
+    def _set_visibility(self, receipt_handle: str, timeout: int):
+        try:
+            sqs.change_message_visibility(
+                QueueUrl=self.queue_url,
+                ReceiptHandle=receipt_handle,
+                VisibilityTimeout=timeout
+            )
+        except Exception as e:
+            log_event(logger, logging.ERROR, 'visibility_change_failed', timeout=timeout, error=str(e))
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                receipt_handles = list(self._receipt_handles)
+            for receipt_handle in receipt_handles:
+                self._set_visibility(receipt_handle, self.extension)
+
+def handle_message(message: Dict[str, Any], heartbeat: VisibilityHeartbeat):
+    """Process one queue message and delete it on success"""
+    try:
+        process_message(message)
+        # Delete message from queue after successful processing
+        sqs.delete_message(
+            QueueUrl=os.environ['PROCESSING_QUEUE_URL'],
+            ReceiptHandle=message['ReceiptHandle']
+        )
+    except CheckpointConflict as e:
+        log_event(logger, logging.WARNING, 'message_retried', messageId=message.get('MessageId'), error=str(e))
+        # Retry right away; the rerun resumes from the checkpoint that superseded this one
+        heartbeat.release(message['ReceiptHandle'])
+    except Exception as e:
+        log_event(logger, logging.ERROR, 'message_failed', messageId=message.get('MessageId'), error=str(e))
+        # Message will return to queue after visibility timeout
+    finally:
+        heartbeat.remove(message['ReceiptHandle'])
+
+def _request_shutdown(signum, frame):
+    log_event(logger, logging.INFO, 'shutdown_requested', signal=signum)
+    shutdown_requested.set()
+
 def main():
     """Main worker loop"""
-    print("Starting energy expenditure processing worker")
-    
-    while True:
+    log_event(logger, logging.INFO, 'worker_started', maxInFlightSessions=max_in_flight_sessions)
+    if metrics_port:
+        start_metrics_server(metrics_port, process_metrics)
+        log_event(logger, logging.INFO, 'metrics_server_started', port=metrics_port)
+    os_signal.signal(os_signal.SIGTERM, _request_shutdown)
+    if preload_models:
+        preload_start = time.perf_counter()
+        warm_up()
+        log_event(logger, logging.INFO, 'worker_ready', executorMode=executor_mode,
+                  preloadSeconds=round(time.perf_counter() - preload_start, 3))
+
+    queue_url = os.environ['PROCESSING_QUEUE_URL']
+    heartbeat = VisibilityHeartbeat(queue_url)
+    heartbeat.start()
+    session_executor = ThreadPoolExecutor(max_workers=max_in_flight_sessions, thread_name_prefix='session')
+    in_flight: Dict[Any, Dict[str, Any]] = {}
+
+    while not shutdown_requested.is_set():
         try:
-            # Receive message from queue
+            for future in [future for future in in_flight if future.done()]:
+                del in_flight[future]
+
+            free_slots = max_in_flight_sessions - len(in_flight)
+            if free_slots <= 0:
+                wait(list(in_flight), timeout=5, return_when=FIRST_COMPLETED)
+                continue
+
+            # Receive messages from queue, at most one per free session slot
             response = sqs.receive_message(
-                QueueUrl=os.environ['PROCESSING_QUEUE_URL'],
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=20
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(free_slots, 10),
+                WaitTimeSeconds=receive_wait_seconds
             )
             
-            if 'Messages' in response:
-                for message in response['Messages']:
-                    try:
-                        process_message(message)
-                        # Delete message from queue after successful processing
-                        sqs.delete_message(
-                            QueueUrl=os.environ['PROCESSING_QUEUE_URL'],
-                            ReceiptHandle=message['ReceiptHandle']
-                        )
-                    except Exception as e:
-                        print(f"Error processing message: {str(e)}")
-                        # Message will return to queue after visibility timeout
-                        continue
+            for message in response.get('Messages', []):
+                heartbeat.add(message['ReceiptHandle'])
+                in_flight[session_executor.submit(handle_message, message, heartbeat)] = message
             
         except Exception as e:
-            print(f"Error in main loop: {str(e)}")
+            log_event(logger, logging.ERROR, 'main_loop_error', error=str(e))
             time.sleep(5)  # Wait before retrying
 
+    # Graceful drain: no new messages, give in-flight sessions drain_timeout seconds to finish
+    log_event(logger, logging.INFO, 'draining', inFlightSessions=len(in_flight))
+    _, unfinished = wait(list(in_flight), timeout=drain_timeout)
+    for future in unfinished:
+        # Hand unfinished sessions back to the queue instead of waiting out the visibility timeout
+        heartbeat.release(in_flight[future]['ReceiptHandle'])
+    heartbeat.stop()
+    session_executor.shutdown(wait=False, cancel_futures=True)
+    log_event(logger, logging.INFO, 'worker_stopped', unfinishedSessions=len(unfinished))
+    if unfinished:
+        # Session threads cannot be interrupted; exit without joining them
+        os._exit(0)
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,96 @@
+"""
+In-process cache of user profiles and the subject values the EE pipeline needs.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, NamedTuple, Optional
+
+PROFILE_VERSION_KEY = 'last_updated'  # Profile dict key of the LastUpdated timestamp the profile Lambda writes
+
+class SubjectContext(NamedTuple):
+    """Per-subject values used by every window: body weight (kg), height (m) and basal rate (W)"""
+    weight: float
+    height: float
+    basal: float
+
+def make_subject_context(user_profile: Dict[str, Any], basal_fn: Callable[..., float]) -> SubjectContext:
+    """Build a SubjectContext from a profile dict; basal_fn is utils.basalEst, with its default factors"""
+    basal = basal_fn(user_profile['height'], user_profile['weight'], user_profile['age'], user_profile['gender'])
+    return SubjectContext(weight=user_profile['weight'], height=user_profile['height'], basal=basal)
+
+class ProfileCache:
+    """
+    TTL + LRU cache of user_email -> (profile, SubjectContext).
+    fetch_fn loads a profile dict on a miss; entries expire after ttl seconds and the least
+    recently used entry is evicted beyond max_entries. A lookup may pass the profile's version (its
+    LastUpdated timestamp); an entry fetched at another version is refetched, whatever its age.
+    Safe to share between session threads.
+    """
+
+    def __init__(self, fetch_fn: Callable[[str], Dict[str, Any]], basal_fn: Callable[..., float],
+                 ttl: float = 300.0, max_entries: int = 1024, clock: Callable[[], float] = time.monotonic):
+        self.fetch_fn = fetch_fn
+        self.basal_fn = basal_fn
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, user_email: str, version: Optional[str] = None) -> Dict[str, Any]:
+        """Cached profile dict for user_email"""
+        return self._lookup(user_email, version)[0]
+
+    def get_subject(self, user_email: str, version: Optional[str] = None) -> SubjectContext:
+        """Cached SubjectContext (weight, height, basal) for user_email"""
+        return self._lookup(user_email, version)[1]
+
+    def invalidate(self, user_email: Optional[str] = None):
+        """Drop one user's entry, or every entry when user_email is None"""
+        with self._lock:
+            if user_email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_email.lower(), None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'hitRate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _lookup(self, user_email: str, version: Optional[str] = None) -> tuple:
+        key = user_email.lower()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                if version is None or entry[0].get(PROFILE_VERSION_KEY) == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+                # The profile was edited after this entry was fetched
+                self.stale += 1
+            self.misses += 1
+        # Fetch outside the lock so a slow get_item does not block other sessions
+        profile = self.fetch_fn(user_email)
+        entry = (profile, make_subject_context(profile, self.basal_fn), now + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
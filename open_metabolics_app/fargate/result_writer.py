@@ -0,0 +1,141 @@
+"""
+Buffered DynamoDB result writer using BatchWriteItem.
+"""
+
+import queue
+import random
+import threading
+import time
+from typing import List, Dict, Any
+
+MAX_BATCH_SIZE = 25  # BatchWriteItem limit
+
+class ResultWriter:
+    """
+    Collects result items and writes them with batch_write_item in groups of up to 25.
+    UnprocessedItems are retried with exponential backoff. With background=True full batches
+    are written by a separate thread while the caller keeps computing; flush() always waits
+    until everything buffered so far is stored.
+    """
+
+    def __init__(self, client, table_name: str, batch_size: int = MAX_BATCH_SIZE, max_retries: int = 8,
+                 base_backoff: float = 0.05, max_backoff: float = 5.0, background: bool = False,
+                 key_attributes=('SessionId', 'Timestamp'), metrics=None):
+        self.client = client
+        self.table_name = table_name
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.key_attributes = key_attributes
+        self.metrics = metrics  # Optional metrics.StageMetrics; gets a 'result_write' timing per batch
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_keys = set()
+        self._stats_lock = threading.Lock()
+        self.flush_count = 0
+        self.items_written = 0
+        self.unprocessed_retries = 0
+        self.flush_latencies: List[float] = []
+
+        self._queue = None
+        self._thread = None
+        self._background_error = None
+        if background:
+            self._queue = queue.Queue(maxsize=8)
+            self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+            self._thread.start()
+
+    def put(self, item: Dict[str, Any]):
+        """Buffer one item (a DynamoDB attribute map); full batches are written right away"""
+        key = tuple(str(item.get(attr)) for attr in self.key_attributes)
+        if key in self._pending_keys:
+            # BatchWriteItem rejects duplicate keys in one request; keep put_item's last-write-wins order
+            self._submit_pending()
+        self._pending.append(item)
+        self._pending_keys.add(key)
+        if len(self._pending) >= self.batch_size:
+            self._submit_pending()
+
+    def flush(self):
+        """Write every buffered item and wait for background writes to finish"""
+        self._submit_pending()
+        if self._queue is not None:
+            self._queue.join()
+            self._raise_background_error()
+
+    def close(self):
+        """Flush and stop the background thread"""
+        try:
+            self.flush()
+        finally:
+            if self._queue is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            latencies = sorted(self.flush_latencies)
+        return {
+            'flushCount': self.flush_count,
+            'itemsWritten': self.items_written,
+            'unprocessedRetries': self.unprocessed_retries,
+            'flushLatencyTotal': sum(latencies),
+            'flushLatencyMax': latencies[-1] if latencies else 0.0,
+            'flushLatencyP50': latencies[len(latencies) // 2] if latencies else 0.0,
+        }
+
+    def _submit_pending(self):
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = []
+        self._pending_keys = set()
+        if self._queue is None:
+            self._write_batch(batch)
+        else:
+            self._raise_background_error()
+            self._queue.put(batch)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._background_error is None:
+                    self._write_batch(batch)
+            except Exception as e:
+                self._background_error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_background_error(self):
+        if self._background_error is not None:
+            error, self._background_error = self._background_error, None
+            raise error
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        start_time = time.perf_counter()
+        request_items = {self.table_name: [{'PutRequest': {'Item': item}} for item in batch]}
+        attempt = 0
+        while request_items:
+            response = self.client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                break
+            attempt += 1
+            if attempt > self.max_retries:
+                unprocessed = sum(len(requests) for requests in request_items.values())
+                raise Exception(f"batch_write_item left {unprocessed} unprocessed items after {self.max_retries} retries")
+            with self._stats_lock:
+                self.unprocessed_retries += 1
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt)))
+        elapsed = time.perf_counter() - start_time
+        with self._stats_lock:
+            self.flush_count += 1
+            self.items_written += len(batch)
+            self.flush_latencies.append(elapsed)
+        if self.metrics is not None:
+            self.metrics.observe('result_write', elapsed)
@@ -0,0 +1,79 @@
+"""
+Columnar decoding of raw sensor items returned by DynamoDB queries.
+"""
+
+from datetime import datetime
+from typing import List, Dict, Any
+import numpy as np
+
+# Column layout of SensorColumns.values, the same as daily_sp_pocket_data.csv
+TIME_COL = 0
+GYRO_COLS = slice(1, 4)
+ACC_COLS = slice(4, 7)
+SENSOR_ATTRIBUTES = ('Gyroscope_X', 'Gyroscope_Y', 'Gyroscope_Z',
+                     'Accelerometer_X', 'Accelerometer_Y', 'Accelerometer_Z')
+
+class SensorColumns:
+    """
+    Decoded raw sensor rows: the Timestamp sort keys plus an (n, 7) float64 array
+    of epoch seconds, gyro xyz and acc xyz. Slicing returns views, not copies.
+    """
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: slice) -> 'SensorColumns':
+        return SensorColumns(self.timestamps[index], self.values[index])
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.values[:, TIME_COL]
+
+    @property
+    def gyro(self) -> np.ndarray:
+        return self.values[:, GYRO_COLS]
+
+    @property
+    def acc(self) -> np.ndarray:
+        return self.values[:, ACC_COLS]
+
+    @classmethod
+    def empty(cls) -> 'SensorColumns':
+        return cls(np.empty(0, dtype=object), np.empty((0, 7)))
+
+    @classmethod
+    def concatenate(cls, blocks: List['SensorColumns']) -> 'SensorColumns':
+        blocks = [block for block in blocks if len(block)]
+        if not blocks:
+            return cls.empty()
+        if len(blocks) == 1:
+            return blocks[0]
+        return cls(np.concatenate([block.timestamps for block in blocks]),
+                   np.concatenate([block.values for block in blocks]))
+
+def parse_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    """
+    Convert Timestamp keys ('2024-01-01T12:00:00.123Z_000000') to epoch seconds in one pass.
+    Falls back to datetime.fromisoformat for keys numpy cannot parse (e.g. explicit UTC offsets).
+    """
+    iso_strings = [ts.split('_')[0] for ts in timestamps]
+    try:
+        parsed = np.array([ts[:-1] if ts.endswith('Z') else ts for ts in iso_strings], dtype='datetime64[us]')
+        return (parsed - np.datetime64(0, 'us')).astype(np.int64) / 1e6
+    except ValueError:
+        return np.array([datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp() for ts in iso_strings])
+
+def decode_sensor_page(items: List[Dict[str, Any]]) -> SensorColumns:
+    """
+    Decode one dynamodb.query page of raw sensor items straight into preallocated float64 columns.
+    """
+    timestamps = np.array([item['Timestamp']['S'] for item in items], dtype=object)
+    values = np.empty((len(items), 7))
+    for col, attribute in enumerate(SENSOR_ATTRIBUTES, start=1):
+        values[:, col] = np.array([item[attribute]['N'] for item in items], dtype=np.float64)
+    values[:, TIME_COL] = parse_timestamps(timestamps)
+    return SensorColumns(timestamps, values)
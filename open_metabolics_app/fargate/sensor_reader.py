@@ -0,0 +1,171 @@
+"""
+Readers for a session's raw sensor data in RAW_SENSOR_TABLE.
+
+Both readers yield decoded SensorColumns pages in Timestamp order. The prefetching reader splits the
+session's Timestamp range into segments, queries them concurrently and hands pages over through
+bounded queues, so decoding and compute overlap with DynamoDB I/O.
+"""
+
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, Optional, Tuple, Dict, Any
+from sensor_decoding import SensorColumns, decode_sensor_page
+from metrics import StageMetrics
+
+MIN_TIMESTAMP = '0000-01-01T00:00:00Z'  # earliest possible ISO8601
+MIN_SEGMENT_SECONDS = 60  # Sessions shorter than segments * this are read as a single segment
+_QUEUE_POLL_SECONDS = 0.5
+
+def _query_pages(client, table_name: str, session_id: str, lower: str, upper: Optional[str] = None,
+                 page_size: int = 1000, metrics: Optional[StageMetrics] = None) -> Iterator[Dict[str, Any]]:
+    """Yield raw query pages for Timestamp >= lower (and <= upper when given), following LastEvaluatedKey"""
+    if upper is None:
+        key_condition = 'SessionId = :sessionId AND #ts >= :minTimestamp'
+        expr_vals = {':sessionId': {'S': session_id}, ':minTimestamp': {'S': lower}}
+    else:
+        key_condition = 'SessionId = :sessionId AND #ts BETWEEN :minTimestamp AND :maxTimestamp'
+        expr_vals = {':sessionId': {'S': session_id}, ':minTimestamp': {'S': lower}, ':maxTimestamp': {'S': upper}}
+    last_evaluated_key = None
+    while True:
+        query_params = {
+            'TableName': table_name,
+            'KeyConditionExpression': key_condition,
+            'ExpressionAttributeNames': {'#ts': 'Timestamp'},
+            'ExpressionAttributeValues': expr_vals,
+            'Limit': page_size,
+            'ScanIndexForward': True
+        }
+        if last_evaluated_key:
+            query_params['ExclusiveStartKey'] = last_evaluated_key
+        query_start = time.perf_counter()
+        query_result = client.query(**query_params)
+        if metrics is not None:
+            metrics.observe('dynamodb_query', time.perf_counter() - query_start)
+        yield query_result
+        last_evaluated_key = query_result.get('LastEvaluatedKey')
+        if not last_evaluated_key:
+            return
+
+def _decode(items, metrics: Optional[StageMetrics]) -> SensorColumns:
+    if metrics is None:
+        return decode_sensor_page(items)
+    with metrics.time('decode'):
+        return decode_sensor_page(items)
+
+def read_session_pages(client, table_name: str, session_id: str, page_size: int = 1000,
+                       metrics: Optional[StageMetrics] = None, start_key: Optional[str] = None) -> Iterator[SensorColumns]:
+    """Sequential reader: one query page at a time, decoded into SensorColumns, from start_key (inclusive) when given"""
+    for query_result in _query_pages(client, table_name, session_id, start_key or MIN_TIMESTAMP,
+                                     page_size=page_size, metrics=metrics):
+        items = query_result.get('Items', [])
+        if items:
+            yield _decode(items, metrics)
+
+def _probe_timestamp(client, table_name: str, session_id: str, forward: bool) -> Optional[str]:
+    response = client.query(
+        TableName=table_name,
+        KeyConditionExpression='SessionId = :sessionId AND #ts >= :minTimestamp',
+        ExpressionAttributeNames={'#ts': 'Timestamp'},
+        ExpressionAttributeValues={':sessionId': {'S': session_id}, ':minTimestamp': {'S': MIN_TIMESTAMP}},
+        ProjectionExpression='#ts',
+        Limit=1,
+        ScanIndexForward=forward
+    )
+    items = response.get('Items', [])
+    return items[0]['Timestamp']['S'] if items else None
+
+def _parse_key(timestamp: str) -> datetime:
+    return datetime.strptime(timestamp.split('_')[0], '%Y-%m-%dT%H:%M:%S.%fZ')
+
+def _format_key(moment: datetime) -> str:
+    """Format a segment boundary like the Timestamp keys ('2024-01-01T12:00:00.123Z'), without the _sequence suffix"""
+    return moment.strftime('%Y-%m-%dT%H:%M:%S.') + f"{moment.microsecond // 1000:03d}Z"
+
+def segment_bounds(first_key: str, last_key: str, segments: int) -> list:
+    """
+    Split [first_key, last_key] into contiguous Timestamp segments [lower, upper).
+    The first segment starts at MIN_TIMESTAMP and the last one is open-ended (upper None).
+    """
+    try:
+        first, last = _parse_key(first_key), _parse_key(last_key)
+    except ValueError:
+        return [(MIN_TIMESTAMP, None)]
+    duration = (last - first).total_seconds()
+    segments = max(1, min(segments, int(duration // MIN_SEGMENT_SECONDS)))
+    boundaries = [_format_key(first + timedelta(seconds=duration * i / segments)) for i in range(1, segments)]
+    lowers = [MIN_TIMESTAMP] + boundaries
+    uppers = boundaries + [None]
+    return list(zip(lowers, uppers))
+
+def prefetch_session_pages(client, table_name: str, session_id: str, segments: int = 4, queue_pages: int = 4,
+                           page_size: int = 1000, metrics: Optional[StageMetrics] = None,
+                           start_key: Optional[str] = None) -> Iterator[SensorColumns]:
+    """
+    Prefetching reader: query the session's Timestamp segments concurrently, from start_key (inclusive)
+    when given. Each segment thread decodes its pages into a bounded queue (queue_pages deep); segments
+    are consumed strictly in order, so the caller sees exactly the sequential reader's order.
+    """
+    first_key = start_key or _probe_timestamp(client, table_name, session_id, forward=True)
+    if first_key is None:
+        return
+    last_key = _probe_timestamp(client, table_name, session_id, forward=False)
+    bounds = segment_bounds(first_key, last_key, segments)
+    if start_key:
+        bounds[0] = (start_key, bounds[0][1])
+
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_pages) for _ in bounds]
+    _done = object()
+
+    def put(segment_queue, value) -> bool:
+        while not stop.is_set():
+            try:
+                segment_queue.put(value, timeout=_QUEUE_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_segment(segment_queue, segment_lower: str, segment_upper: Optional[str]):
+        try:
+            for query_result in _query_pages(client, table_name, session_id, segment_lower, segment_upper, page_size, metrics):
+                # BETWEEN is inclusive: an item exactly on the boundary belongs to the next segment
+                items = [item for item in query_result.get('Items', [])
+                         if segment_upper is None or item['Timestamp']['S'] < segment_upper]
+                if items and not put(segment_queue, _decode(items, metrics)):
+                    return
+            put(segment_queue, _done)
+        except Exception as e:
+            put(segment_queue, e)
+
+    threads = [threading.Thread(target=read_segment, args=(segment_queue, segment_lower, segment_upper),
+                                name=f'sensor-reader-{i}', daemon=True)
+               for i, (segment_queue, (segment_lower, segment_upper)) in enumerate(zip(queues, bounds))]
+    for thread in threads:
+        thread.start()
+    try:
+        for segment_queue in queues:
+            while True:
+                page = segment_queue.get()
+                if page is _done:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+    finally:
+        # Unblock and retire producers when the consumer stops early
+        stop.set()
+
+def with_last_flag(pages: Iterator[SensorColumns]) -> Iterator[Tuple[SensorColumns, bool]]:
+    """Yield (page, is_last) pairs using one page of lookahead"""
+    pages = iter(pages)
+    try:
+        previous = next(pages)
+    except StopIteration:
+        return
+    for page in pages:
+        yield previous, False
+        previous = page
+    yield previous, True
@@ -0,0 +1,141 @@
+"""
+Binary session format for raw smartphone recordings, memory-mapped for offline analysis.
+
+Layout (little-endian):
+
+- a 64-byte header: magic, format version, bytes per sensor value (4 or 8), sample count,
+  sample rate in Hz and subject ID (32 bytes of UTF-8, NUL-padded)
+- one fixed-size record per sample: time (float64, s), then gyro xyz (rad/s) and acc xyz as
+  float32 or float64, the column order of daily_sp_pocket_data.csv
+
+Time stays float64 so float32 files keep exact sample times. Because records are fixed-size, the
+reader memory-maps the file: the time and sensor columns are strided views of the mapping, and
+windows are sliced from them without parsing or copying.
+
+Convert a CSV: python session_format.py convert daily_sp_pocket_data.csv day.omsession --subject S1
+"""
+
+import argparse
+import os
+import struct
+from typing import NamedTuple
+import numpy as np
+
+MAGIC = b'OMSESSN\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHQd32s')
+HEADER_SIZE = 64  # HEADER padded so records start on a 64-byte boundary
+SESSION_SUFFIX = '.omsession'
+SENSOR_DTYPES = {'float32': 4, 'float64': 8}
+
+class SessionRecording(NamedTuple):
+    """A recording as columns: time (n,) in seconds and sensors (n, 6), gyro xyz then acc xyz"""
+    time: np.ndarray
+    sensors: np.ndarray
+    sample_rate: float
+    subject_id: str
+
+def record_dtype(value_bytes: int) -> np.dtype:
+    """Record layout for float32 (value_bytes=4) or float64 (8) sensor values"""
+    return np.dtype([('time', '<f8'), ('sensors', f'<f{value_bytes}', (6,))])
+
+def is_session_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def _pack_header(value_bytes: int, num_samples: int, sample_rate: float, subject_id: str) -> bytes:
+    subject = subject_id.encode('utf-8')
+    if len(subject) > 32:
+        raise ValueError(f"Subject ID {subject_id!r} is longer than 32 bytes")
+    return HEADER.pack(MAGIC, FORMAT_VERSION, value_bytes, num_samples, sample_rate, subject).ljust(HEADER_SIZE, b'\0')
+
+def write_session(path: str, time: np.ndarray, sensors: np.ndarray, sample_rate: float = 50.0, subject_id: str = '',
+                  dtype: str = 'float32'):
+    """Write a recording given as time (n,) and sensors (n, 6) columns"""
+    value_bytes = SENSOR_DTYPES[dtype]
+    records = np.empty(len(time), dtype=record_dtype(value_bytes))
+    records['time'] = time
+    records['sensors'] = sensors
+    with open(path, 'wb') as f:
+        f.write(_pack_header(value_bytes, len(records), sample_rate, subject_id))
+        records.tofile(f)
+
+def convert_csv(csv_path: str, session_path: str, sample_rate: float = 50.0, subject_id: str = '',
+                dtype: str = 'float32', chunk_rows: int = 500_000) -> int:
+    """
+    Convert a CSV in the daily_sp_pocket_data.csv layout (no header; time, gyro xyz, acc xyz).
+    The CSV is parsed chunk_rows rows at a time, so memory stays bounded for day-long files.
+    Returns the number of samples written.
+    """
+    import pandas as pd
+
+    value_bytes = SENSOR_DTYPES[dtype]
+    num_samples = 0
+    with open(session_path, 'wb') as f:
+        f.write(_pack_header(value_bytes, 0, sample_rate, subject_id))
+        for chunk in pd.read_csv(csv_path, header=None, chunksize=chunk_rows, dtype=np.float64):
+            values = chunk.values
+            records = np.empty(len(values), dtype=record_dtype(value_bytes))
+            records['time'] = values[:, 0]
+            records['sensors'] = values[:, 1:7]
+            records.tofile(f)
+            num_samples += len(records)
+        # The sample count is only known once the whole CSV has been read
+        f.seek(0)
+        f.write(_pack_header(value_bytes, num_samples, sample_rate, subject_id))
+    return num_samples
+
+def open_session(path: str) -> SessionRecording:
+    """Memory-map a session file read-only; time and sensors are views of the mapping"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a session file")
+    _, version, value_bytes, num_samples, sample_rate, subject = HEADER.unpack_from(header)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has session format version {version}; this reader supports {FORMAT_VERSION}")
+    dtype = record_dtype(value_bytes)
+    expected_size = HEADER_SIZE + num_samples * dtype.itemsize
+    if os.path.getsize(path) < expected_size:
+        raise ValueError(f"{path} is truncated: {num_samples} samples need {expected_size} bytes")
+    if num_samples == 0:
+        records = np.empty(0, dtype=dtype)
+    else:
+        records = np.memmap(path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(num_samples,))
+    return SessionRecording(records['time'], records['sensors'], sample_rate, subject.rstrip(b'\0').decode('utf-8'))
+
+def load_recording(path: str) -> SessionRecording:
+    """A recording from a session file (memory-mapped) or from a CSV in the daily_sp_pocket_data.csv layout"""
+    if is_session_file(path):
+        return open_session(path)
+    import pandas as pd
+
+    values = pd.read_csv(path, header=None, dtype=np.float64).values
+    return SessionRecording(values[:, 0], values[:, 1:7], 50.0, '')
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert and inspect binary session files')
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help='Convert a CSV recording to a session file')
+    convert.add_argument('csv', help='CSV in the daily_sp_pocket_data.csv layout')
+    convert.add_argument('output', nargs='?', help=f'Session file (default: the CSV name with {SESSION_SUFFIX})')
+    convert.add_argument('--subject', default='', help='Subject ID stored in the header')
+    convert.add_argument('--sample-rate', type=float, default=50.0, help='Sampling frequency in Hz')
+    convert.add_argument('--dtype', choices=sorted(SENSOR_DTYPES), default='float32', help='Sensor value type')
+    info = commands.add_parser('info', help='Print the header of a session file')
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        output = args.output or os.path.splitext(args.csv)[0] + SESSION_SUFFIX
+        num_samples = convert_csv(args.csv, output, args.sample_rate, args.subject, args.dtype)
+        print(f"Wrote {num_samples:,} samples to {output} ({os.path.getsize(output) / 2 ** 20:.1f} MB, "
+              f"CSV {os.path.getsize(args.csv) / 2 ** 20:.1f} MB)")
+    else:
+        recording = open_session(args.path)
+        print(f"{args.path}: {len(recording.time):,} samples at {recording.sample_rate:g} Hz "
+              f"({len(recording.time) / recording.sample_rate / 3600:.2f} h), sensors {recording.sensors.dtype}, "
+              f"subject {recording.subject_id or '-'}")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 #!/bin/bash
 
+# exec so the service is PID 1 and receives ECS's SIGTERM directly (the worker drains on it)
 if [ "$SERVICE_TYPE" = "worker" ]; then
     echo "Starting worker service..."
-    python process_energy_expenditure_worker.py
+    exec python process_energy_expenditure_worker.py
 else
     echo "Starting API service..."
-    gunicorn --bind 0.0.0.0:80 process_energy_expenditure:app
-fi 
\ No newline at end of file
+    exec gunicorn --bind 0.0.0.0:80 process_energy_expenditure:app
+fi
@@ -0,0 +1,75 @@
+"""Shared test setup: the fargate modules on sys.path, imported the way the worker and scripts do, and tolerances."""
+
+import os
+import sys
+import pytest
+
+FARGATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, FARGATE_DIR)
+
+@pytest.fixture
+def numeric_tolerance():
+    """Absolute slack for values that two equivalent computations may round differently"""
+    return 1e-9
+
+LOCAL_ENVIRONMENT = {
+    'STORAGE_BACKEND': 'memory', 'RAW_SENSOR_TABLE': 'RawSensorData', 'RESULTS_TABLE': 'EnergyExpenditureResults',
+    'USER_PROFILES_TABLE': 'UserProfiles', 'PROCESSING_STATUS_TABLE': 'ProcessingStatus',
+    'PROCESSING_QUEUE_URL': 'local://sqs/processing',
+}
+USER_EMAIL = 'test@example.com'
+
+def stored_results(dynamodb, session_id):
+    """Result items of a session keyed by Timestamp, without the SessionId"""
+    items = dynamodb.query(TableName=os.environ['RESULTS_TABLE'], KeyConditionExpression='SessionId = :sid',
+                           ExpressionAttributeValues={':sid': {'S': session_id}})['Items']
+    return {item['Timestamp']['S']: {name: value for name, value in item.items() if name != 'SessionId'}
+            for item in items}
+
+@pytest.fixture
+def local_dynamodb(monkeypatch):
+    """Empty local_backends tables, named as the worker and API read them from the environment"""
+    for env_name, value in LOCAL_ENVIRONMENT.items():
+        monkeypatch.setenv(env_name, value)
+    import local_backends
+
+    dynamodb = local_backends.LocalDynamoDB()
+    for env_name, (hash_key, range_key) in local_backends.APP_TABLES.items():
+        dynamodb.create_table(os.environ[env_name], hash_key, range_key)
+    dynamodb.put_item(TableName=os.environ['USER_PROFILES_TABLE'], Item={
+        'UserEmail': {'S': USER_EMAIL}, 'Weight': {'N': '77'}, 'Height': {'N': '1.78'},
+        'Age': {'N': '34'}, 'Gender': {'S': 'M'}, 'LastUpdated': {'S': '2025-01-01T00:00:00.000Z'}})
+    return dynamodb
+
+@pytest.fixture
+def local_worker(local_dynamodb, monkeypatch):
+    """The worker module on local_dynamodb, with the bundled models and no cached profiles"""
+    import process_energy_expenditure_worker as worker
+
+    monkeypatch.setattr(worker, 'dynamodb', local_dynamodb)
+    monkeypatch.setattr(worker, 'model_dir', FARGATE_DIR)
+    worker.profile_cache.invalidate()
+    return worker
+
+@pytest.fixture
+def seed_session(local_dynamodb):
+    """
+    Store recording rows (benchmark.load_dataset layout) as a session's raw sensor items, the first one as
+    sample first_index of the session; returns the items
+    """
+    from benchmark import make_page
+
+    def seed(session_id, recording, first_index=0):
+        items = [dict(item, SessionId={'S': session_id}) for item in make_page(recording, first_index)]
+        for start in range(0, len(items), 25):
+            local_dynamodb.batch_write_item(RequestItems={os.environ['RAW_SENSOR_TABLE']: [
+                {'PutRequest': {'Item': item}} for item in items[start:start + 25]]})
+        return items
+    return seed
+
+@pytest.fixture(scope='session')
+def recording():
+    """Three minutes of the bundled recording, tiled (45 windows)"""
+    from benchmark import load_dataset
+
+    return load_dataset(3 / 60, os.path.join(FARGATE_DIR, 'daily_sp_pocket_data.csv'))
@@ -0,0 +1,102 @@
+"""
+Checkpoint and resume of batch sessions on local_backends: a session that fails mid-way and is
+redelivered stores the same results as one that never failed, and a completed session is not rerun.
+"""
+
+import json
+import os
+import pytest
+from conftest import USER_EMAIL, stored_results
+
+def session_message(session_id):
+    return {'Body': json.dumps({'session_id': session_id, 'user_email': USER_EMAIL})}
+
+def fail_on_call(worker, monkeypatch, call_number):
+    """Make the call_number-th process_window raise, as a window failing after its batch was computed"""
+    process_window = worker.process_window
+    calls = []
+
+    def failing_process_window(*args, **kwargs):
+        calls.append(None)
+        if len(calls) == call_number:
+            raise RuntimeError('injected window failure')
+        return process_window(*args, **kwargs)
+    monkeypatch.setattr(worker, 'process_window', failing_process_window)
+
+@pytest.mark.parametrize('calibration_cache_mode', ['off', 'on'])
+def test_redelivered_session_matches_uninterrupted_run(local_worker, local_dynamodb, seed_session, recording,
+                                                       monkeypatch, calibration_cache_mode):
+    monkeypatch.setattr(local_worker, 'calibration_cache_mode', calibration_cache_mode)
+    seed_session('uninterrupted', recording)
+    seed_session('interrupted', recording)
+    local_worker.process_message(session_message('uninterrupted'))
+
+    with monkeypatch.context() as patch:
+        fail_on_call(local_worker, patch, 25)
+        with pytest.raises(RuntimeError):
+            local_worker.process_message(session_message('interrupted'))
+    checkpoint = local_worker.load_checkpoint('interrupted')
+    assert 0 < checkpoint['WindowCount'] < 25 and not checkpoint['Final']
+    assert (checkpoint['Calibration'] is not None) == (calibration_cache_mode == 'on')
+
+    local_worker.process_message(session_message('interrupted'))
+    assert local_worker.load_checkpoint('interrupted')['Final']
+    assert stored_results(local_dynamodb, 'interrupted') == stored_results(local_dynamodb, 'uninterrupted')
+
+def test_final_checkpoint_makes_redelivery_a_noop(local_worker, local_dynamodb, seed_session, recording, monkeypatch):
+    seed_session('session', recording)
+    local_worker.process_message(session_message('session'))
+    results = stored_results(local_dynamodb, 'session')
+    checkpoint = local_worker.load_checkpoint('session')
+    assert checkpoint['Final'] and checkpoint['WindowCount'] == len(recording) // local_worker.sliding_win
+
+    fail_on_call(local_worker, monkeypatch, 1)
+    local_worker.process_message(session_message('session'))
+    assert stored_results(local_dynamodb, 'session') == results
+    assert local_worker.load_checkpoint('session') == checkpoint
+
+def test_checkpoint_dynamodb_round_trip(local_worker, monkeypatch):
+    monkeypatch.setattr(local_worker, 'calibration_cache_mode', 'on')
+    checkpoint = {'ResumeKey': '2024-01-01T00:00:36.000Z_000000', 'ContextSamples': 200, 'WindowCount': 19,
+                  'SamplesProcessed': 3800, 'ResultCount': 57, 'Final': False,
+                  'Calibration': local_worker.CalibrationCache().state()}
+    assert local_worker.checkpoint_from_dynamodb(local_worker.checkpoint_to_dynamodb(checkpoint)) == checkpoint
+    no_resume = dict(checkpoint, ResumeKey=None, Calibration=None, Final=True)
+    assert local_worker.checkpoint_from_dynamodb(local_worker.checkpoint_to_dynamodb(no_resume)) == no_resume
+
+def test_resumed_stream_continues_the_windows(local_worker, local_dynamodb, seed_session, recording):
+    """A stream resumed from a checkpoint cuts the rest of the session into the same windows"""
+    seed_session('session', recording)
+    table = os.environ['RAW_SENSOR_TABLE']
+    target_size = local_worker.processing_chunk_target_size()
+
+    def windows(stream, pages):
+        starts = []
+        for page, is_last in local_worker.with_last_flag(pages):
+            batch = stream.add(page, is_last=is_last)
+            if batch is not None:
+                data, num_samples = batch
+                starts.extend(data.timestamps[i] for i in range(0, num_samples, local_worker.sliding_win))
+                stream.advance(data, num_samples, 0)
+        return starts
+
+    full_stream = local_worker.WindowStream(target_size)
+    all_starts = windows(full_stream, local_worker.read_session_pages(local_dynamodb, table, 'session'))
+
+    stream = local_worker.WindowStream(target_size)
+    pages = local_worker.read_session_pages(local_dynamodb, table, 'session')
+    first_batch = None
+    while first_batch is None:
+        first_batch = stream.add(next(pages))
+    stream.advance(*first_batch, 0)
+    checkpoint = stream.checkpoint()
+    assert checkpoint['WindowCount'] == first_batch[1] // local_worker.sliding_win
+    assert checkpoint['ContextSamples'] == local_worker.filter_context
+
+    resumed, pages = local_worker.WindowStream.resume(
+        target_size, checkpoint, local_worker.read_session_pages(local_dynamodb, table, 'session',
+                                                                start_key=checkpoint['ResumeKey']))
+    assert (resumed.window_count, resumed.samples_processed) == (checkpoint['WindowCount'], checkpoint['SamplesProcessed'])
+    assert len(resumed.context) == checkpoint['ContextSamples']
+    assert all_starts[:resumed.window_count] + windows(resumed, pages) == all_starts
+    assert resumed.window_count == full_stream.window_count
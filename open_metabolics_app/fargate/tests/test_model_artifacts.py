@@ -0,0 +1,70 @@
+"""
+The folded LinearCorrection against the original per-stride correction on real strides.
+
+Strides are the peak-to-peak segments of every low-pass filtered gyro axis (both signs) of
+daily_sp_pocket_data.csv. For each one, utils.processRawGait_model (sklearn predict per stride) is compared
+with utils.processRawGait_model_batch on a LinearCorrection folded from the same pickle.
+"""
+
+import os
+import numpy as np
+import pytest
+from scipy import signal
+import utils
+from model_artifacts import LinearCorrection, load_model_pair, load_pickles
+
+FARGATE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEIGHT, HEIGHT = 77.0, 1.78
+SLIDING_WIN = 200
+
+@pytest.fixture(scope='module')
+def pickles():
+    return load_pickles(FARGATE_DIR)
+
+@pytest.fixture(scope='module')
+def strides():
+    recording = np.loadtxt(os.path.join(FARGATE_DIR, 'daily_sp_pocket_data.csv'), delimiter=',')
+    b, a = signal.butter(4, 6, btype='low', fs=50)
+    gyro = signal.filtfilt(b, a, recording[:, 1:4], axis=0)
+    bounds = set()
+    for axis in range(3):
+        for sign in (1, -1):
+            starts, stops = utils.get_stride_bounds(utils.peak_detect(sign * gyro[:, axis]), SLIDING_WIN)
+            bounds.update(zip(starts.tolist(), stops.tolist()))
+    starts, stops = (np.array(values) for values in zip(*sorted(bounds)))
+    return gyro, starts, stops
+
+@pytest.fixture(scope='module')
+def model_inputs(pickles, strides):
+    """(per-stride, folded batch) model input matrices for the same strides"""
+    _, correction_model = pickles
+    gyro, starts, stops = strides
+    per_stride = np.array([utils.processRawGait_model(gyro, start, stop, WEIGHT, HEIGHT, correction_model, None)
+                           for start, stop in zip(starts, stops)])
+    bin_inputs = utils.resample_strides(gyro, starts, stops).transpose(0, 2, 1).reshape(len(starts), -1)
+    batched = utils.processRawGait_model_batch(bin_inputs, (stops - starts) / 50, WEIGHT, HEIGHT,
+                                               LinearCorrection.from_sklearn(correction_model))
+    return per_stride, batched
+
+def test_enough_strides(strides):
+    assert len(strides[1]) >= 50
+
+def test_folded_correction_matches_per_stride(model_inputs, numeric_tolerance):
+    per_stride, batched = model_inputs
+    assert batched.shape == per_stride.shape
+    np.testing.assert_allclose(batched, per_stride, rtol=0, atol=numeric_tolerance)
+    # XGBoost sees float32, where the two paths must not differ at all
+    np.testing.assert_array_equal(batched.astype(np.float32), per_stride.astype(np.float32))
+
+def test_ee_predictions_identical(pickles, model_inputs):
+    ee_model, _ = pickles
+    per_stride, batched = model_inputs
+    np.testing.assert_array_equal(ee_model.predict(batched), ee_model.predict(per_stride))
+
+def test_native_artifacts_match_pickles(pickles, model_inputs):
+    ee_model, correction_model = pickles
+    native_ee, native_correction = load_model_pair(FARGATE_DIR, 'native')
+    _, batched = model_inputs
+    np.testing.assert_array_equal(native_ee.predict(batched), ee_model.predict(batched))
+    np.testing.assert_array_equal(native_correction.coef, correction_model.coef_)
+    np.testing.assert_array_equal(native_correction.intercept, correction_model.intercept_)
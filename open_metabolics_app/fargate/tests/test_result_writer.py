@@ -0,0 +1,91 @@
+"""ResultWriter against a batch_write_item client that leaves items unprocessed."""
+
+import threading
+import pytest
+import result_writer
+from result_writer import ResultWriter
+
+class UnprocessingClient:
+    """
+    Stores the items of each batch_write_item request in order, except the first `unprocessed` items
+    of the next `partial_requests` requests, which come back as UnprocessedItems.
+    """
+
+    def __init__(self, unprocessed=0, partial_requests=0, error=None):
+        self.unprocessed = unprocessed
+        self.partial_requests = partial_requests
+        self.error = error
+        self.requests = []
+        self.stored = {}
+        self.threads = set()
+
+    def batch_write_item(self, RequestItems):
+        self.threads.add(threading.current_thread().name)
+        if self.error is not None:
+            raise self.error
+        (table_name, requests), = RequestItems.items()
+        self.requests.append(requests)
+        keys = [(request['PutRequest']['Item']['SessionId']['S'], request['PutRequest']['Item']['Timestamp']['S'])
+                for request in requests]
+        assert len(set(keys)) == len(keys), 'BatchWriteItem rejects duplicate keys in one request'
+        skipped = 0
+        if self.partial_requests > 0:
+            self.partial_requests -= 1
+            skipped = min(self.unprocessed, len(requests))
+        for key, request in zip(keys[skipped:], requests[skipped:]):
+            self.stored[key] = request['PutRequest']['Item']
+        return {'UnprocessedItems': {table_name: requests[:skipped]}} if skipped else {}
+
+def item(index, value=0.0):
+    return {'SessionId': {'S': 'session'}, 'Timestamp': {'S': f'{index:06d}'}, 'EnergyExpenditure': {'N': repr(value)}}
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Retries back off without sleeping; the requested sleeps are recorded"""
+    sleeps = []
+    monkeypatch.setattr(result_writer.time, 'sleep', sleeps.append)
+    return sleeps
+
+@pytest.mark.parametrize('background', [False, True])
+def test_unprocessed_items_are_retried_until_stored(background, no_backoff):
+    client = UnprocessingClient(unprocessed=10, partial_requests=4)
+    writer = ResultWriter(client, 'Results', background=background)
+    for index in range(60):
+        writer.put(item(index, index / 2))
+    writer.close()
+
+    assert client.stored == {('session', f'{index:06d}'): item(index, index / 2) for index in range(60)}
+    assert writer.unprocessed_retries == 4 and len(no_backoff) == 4
+    assert writer.stats()['itemsWritten'] == 60 and writer.stats()['flushCount'] == 3
+    assert all(len(requests) <= 25 for requests in client.requests)
+
+def test_duplicate_key_flushes_and_last_write_wins():
+    client = UnprocessingClient()
+    writer = ResultWriter(client, 'Results')
+    writer.put(item(0, 1.0))
+    writer.put(item(1, 1.0))
+    writer.put(item(0, 2.0))
+    assert len(client.requests) == 1 and len(client.requests[0]) == 2
+    writer.flush()
+    assert client.stored[('session', '000000')] == item(0, 2.0)
+    assert client.stored[('session', '000001')] == item(1, 1.0)
+
+def test_exhausted_retries_raise(no_backoff):
+    client = UnprocessingClient(unprocessed=1, partial_requests=100)
+    writer = ResultWriter(client, 'Results', max_retries=3)
+    writer.put(item(0))
+    with pytest.raises(Exception, match='1 unprocessed items after 3 retries'):
+        writer.flush()
+    assert len(no_backoff) == 3 and not client.stored
+
+@pytest.mark.parametrize('finish', ['flush', 'close'])
+def test_background_error_reaches_the_caller(finish):
+    client = UnprocessingClient(error=RuntimeError('throttled'))
+    writer = ResultWriter(client, 'Results', background=True)
+    for index in range(30):
+        writer.put(item(index))
+    with pytest.raises(RuntimeError, match='throttled'):
+        getattr(writer, finish)()
+    assert client.threads == {'result-writer'}
+    writer.close()
+    assert not writer._thread.is_alive()
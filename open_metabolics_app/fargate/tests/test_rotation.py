@@ -0,0 +1,93 @@
+"""
+Parity of the closed-form orientation solver with the original grid search (solver='grid_loop').
+
+get_rotate_y only sums the samples that are positive on the principal axis. The closed form is exact only
+because that set is chosen once, on the unrotated data; chosen after rotating, the objective would be
+piecewise in theta and arctan2 would miss its optimum. These tests pin that down on every 50-sample offset
+of the bundled recording and on random inputs.
+"""
+
+import os
+from functools import lru_cache
+import numpy as np
+import pytest
+from scipy import signal
+import utils
+
+GRID_STEP = utils.rotation_grid[1] - utils.rotation_grid[0]
+SLIDING_WIN = 200
+RECORDING = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'daily_sp_pocket_data.csv')
+b, a = signal.butter(4, 6, btype='low', fs=50)
+
+def angle_z(rotation):
+    return np.arctan2(rotation[1, 0], rotation[0, 0])
+
+def angle_y(rotation):
+    return np.arctan2(rotation[0, 2], rotation[0, 0])
+
+def angle_gap(theta_a, theta_b):
+    return np.abs(np.angle(np.exp(1j * (theta_a - theta_b))))
+
+def objective_z(acc, rotation):
+    return np.mean(np.matmul(acc, rotation)[:, 1])
+
+def objective_y(gait, prin_idx, rotation):
+    pos_idx = gait[:, prin_idx] > 0
+    return np.sum(np.matmul(gait[pos_idx], rotation)[:, 2])
+
+def assert_z_parity(acc, tolerance):
+    closed_rotm, _ = utils.get_rotate_z(acc, solver='closed_form')
+    grid_rotm, _ = utils.get_rotate_z(acc, solver='grid_loop')
+    assert angle_gap(angle_z(closed_rotm), angle_z(grid_rotm)) <= GRID_STEP + tolerance
+    assert objective_z(acc, closed_rotm) >= objective_z(acc, grid_rotm) - tolerance
+    return grid_rotm
+
+def assert_y_parity(gait, prin_idx, tolerance):
+    closed_rotm, _ = utils.get_rotate_y(gait, prin_idx, solver='closed_form')
+    grid_rotm, _ = utils.get_rotate_y(gait, prin_idx, solver='grid_loop')
+    assert angle_gap(angle_y(closed_rotm), angle_y(grid_rotm)) <= GRID_STEP + tolerance
+    assert objective_y(gait, prin_idx, closed_rotm) >= objective_y(gait, prin_idx, grid_rotm) - tolerance
+
+@lru_cache(maxsize=None)
+def recording_windows():
+    recording = np.loadtxt(RECORDING, delimiter=',')
+    offsets = range(0, len(recording) - SLIDING_WIN + 1, 50)
+    return [signal.filtfilt(b, a, recording[offset:offset + SLIDING_WIN, 1:7], axis=0) for offset in offsets]
+
+@pytest.mark.parametrize('window_number', range(len(recording_windows())))
+def test_recording_windows(window_number, numeric_tolerance):
+    window = recording_windows()[window_number]
+    gyro, acc = window[:, :3], window[:, 3:]
+    rotm_z = assert_z_parity(acc, numeric_tolerance)
+
+    # The y search runs on the mean stride of the z-aligned gyro, as in batch_analyzer.calibrate_window
+    gyro_rot_zx = np.matmul(gyro, rotm_z)
+    prin_idx = utils.find_prin_axis(gyro_rot_zx)
+    prin_gyro = gyro_rot_zx[:, prin_idx]
+    if np.abs(np.max(prin_gyro)) < np.abs(np.min(prin_gyro)):
+        prin_gyro = -prin_gyro
+    gait_peaks = utils.peak_detect(prin_gyro)
+    if len(gait_peaks) <= 1:
+        pytest.skip('no gait in this window')
+    gait_data = utils.segment_data(gait_peaks, gyro_rot_zx, SLIDING_WIN)
+    if len(gait_data) < 1:
+        pytest.skip('no stride segmented in this window')
+    assert_y_parity(np.mean(gait_data, axis=0), prin_idx, numeric_tolerance)
+
+@pytest.mark.parametrize('seed', range(100))
+def test_random_inputs(seed, numeric_tolerance):
+    rng = np.random.default_rng(seed)
+    gravity = rng.normal(size=3)
+    acc = 9.81 * gravity / np.linalg.norm(gravity) + rng.normal(scale=2.0, size=(SLIDING_WIN, 3))
+    assert_z_parity(acc, numeric_tolerance)
+
+    gait = rng.normal(size=(rng.integers(20, 200), 3)) * rng.uniform(0.5, 5.0, size=3)
+    for prin_idx in (0, 2):
+        assert_y_parity(gait, prin_idx, numeric_tolerance)
+
+def test_no_improvement_over_identity():
+    # Already aligned: every solver keeps theta = 0
+    acc = np.tile([0.0, 9.81, 0.0], (SLIDING_WIN, 1))
+    for solver in ('closed_form', 'grid', 'grid_loop'):
+        rotation, theta = utils.get_rotate_z(acc, solver=solver)
+        assert theta == 0 and np.array_equal(rotation, np.identity(3))
@@ -0,0 +1,86 @@
+"""
+The prefetching reader against the sequential one on local_backends: same pages in the same order,
+for every segment count and from a resume key, with no item dropped or repeated at segment boundaries.
+"""
+
+import collections
+import numpy as np
+import pytest
+import local_backends
+import sensor_reader
+from sensor_decoding import SensorColumns
+from sensor_reader import read_session_pages, prefetch_session_pages, segment_bounds
+
+TABLE = 'RawSensorData'
+SESSION_SAMPLES = 6001  # 120 s at 50 Hz: segment boundaries of 2, 3, 4, 5 and 6 segments fall on samples
+
+class RecordingClient:
+    """LocalDynamoDB that counts how often each Timestamp comes back from a query"""
+
+    def __init__(self, dynamodb):
+        self.dynamodb = dynamodb
+        self.returned = collections.Counter()
+
+    def query(self, **kwargs):
+        response = self.dynamodb.query(**kwargs)
+        self.returned.update(item['Timestamp']['S'] for item in response.get('Items', []))
+        return response
+
+@pytest.fixture(scope='module')
+def dynamodb():
+    """Two sessions of the same samples: Timestamp keys with the _sequence suffix, and bare keys"""
+    from benchmark import load_dataset, make_page
+
+    dynamodb = local_backends.LocalDynamoDB()
+    dynamodb.create_table(TABLE, 'SessionId', 'Timestamp')
+    items = make_page(load_dataset(0.2)[:SESSION_SAMPLES], 0)
+    for session_id, strip_suffix in (('suffixed', False), ('bare', True)):
+        session_items = [dict(item, SessionId={'S': session_id}) for item in items]
+        if strip_suffix:
+            for item in session_items:
+                item['Timestamp'] = {'S': item['Timestamp']['S'].split('_')[0]}
+        for start in range(0, len(session_items), 25):
+            dynamodb.batch_write_item(RequestItems={TABLE: [
+                {'PutRequest': {'Item': item}} for item in session_items[start:start + 25]]})
+    return dynamodb
+
+@pytest.fixture
+def short_segments(monkeypatch):
+    """Let the two-minute test session be split into up to 12 segments"""
+    monkeypatch.setattr(sensor_reader, 'MIN_SEGMENT_SECONDS', 10)
+
+def assert_same_pages(pages, expected_pages):
+    pages, expected = SensorColumns.concatenate(list(pages)), SensorColumns.concatenate(list(expected_pages))
+    assert list(pages.timestamps) == list(expected.timestamps)
+    np.testing.assert_array_equal(pages.values, expected.values)
+
+@pytest.mark.parametrize('session_id', ['suffixed', 'bare'])
+@pytest.mark.parametrize('segments', [1, 3, 4, 7])
+def test_prefetch_matches_sequential_read(dynamodb, short_segments, session_id, segments):
+    client = RecordingClient(dynamodb)
+    pages = list(prefetch_session_pages(client, TABLE, session_id, segments=segments, queue_pages=2))
+    assert_same_pages(pages, read_session_pages(dynamodb, TABLE, session_id))
+    timestamps = [timestamp for page in pages for timestamp in page.timestamps]
+    assert len(timestamps) == len(set(timestamps)) == SESSION_SAMPLES
+    assert timestamps == sorted(timestamps)
+    if session_id == 'bare' and segments in (3, 4):
+        # Items exactly on a boundary come back from both neighbouring BETWEEN queries and are kept once
+        boundaries = [upper for _, upper in segment_bounds(timestamps[0], timestamps[-1], segments)[:-1]]
+        assert [client.returned[boundary] for boundary in boundaries] == [2] * (segments - 1)
+
+@pytest.mark.parametrize('segments', [1, 3, 4, 7])
+def test_prefetch_from_start_key_matches_sequential_read(dynamodb, short_segments, segments):
+    start_key = read_session_pages(dynamodb, TABLE, 'suffixed', page_size=2345).__next__().timestamps[-1]
+    pages = list(prefetch_session_pages(dynamodb, TABLE, 'suffixed', segments=segments, start_key=start_key))
+    assert pages[0].timestamps[0] == start_key
+    assert_same_pages(pages, read_session_pages(dynamodb, TABLE, 'suffixed', start_key=start_key))
+
+def test_segment_bounds_cover_the_session():
+    bounds = segment_bounds('2024-01-01T00:00:00.000Z_000000', '2024-01-01T00:10:00.000Z_000000', 4)
+    assert bounds == [('0000-01-01T00:00:00Z', '2024-01-01T00:02:30.000Z'),
+                      ('2024-01-01T00:02:30.000Z', '2024-01-01T00:05:00.000Z'),
+                      ('2024-01-01T00:05:00.000Z', '2024-01-01T00:07:30.000Z'),
+                      ('2024-01-01T00:07:30.000Z', None)]
+    # Sessions shorter than segments * MIN_SEGMENT_SECONDS get fewer segments
+    assert len(segment_bounds('2024-01-01T00:00:00.000Z', '2024-01-01T00:02:30.000Z', 7)) == 2
+    assert segment_bounds('not a timestamp', '2024-01-01T00:02:30.000Z', 4) == [('0000-01-01T00:00:00Z', None)]
@@ -0,0 +1,85 @@
+"""
+Streaming mode on local_backends: pushes of uneven uploads store what process_message stores, and a push
+whose checkpoint was moved on by another worker task saves nothing and goes back to the queue.
+"""
+
+import itertools
+import json
+import os
+import pytest
+from conftest import USER_EMAIL, stored_results
+
+def upload_in_chunks(worker, seed_session, session_id, recording, chunk_sizes):
+    """Seed the recording chunk by chunk, pushing after each upload; the last push is final"""
+    start = 0
+    for chunk_size in itertools.cycle(chunk_sizes):
+        stop = min(start + chunk_size, len(recording))
+        seed_session(session_id, recording[start:stop], start)
+        worker.process_increment(session_id, USER_EMAIL, final=stop == len(recording))
+        if stop == len(recording):
+            return
+        start = stop
+
+@pytest.mark.parametrize('filter_mode', ['session', 'window'])
+def test_uneven_pushes_match_batch_processing(local_worker, local_dynamodb, seed_session, recording, monkeypatch,
+                                              filter_mode):
+    monkeypatch.setattr(local_worker, 'filter_mode', filter_mode)
+    seed_session('batch', recording)
+    local_worker.process_message({'Body': json.dumps({'session_id': 'batch', 'user_email': USER_EMAIL})})
+    upload_in_chunks(local_worker, seed_session, 'streamed', recording, (250, 1777))
+
+    batch_results = stored_results(local_dynamodb, 'batch')
+    assert batch_results
+    assert stored_results(local_dynamodb, 'streamed') == batch_results
+    checkpoint = local_worker.load_checkpoint('streamed')
+    assert checkpoint['Final'] and checkpoint['WindowCount'] == local_worker.load_checkpoint('batch')['WindowCount']
+
+def test_stale_expected_window_count_conflicts(local_worker, seed_session, recording):
+    seed_session('session', recording[:3000])
+    local_worker.process_increment('session', USER_EMAIL)
+    checkpoint = local_worker.load_checkpoint('session')
+    assert checkpoint['WindowCount'] > 0
+
+    with pytest.raises(local_worker.CheckpointConflict):
+        local_worker.update_processing_status('session', 'streaming', checkpoint=checkpoint,
+                                              expected_window_count=checkpoint['WindowCount'] - 1)
+    local_worker.update_processing_status('session', 'completed', 100, checkpoint=dict(checkpoint, Final=True),
+                                          expected_window_count=checkpoint['WindowCount'])
+    # A completed session's checkpoint is never replaced
+    with pytest.raises(local_worker.CheckpointConflict):
+        local_worker.update_processing_status('session', 'streaming', checkpoint=checkpoint,
+                                              expected_window_count=checkpoint['WindowCount'])
+    assert local_worker.load_checkpoint('session')['Final']
+
+def test_superseded_push_is_released(local_worker, local_dynamodb, seed_session, recording, monkeypatch):
+    import local_backends
+
+    sqs = local_backends.LocalSQS()
+    queue_url = sqs.create_queue(QueueName=os.environ['PROCESSING_QUEUE_URL'])['QueueUrl']
+    monkeypatch.setattr(local_worker, 'sqs', sqs)
+    seed_session('session', recording[:3000])
+    local_worker.process_increment('session', USER_EMAIL)
+    seed_session('session', recording[3000:6000], 3000)
+
+    # Another worker task saves a newer checkpoint after this push loaded its own
+    load_checkpoint = local_worker.load_checkpoint
+    newer = {}
+
+    def load_then_supersede(session_id):
+        checkpoint = load_checkpoint(session_id)
+        newer.update(checkpoint, WindowCount=checkpoint['WindowCount'] + 1)
+        local_worker.update_processing_status(session_id, 'streaming', checkpoint=newer)
+        return checkpoint
+    monkeypatch.setattr(local_worker, 'load_checkpoint', load_then_supersede)
+
+    sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(
+        {'session_id': 'session', 'user_email': USER_EMAIL, 'incremental': True}))
+    message = sqs.receive_message(QueueUrl=queue_url)['Messages'][0]
+    assert sqs.approximate_counts(queue_url) == (0, 1)
+    heartbeat = local_worker.VisibilityHeartbeat(queue_url, interval=0)
+    heartbeat.add(message['ReceiptHandle'])
+    local_worker.handle_message(message, heartbeat)
+
+    # Not deleted, and visible again right away for the retry
+    assert sqs.approximate_counts(queue_url) == (1, 0)
+    assert load_checkpoint('session') == newer
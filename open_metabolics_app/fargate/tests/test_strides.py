@@ -0,0 +1,32 @@
+"""Batched stride segmentation against the per-stride path of estimateMetabolics."""
+
+import numpy as np
+import pytest
+import utils
+import batch_analyzer
+
+SLIDING_WIN = 200
+
+@pytest.mark.parametrize('peak_index', [[], [50], [10, 250]])
+def test_windows_without_strides(peak_index):
+    # No peaks, one peak, or peaks further apart than a stride may be
+    gait_data = np.random.default_rng(0).normal(size=(300, 3))
+    bin_inputs, dur_stride, starts = utils.segment_strides(gait_data, peak_index, SLIDING_WIN)
+    assert bin_inputs.shape == (0, 90) and len(dur_stride) == 0 and len(starts) == 0
+
+def test_estimate_windows_without_strides():
+    def model_loader():
+        raise AssertionError('no stride, so the models must not be loaded')
+    empty = utils.segment_strides(np.zeros((SLIDING_WIN, 3)), [50], SLIDING_WIN)
+    assert batch_analyzer.estimate_windows([empty, None], 70.0, 1.75, 80.0, model_loader) == [[], [80.0]]
+
+def test_binned_strides_match_processRawGait():
+    rng = np.random.default_rng(1)
+    gait_data = rng.normal(size=(SLIDING_WIN, 3))
+    peak_index = [5, 48, 97, 140, 190]
+    bin_inputs, dur_stride, starts = utils.segment_strides(gait_data, peak_index, SLIDING_WIN)
+    assert list(starts) == peak_index[:-1]
+    for row, (start, stop) in enumerate(zip(peak_index[:-1], peak_index[1:])):
+        np.testing.assert_allclose(bin_inputs[row], utils.processRawGait(gait_data, start, stop).transpose().flatten(),
+                                   rtol=1e-12, atol=1e-12)
+        assert dur_stride[row] == (stop - start) / 50
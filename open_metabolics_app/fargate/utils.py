@@ -8,60 +8,136 @@ from scipy import signal
 from numpy import linalg as LA
 import pickle
 import os
-import matplotlib.pyplot as plt
 from itertools import groupby
+from functools import lru_cache
 from scipy.linalg import norm
+from scipy.stats import skew
 
-def basalEst(height, weight, age, gender, stand_aug_fact, kcalPerDay2Watt=0.048426):
+STAND_AUG_FACT = 1.41  # Standing augmentation factor applied to the basal rate
+KCAL_PER_DAY_TO_WATT = 0.048426  # kcal/day to Watts conversion
+
+def basalEst(height, weight, age, gender, stand_aug_fact=STAND_AUG_FACT, kcalPerDay2Watt=KCAL_PER_DAY_TO_WATT):
     """Estimate basal metabolic rate"""
     offset = 5 if gender == 'M' else -161
     return (10.0 * weight + 625.0 * height - 5.0 * age + offset) * kcalPerDay2Watt * stand_aug_fact
 
+def _stack_rotations(rows):
+    """(3, 3) matrix, or (n, 3, 3) for an array of angles, from nested rows of equally shaped entries"""
+    return np.moveaxis(np.array(rows, dtype=float), (0, 1), (-2, -1))
+
 def rotm_x(theta):
-    """Create a rotation matrix for rotation around the x-axis"""
-    return [[1, 0, 0], [0, np.cos(theta), -np.sin(theta)], [0, np.sin(theta), np.cos(theta)]]
+    """Create a rotation matrix for rotation around the x-axis; an array of angles gives an (n, 3, 3) stack"""
+    c, s = np.cos(theta), np.sin(theta)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return _stack_rotations([[one, zero, zero], [zero, c, -s], [zero, s, c]])
 
 def rotm_y(theta):
-    """Create a rotation matrix for rotation around the y-axis"""
-    return [[np.cos(theta), 0, np.sin(theta)], [0, 1, 0], [-np.sin(theta), 0, np.cos(theta)]]
+    """Create a rotation matrix for rotation around the y-axis; an array of angles gives an (n, 3, 3) stack"""
+    c, s = np.cos(theta), np.sin(theta)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return _stack_rotations([[c, zero, s], [zero, one, zero], [-s, zero, c]])
 
 def rotm_z(theta):
-    """Create a rotation matrix for rotation around the z-axis"""
-    return [[np.cos(theta), -np.sin(theta), 0], [np.sin(theta), np.cos(theta), 0], [0, 0, 1]]
+    """Create a rotation matrix for rotation around the z-axis; an array of angles gives an (n, 3, 3) stack"""
+    c, s = np.cos(theta), np.sin(theta)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return _stack_rotations([[c, -s, zero], [s, c, zero], [zero, zero, one]])
+
+rotation_grid = np.linspace(-np.pi, np.pi, 1000)  # Candidate angles of the grid solvers
+rotation_grid.flags.writeable = False
+
+@lru_cache(maxsize=None)
+def rotation_bank(axis):
+    """Read-only (1000, 3, 3) rotations about 'x', 'y' or 'z' for every angle of rotation_grid"""
+    bank = np.ascontiguousarray({'x': rotm_x, 'y': rotm_y, 'z': rotm_z}[axis](rotation_grid))
+    bank.flags.writeable = False
+    return bank
 
-def get_rotate_y(input_data, prin_idx):
-    """Compute a rotation matrix around the y-axis using local acceleration data"""
+@lru_cache(maxsize=None)
+def _rotation_bank_column(axis, column):
+    """Column `column` of every rotation in the bank as (1000, 3, 1), the only one a grid objective needs"""
+    bank_column = np.ascontiguousarray(rotation_bank(axis)[:, :, column:column + 1])
+    bank_column.flags.writeable = False
+    return bank_column
+
+def _grid_optimum(axis, objectives, baseline):
+    """
+    The grid loops' choice: the first angle that strictly beats theta = 0 (baseline) and every earlier
+    angle, i.e. the first maximum of objectives if it exceeds baseline
+    """
+    best = int(np.argmax(objectives))
+    if not objectives[best] > baseline:
+        return np.identity(3), 0
+    return rotation_bank(axis)[best].copy(), int(np.rad2deg(rotation_grid[best]))
+
+def get_rotate_y(input_data, prin_idx, solver='grid'):
+    """Compute a rotation matrix around the y-axis using local acceleration data
+
+    solver='grid' searches the 1000 angles of rotation_grid in one stacked matmul over rotation_bank('y').
+    It computes each angle's objective as the original loop did and gives the same result;
+    solver='grid_loop' is that loop, kept for parity checks. solver='closed_form' maximises the
+    same objective, sum(x*sin(theta) + z*cos(theta)) over the positive samples, analytically.
+    """
     pos_idx = np.where(input_data[:, prin_idx] > 0)[0]
-    theta = np.linspace(-np.pi, np.pi, 1000)
+    if solver == 'closed_form':
+        sum_x = np.sum(input_data[pos_idx, 0])
+        sum_z = np.sum(input_data[pos_idx, 2])
+        return _closed_form_rotation(rotm_y, sum_x, sum_z)
+    if solver == 'grid':
+        rot_gyro_z = np.matmul(input_data[pos_idx], _rotation_bank_column('y', 2))[:, :, 0]
+        return _grid_optimum('y', np.sum(rot_gyro_z, axis=1), np.sum(input_data[pos_idx, 2]))
+    if solver != 'grid_loop':
+        raise ValueError(f"Unknown rotation solver: {solver}")
 
     opt_theta = None
     opt_rotm_y = None
     cur_max_gyro_z = np.sum(input_data[pos_idx, 2])
 
-    for cur_theta in theta:
-        cur_rotm = rotm_y(cur_theta)
+    for cur_theta, cur_rotm in zip(rotation_grid, rotation_bank('y')):
         rot_gyro = np.matmul(input_data, cur_rotm)
         if np.sum(rot_gyro[pos_idx, 2]) > cur_max_gyro_z:
             cur_max_gyro_z = np.sum(rot_gyro[pos_idx, 2])
             opt_theta = cur_theta
             opt_rotm_y = cur_rotm
-    return opt_rotm_y if opt_rotm_y is not None else np.identity(3), int(np.rad2deg(opt_theta)) if opt_theta is not None else 0
+    return opt_rotm_y.copy() if opt_rotm_y is not None else np.identity(3), int(np.rad2deg(opt_theta)) if opt_theta is not None else 0
+
+def get_rotate_z(acc, solver='grid'):
+    """Compute a rotation matrix around the z-axis using local acceleration data
 
-def get_rotate_z(acc):
-    """Compute a rotation matrix around the z-axis using local acceleration data"""
+    solver='grid' searches the 1000 angles of rotation_grid in one stacked matmul over rotation_bank('z').
+    It computes each angle's objective as the original loop did and gives the same result;
+    solver='grid_loop' is that loop, kept for parity checks. solver='closed_form' maximises the
+    same objective, mean(-x*sin(theta) + y*cos(theta)), analytically.
+    """
     cur_acc_y_mean = np.mean(acc[:, 1])
-    theta = np.linspace(-np.pi, np.pi, 1000)
+    if solver == 'closed_form':
+        return _closed_form_rotation(rotm_z, -np.mean(acc[:, 0]), cur_acc_y_mean)
+    if solver == 'grid':
+        rot_acc_y = np.matmul(acc, _rotation_bank_column('z', 1))[:, :, 0]
+        return _grid_optimum('z', np.mean(rot_acc_y, axis=1), cur_acc_y_mean)
+    if solver != 'grid_loop':
+        raise ValueError(f"Unknown rotation solver: {solver}")
+
     opt_theta = None
     opt_rotm_z = None
 
-    for cur_theta in theta:
-        cur_rotm = rotm_z(cur_theta)
+    for cur_theta, cur_rotm in zip(rotation_grid, rotation_bank('z')):
         cur_rot_acc = np.matmul(acc, cur_rotm)
         if np.mean(cur_rot_acc[:, 1]) > cur_acc_y_mean:
             cur_acc_y_mean = np.mean(cur_rot_acc[:, 1])
             opt_theta = cur_theta
             opt_rotm_z = cur_rotm
-    return opt_rotm_z if opt_rotm_z is not None else np.identity(3), int(np.rad2deg(opt_theta)) if opt_theta is not None else 0
+    return opt_rotm_z.copy() if opt_rotm_z is not None else np.identity(3), int(np.rad2deg(opt_theta)) if opt_theta is not None else 0
+
+def _closed_form_rotation(rotm, sin_coef, cos_coef, rel_tol=1e-12):
+    """Maximise sin_coef*sin(theta) + cos_coef*cos(theta) over theta
+
+    Mirrors the grid search: the identity is returned unless the optimum strictly beats theta = 0.
+    """
+    opt_theta = np.arctan2(sin_coef, cos_coef)
+    if np.hypot(sin_coef, cos_coef) - cos_coef <= rel_tol * max(np.abs(cos_coef), 1.0):
+        return np.identity(3), 0
+    return rotm(opt_theta), int(np.rad2deg(opt_theta))
 
 def find_prin_axis(input_data):
     """Find the principal axis of angular velocity"""
@@ -75,29 +151,49 @@ def processRawGait(data_array, start_ind, end_ind, num_bins=30):
     dur_stride = gait_data.shape[0] / 100
     return signal.resample(gait_data, num_bins, axis=0)
 
+peak_height_thresh = np.deg2rad(70)  # Minimum gait peak height in rad/s (70 deg/s)
+
 def peak_detect(input_data):
     """Detect significant peaks in the input data"""
     fs = 50
-    peak_height_thresh = np.deg2rad(70)
     peak_min_dist = int(0.6 * fs)
     return signal.find_peaks(input_data, height=peak_height_thresh, distance=peak_min_dist)[0]
 
 def segment_data(peak_index_list, data_to_segment, stride_detect_window):
     """Segment data based on identified peak indices"""
-    gait_data = []
-    for i in range(len(peak_index_list) - 1):
-        gait_start_index = peak_index_list[i]
-        gait_stop_index = peak_index_list[i + 1]
-        if (gait_stop_index - gait_start_index) <= stride_detect_window:
-            cur_gait_data = processRawGait(data_to_segment, gait_start_index, gait_stop_index)
-            gait_data.append(cur_gait_data)
-    return np.array(gait_data)
+    gait_start_index, gait_stop_index = get_stride_bounds(peak_index_list, stride_detect_window)
+    return resample_strides(data_to_segment, gait_start_index, gait_stop_index)
+
+@lru_cache(maxsize=None)
+def _resample_matrix(n_samples, num_bins):
+    """Linear operator equivalent to signal.resample(x, num_bins, axis=0) for an input of n_samples rows"""
+    resample_mat = signal.resample(np.identity(n_samples), num_bins, axis=0)
+    resample_mat.flags.writeable = False
+    return resample_mat
+
+def resample_strides(data_array, starts, stops, num_bins=30):
+    """Resample strides of varying length into a (n_strides, num_bins, n_channels) tensor
+
+    Strides of equal length share one cached resampling matrix, so each length costs a single einsum.
+    """
+    starts = np.asarray(starts, dtype=int)
+    lengths = np.asarray(stops, dtype=int) - starts
+    bin_gait = np.empty((len(starts), num_bins, data_array.shape[1]))
+    for length in np.unique(lengths):
+        stride_idx = np.nonzero(lengths == length)[0]
+        strides = data_array[starts[stride_idx, None] + np.arange(length)]
+        bin_gait[stride_idx] = np.einsum('bl,klc->kbc', _resample_matrix(int(length), num_bins), strides)
+    return bin_gait
 
 def get_features(signal):
     """Extract statistical features from the signal"""
-    from scipy.stats import skew
     return np.array([np.mean(signal), np.std(signal), np.median(signal), skew(signal), LA.norm(signal, ord=2)])
 
+def get_features_batch(signals, axis=-1):
+    """Extract get_features along an axis; the feature dimension replaces that axis as the last one"""
+    return np.stack([np.mean(signals, axis=axis), np.std(signals, axis=axis), np.median(signals, axis=axis),
+                     skew(signals, axis=axis), LA.norm(signals, ord=2, axis=axis)], axis=-1)
+
 def processRawGait_model(data_array, start_ind, end_ind, weight, height, correction_model, cur_device, num_bins=30):
     """Process raw gait data for model input preparation"""
     fs = 50
@@ -144,3 +240,69 @@ def estimateMetabolics(model, time, gait_data, peak_index, weight, height, corre
             ee_all.append(ee_est)
             time_all.append(time[gait_start_index])
     return time_all, ee_all
+
+def filtfilt_with_context(b, a, data, context=None):
+    """Zero-phase filter data along axis 0 with the raw samples that preceded it prepended
+
+    Only the rows of data are returned, so consecutive chunks join without a start-up transient.
+    """
+    if context is None or len(context) == 0:
+        return signal.filtfilt(b, a, data, axis=0)
+    return signal.filtfilt(b, a, np.concatenate((context, data)), axis=0)[len(context):]
+
+def filtfilt_chunked(b, a, data, chunk_size=10000, overlap=200):
+    """Approximate signal.filtfilt over a whole session with bounded memory
+
+    Each chunk is filtered together with overlap raw samples on both sides; only its centre is kept,
+    so the result matches a single filtfilt over the continuous signal once the filter transient
+    has decayed inside the overlap.
+    """
+    n_samples = len(data)
+    filtered = np.empty(data.shape)
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        pad_start = max(start - overlap, 0)
+        pad_stop = min(stop + overlap, n_samples)
+        cur_filtered = signal.filtfilt(b, a, data[pad_start:pad_stop], axis=0)
+        filtered[start:stop] = cur_filtered[start - pad_start:stop - pad_start]
+    return filtered
+
+def get_stride_bounds(peak_index, stride_detect_window):
+    """Return start/stop indices of the strides estimateMetabolics would keep"""
+    peak_index = np.asarray(peak_index, dtype=int)
+    starts = peak_index[:-1]
+    stops = peak_index[1:]
+    keep = (stops - starts) <= stride_detect_window
+    return starts[keep], stops[keep]
+
+def segment_strides(data_array, peak_index, stride_detect_window, num_bins=30):
+    """Resample every stride of a window into the flattened (n_strides, 3 * num_bins) binned layout
+
+    Returns the binned strides, the stride durations in seconds and the stride start indices.
+    """
+    fs = 50
+    starts, stops = get_stride_bounds(peak_index, stride_detect_window)
+    # (n_strides, num_bins, 3) -> per-axis blocks of num_bins, as in processRawGait_model
+    bin_inputs = resample_strides(data_array, starts, stops, num_bins).transpose(0, 2, 1).reshape(len(starts), num_bins * data_array.shape[1])
+    dur_stride = (stops - starts) / fs
+    return bin_inputs, dur_stride, starts
+
+def processRawGait_model_batch(bin_inputs, dur_stride, weight, height, correction_model, num_bins=30):
+    """Build the model input matrix for a batch of strides with a single correction_model call
+
+    Row i matches processRawGait_model for stride i; strides may come from any number of windows.
+    A correction_model with a correct() method (model_artifacts.LinearCorrection) applies the whole
+    correction as one folded matrix multiply; otherwise its predict() output is subtracted.
+    """
+    try:
+        if hasattr(correction_model, 'correct'):
+            model_input = correction_model.correct(dur_stride, bin_inputs)
+        else:
+            model_input = bin_inputs - correction_model.predict(np.column_stack((dur_stride, bin_inputs)))
+    except Exception as e:
+        raise Exception(f"Error during correction_model.predict: {str(e)}. Input shape: {(len(dur_stride), bin_inputs.shape[1] + 1)}")
+
+    n_strides = model_input.shape[0]
+    # Features of gyro x, y and z in turn: (n_strides, 3, 5) -> (n_strides, 15)
+    axis_feat = get_features_batch(model_input.reshape(n_strides, 3, num_bins)).reshape(n_strides, -1)
+    return np.column_stack((np.full(n_strides, weight), np.full(n_strides, height), dur_stride, model_input, axis_feat))
@@ -0,0 +1,79 @@
+"""
+Structured, level-gated logging for the worker.
+
+Every record is one JSON line on stdout (one CloudWatch event): {"time", "level", "logger", "event", ...fields}.
+Per-window and per-stride records are DEBUG and sampled; the default INFO level only emits session
+summaries, warnings and errors.
+"""
+
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Any
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()  # DEBUG, INFO, WARNING or ERROR
+LOG_SAMPLE_EVERY = max(1, int(os.environ.get('LOG_SAMPLE_EVERY', 100)))  # Keep 1 in N sampled debug records
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        payload.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+def get_logger(name: str = 'worker') -> logging.Logger:
+    """Logger writing JSON lines to stdout at LOG_LEVEL; configured once per process"""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
+    return logger
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """Emit one structured record; nothing is formatted when the level is disabled"""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={'fields': fields})
+
+class LogSampler:
+    """Keeps 1 in every `every` calls, for debug records emitted inside hot loops"""
+
+    def __init__(self, every: int = LOG_SAMPLE_EVERY):
+        self.every = max(1, every)
+        self._counter = itertools.count()
+
+    def __call__(self) -> bool:
+        # next() on itertools.count is atomic under the GIL, so samplers can be shared by threads
+        return next(self._counter) % self.every == 0
+
+class SessionSummary:
+    """Per-session counters, logged as a single record when the session ends"""
+
+    def __init__(self, session_id: str, user_email: str):
+        self.session_id = session_id
+        self.user_email = user_email
+        self.counters: Dict[str, int] = {}
+        self._start = time.perf_counter()
+
+    def add(self, name: str, count: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def as_dict(self) -> Dict[str, Any]:
+        record = {'sessionId': self.session_id, 'userEmail': self.user_email,
+                  'elapsedSeconds': round(time.perf_counter() - self._start, 3)}
+        record.update(self.counters)
+        return record
+
+    def log(self, logger: logging.Logger, event: str = 'session_summary', level: int = logging.INFO, **fields):
+        log_event(logger, level, event, **self.as_dict(), **fields)
@@ -980,12 +980,30 @@ resource "aws_ecr_repository" "energy_expenditure_service" {
 resource "null_resource" "docker_build_push" {
   depends_on = [aws_ecr_repository.energy_expenditure_service]
 
+  # One hash per file the Dockerfile copies; a runtime module added to the image needs its own entry here
   triggers = {
     script_hash = filesha256("${path.module}/scripts/build_and_push.sh")
     dockerfile_hash = filesha256("${path.module}/../fargate/Dockerfile")
     worker_hash = filesha256("${path.module}/../fargate/process_energy_expenditure_worker.py")
     api_hash = filesha256("${path.module}/../fargate/process_energy_expenditure.py")
     utils_hash = filesha256("${path.module}/../fargate/utils.py")
+    clients_hash = filesha256("${path.module}/../fargate/clients.py")
+    requirements_hash = filesha256("${path.module}/../fargate/requirements.txt")
+    start_hash = filesha256("${path.module}/../fargate/start.sh")
+    sensor_decoding_hash = filesha256("${path.module}/../fargate/sensor_decoding.py")
+    result_writer_hash = filesha256("${path.module}/../fargate/result_writer.py")
+    sensor_reader_hash = filesha256("${path.module}/../fargate/sensor_reader.py")
+    profile_cache_hash = filesha256("${path.module}/../fargate/profile_cache.py")
+    worker_logging_hash = filesha256("${path.module}/../fargate/worker_logging.py")
+    metrics_hash = filesha256("${path.module}/../fargate/metrics.py")
+    model_artifacts_hash = filesha256("${path.module}/../fargate/model_artifacts.py")
+    activity_filter_hash = filesha256("${path.module}/../fargate/activity_filter.py")
+    batch_analyzer_hash = filesha256("${path.module}/../fargate/batch_analyzer.py")
+    calibration_cache_hash = filesha256("${path.module}/../fargate/calibration_cache.py")
+    ee_model_pkl_hash = filesha256("${path.module}/../fargate/data_driven_ee_model.pkl")
+    correction_model_pkl_hash = filesha256("${path.module}/../fargate/pocket_motion_correction_model.pkl")
+    ee_model_ubj_hash = filesha256("${path.module}/../fargate/data_driven_ee_model.ubj")
+    correction_model_npz_hash = filesha256("${path.module}/../fargate/pocket_motion_correction_model.npz")
   }
 
   provisioner "local-exec" {
@@ -1224,6 +1242,7 @@ resource "aws_iam_role_policy" "ecs_task_role_policy" {
         Action = [
           "dynamodb:Query",
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:UpdateItem"
         ]
@@ -1488,6 +1507,7 @@ resource "aws_iam_policy" "task_policy" {
         Action = [
           "dynamodb:GetItem",
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:UpdateItem",
           "dynamodb:DeleteItem",
           "dynamodb:Query",
@@ -1532,6 +1552,8 @@ resource "aws_ecs_task_definition" "energy_expenditure_worker" {
     {
       name  = "energy-expenditure-worker"
       image = "${aws_ecr_repository.energy_expenditure_service.repository_url}:latest"
+      # Seconds between SIGTERM and SIGKILL (Fargate maximum); covers the 20 s long poll plus DRAIN_TIMEOUT_SECONDS (90)
+      stopTimeout = 120
       environment = [
         {
           name  = "SERVICE_TYPE"